@@ -4,7 +4,7 @@ import os
 from sqlalchemy import create_engine, pool
 from alembic import context
 from sqlmodel import SQLModel
-from app.models.claim import Claim, ClaimProcedure  # Import your models
+from app.models import Claim, ClaimProcedure, NpiNetFeeTotal, PaymentOutbox  # Import your models
 
 # Print out detected tables to debug
 print(f"Detected tables: {SQLModel.metadata.tables.keys()}")
@@ -0,0 +1,39 @@
+"""Add npi_net_fee_totals
+
+Revision ID: 20198d042426
+Revises: e6c252ed6cae
+Create Date: 2026-10-18 09:12:41.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20198d042426'
+down_revision: Union[str, None] = 'e6c252ed6cae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('npi_net_fee_totals',
+    sa.Column('provider_npi', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('total_net_fee', sa.Numeric(), nullable=False),
+    sa.PrimaryKeyConstraint('provider_npi')
+    )
+    op.create_index(
+        'ix_npi_net_fee_totals_total_net_fee',
+        'npi_net_fee_totals',
+        [sa.text('total_net_fee DESC'), sa.text('provider_npi DESC')],
+        unique=False
+    )
+    # Populate existing data with: python -m app.backfill
+
+
+def downgrade() -> None:
+    op.drop_index('ix_npi_net_fee_totals_total_net_fee', table_name='npi_net_fee_totals')
+    op.drop_table('npi_net_fee_totals')
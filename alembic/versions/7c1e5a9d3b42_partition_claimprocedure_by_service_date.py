@@ -0,0 +1,104 @@
+"""Partition claimprocedure by month of service_date
+
+Revision ID: 7c1e5a9d3b42
+Revises: 20198d042426
+Create Date: 2026-10-18 14:03:27.118204
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import (
+    PARTITION_MONTHS_AHEAD,
+    add_months,
+    create_default_partition_sql,
+    create_partition_sql,
+    month_start,
+    months_between,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5a9d3b42'
+down_revision: Union[str, None] = '20198d042426'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "id, claim_id, service_date, submitted_procedure, quadrant, provider_npi, "
+    "provider_fees, allowed_fees, member_coinsurance, member_copay, net_fee, status"
+)
+
+
+def upgrade() -> None:
+    # A table can't be partitioned in place: rebuild it under the old name
+    op.rename_table('claimprocedure', 'claimprocedure_unpartitioned')
+    op.execute("ALTER INDEX ix_claimprocedure_provider_npi RENAME TO ix_claimprocedure_unpartitioned_provider_npi")
+    op.execute("ALTER TABLE claimprocedure_unpartitioned RENAME CONSTRAINT claimprocedure_pkey TO claimprocedure_unpartitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE claimprocedure (
+            id UUID NOT NULL,
+            claim_id UUID NOT NULL,
+            service_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            submitted_procedure VARCHAR NOT NULL,
+            quadrant VARCHAR,
+            provider_npi VARCHAR NOT NULL,
+            provider_fees NUMERIC NOT NULL,
+            allowed_fees NUMERIC NOT NULL,
+            member_coinsurance NUMERIC NOT NULL,
+            member_copay NUMERIC NOT NULL,
+            net_fee NUMERIC NOT NULL,
+            status VARCHAR NOT NULL,
+            PRIMARY KEY (id, service_date)
+        ) PARTITION BY RANGE (service_date)
+    """)
+    op.create_index('ix_claimprocedure_claim_id', 'claimprocedure', ['claim_id'], unique=False)
+    op.create_index('ix_claimprocedure_provider_npi', 'claimprocedure', ['provider_npi'], unique=False)
+
+    # One partition per month of existing history, plus the months ahead
+    # that the worker's daily maintenance would create
+    first = op.get_bind().execute(sa.text(
+        "SELECT min(service_date) FROM claimprocedure_unpartitioned"
+    )).scalar()
+    last = add_months(month_start(date.today()), PARTITION_MONTHS_AHEAD)
+    for month in months_between(first or last, last):
+        op.execute(create_partition_sql(month))
+    op.execute(create_default_partition_sql())
+
+    op.execute(
+        f"INSERT INTO claimprocedure ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM claimprocedure_unpartitioned"
+    )
+    op.drop_table('claimprocedure_unpartitioned')
+
+
+def downgrade() -> None:
+    op.rename_table('claimprocedure', 'claimprocedure_partitioned')
+    op.execute("ALTER INDEX ix_claimprocedure_provider_npi RENAME TO ix_claimprocedure_partitioned_provider_npi")
+    op.execute("ALTER TABLE claimprocedure_partitioned RENAME CONSTRAINT claimprocedure_pkey TO claimprocedure_partitioned_pkey")
+    op.create_table('claimprocedure',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('claim_id', sa.Uuid(), nullable=False),
+    sa.Column('service_date', sa.DateTime(), nullable=False),
+    sa.Column('submitted_procedure', sa.String(), nullable=False),
+    sa.Column('quadrant', sa.String(), nullable=True),
+    sa.Column('provider_npi', sa.String(), nullable=False),
+    sa.Column('provider_fees', sa.Numeric(), nullable=False),
+    sa.Column('allowed_fees', sa.Numeric(), nullable=False),
+    sa.Column('member_coinsurance', sa.Numeric(), nullable=False),
+    sa.Column('member_copay', sa.Numeric(), nullable=False),
+    sa.Column('net_fee', sa.Numeric(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_claimprocedure_provider_npi', 'claimprocedure', ['provider_npi'], unique=False)
+    op.execute(
+        f"INSERT INTO claimprocedure ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM claimprocedure_partitioned"
+    )
+    # Dropping the parent drops every partition
+    op.execute("DROP TABLE claimprocedure_partitioned")
@@ -0,0 +1,48 @@
+"""Add payment_outbox
+
+Revision ID: b4d2e8f1a6c3
+Revises: 7c1e5a9d3b42
+Create Date: 2026-10-18 16:41:08.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d2e8f1a6c3'
+down_revision: Union[str, None] = '7c1e5a9d3b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('payment_outbox',
+    sa.Column('claim_id', sa.Uuid(), nullable=False),
+    sa.Column('idempotency_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('amount', sa.Numeric(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['claim_id'], ['claim.id'], ),
+    sa.PrimaryKeyConstraint('claim_id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index(
+        'ix_payment_outbox_pending',
+        'payment_outbox',
+        ['updated_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_outbox_pending', table_name='payment_outbox')
+    op.drop_table('payment_outbox')
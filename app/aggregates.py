@@ -0,0 +1,55 @@
+# app/aggregates.py
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Union
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ClaimProcedure, NpiNetFeeTotal
+
+logger = logging.getLogger(__name__)
+
+def net_fee_deltas(procedures: Iterable[Union[ClaimProcedure, dict]]) -> Dict[str, Decimal]:
+    """Sum the net fees of new procedures (objects or insert rows) per provider NPI."""
+    deltas = defaultdict(Decimal)
+    for procedure in procedures:
+        if isinstance(procedure, dict):
+            deltas[procedure["provider_npi"]] += procedure["net_fee"]
+        else:
+            deltas[procedure.provider_npi] += procedure.net_fee
+    return deltas
+
+async def upsert_npi_net_fee_totals(session: AsyncSession, deltas: Dict[str, Decimal]):
+    """Add per-NPI deltas to npi_net_fee_totals within the caller's transaction."""
+    if not deltas:
+        return
+
+    # Sorted so concurrent workers lock the same rows in the same order
+    rows = [
+        {"provider_npi": npi, "total_net_fee": delta}
+        for npi, delta in sorted(deltas.items())
+    ]
+    stmt = insert(NpiNetFeeTotal).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NpiNetFeeTotal.provider_npi],
+        set_={"total_net_fee": NpiNetFeeTotal.total_net_fee + stmt.excluded.total_net_fee},
+    )
+    await session.execute(stmt)
+
+async def backfill_npi_net_fee_totals(session: AsyncSession) -> int:
+    """Rebuild npi_net_fee_totals from claimprocedure and return the row count."""
+    # EXCLUSIVE blocks worker upserts until the rebuild commits, and waits for
+    # in-flight upserts, so no delta is lost or counted twice.
+    await session.execute(text("LOCK TABLE npi_net_fee_totals IN EXCLUSIVE MODE"))
+    await session.execute(text("DELETE FROM npi_net_fee_totals"))
+    result = await session.execute(text(
+        "INSERT INTO npi_net_fee_totals (provider_npi, total_net_fee) "
+        "SELECT provider_npi, SUM(net_fee) FROM claimprocedure GROUP BY provider_npi"
+    ))
+    await session.commit()
+    logger.info(f"Backfilled npi_net_fee_totals with {result.rowcount} NPIs")
+    return result.rowcount
@@ -0,0 +1,20 @@
+# app/backfill.py
+
+"""One-shot backfill of derived tables. Usage: python -m app.backfill"""
+
+import asyncio
+import logging
+
+from app.aggregates import backfill_npi_net_fee_totals
+from app.db.connection import AsyncSessionLocal, async_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    async with AsyncSessionLocal() as session:
+        await backfill_npi_net_fee_totals(session)
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+# app/batching.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Group concurrent submissions into batches of up to ``max_size`` items.
+
+    A batch is flushed when it is full or ``max_wait_ms`` after its first
+    item arrived. ``handler`` receives ``[(key, item), ...]`` and returns a
+    dict mapping each key to its result or to the exception it raised, so a
+    bad item fails only its own submitter.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Tuple[Hashable, Any]]], Awaitable[Dict[Hashable, Any]]],
+        max_size: int,
+        max_wait_ms: float,
+    ):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[Hashable, Any, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.handler([(key, item) for key, item, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}", exc_info=True)
+            results = {key: e for key, _, _ in batch}
+        for key, _, future in batch:
+            if not future.done():
+                future.set_result(results.get(key))
+
+    async def close(self):
+        """Flush anything pending and wait for in-flight batches."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
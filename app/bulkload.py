@@ -0,0 +1,421 @@
+# app/bulkload.py
+
+"""Bulk loader for historical claims, bypassing the API and the worker.
+
+    python -m app.bulkload claims.ndjson [--format csv] [--chunk-size 5000] [--restart]
+
+Reads claims from disk chunk by chunk: NDJSON with one POST /claims/ body
+per line, or CSV with one procedure per row (the layout of GET
+/claims/export). Claims are validated with ``ClaimCreate`` and get their
+net fees and statuses from ``compute_fees``, exactly as the worker would
+set them. Each chunk is then loaded in one transaction:
+
+1. COPY the claims and procedures into temporary staging tables;
+2. one set-based statement inserts the claims whose claim number is new,
+   their procedures, and the per-NPI net fee totals.
+
+Parsing the next chunk overlaps with loading the current one, with at most
+--queue-depth chunks in memory. After each commit the byte offset reached
+is saved to the checkpoint file, so an interrupted load resumes from
+there; claims already loaded are skipped by their claim number anyway.
+Invalid claims are written to the rejects file with their line number.
+
+Historical claims are loaded as already paid, so no payment outbox rows
+are created.
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import time
+import uuid
+from datetime import date
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import asyncpg
+from pydantic import ValidationError
+
+from app.db.engine import DATABASE_URL
+from app.fees import compute_fees
+from app.models import Claim, ClaimProcedure, NpiNetFeeTotal
+from app.schemas.claim import ClaimCreate
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+BULKLOAD_CHUNK_SIZE = int(os.getenv("BULKLOAD_CHUNK_SIZE", 5000))
+BULKLOAD_QUEUE_DEPTH = int(os.getenv("BULKLOAD_QUEUE_DEPTH", 2))
+BULKLOAD_PROGRESS_INTERVAL = float(os.getenv("BULKLOAD_PROGRESS_INTERVAL", 5))
+
+CLAIM_COLUMNS = ("id", "claim_number", "plan_group", "subscriber_number", "net_fee", "status")
+PROCEDURE_COLUMNS = (
+    "id", "claim_id", "service_date", "submitted_procedure", "quadrant", "provider_npi", "provider_fees",
+    "allowed_fees", "member_coinsurance", "member_copay", "net_fee", "status",
+)
+CLAIM_STAGE = "bulkload_claim_stage"
+PROCEDURE_STAGE = "bulkload_procedure_stage"
+
+# (first line, claim payload, last line, byte offset just past the last line),
+# with line numbers counted from where reading started
+SourceClaim = Tuple[int, Optional[dict], int, int]
+
+class Chunk(NamedTuple):
+    claims: List[tuple]
+    procedures: List[tuple]
+    rejects: List[dict]
+    first_month: Optional[date]
+    offset: int
+    line: int
+
+def read_ndjson(path: str, offset: int = 0) -> Iterator[SourceClaim]:
+    """One claim per line; a line that isn't JSON comes through as None."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        line_no = 0
+        for line in f:
+            line_no += 1
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                data = loads(line)
+            except ValueError:
+                data = None
+            yield line_no, data, line_no, offset
+
+def _csv_claim(header: List[str], rows: List[List[str]]) -> dict:
+    claim, procedures = {}, []
+    for row in rows:
+        procedure = {}
+        for column, value in zip(header, row):
+            target, _, field = column.partition("_")
+            # Export column names are claim_<field> and procedure_<field>
+            if target == "claim":
+                claim[field] = value
+            elif target == "procedure":
+                procedure[field] = value or None
+        if any(procedure.values()):
+            procedures.append(procedure)
+    claim["procedures"] = procedures
+    return claim
+
+def read_csv(path: str, offset: int = 0) -> Iterator[SourceClaim]:
+    """Group consecutive rows with the same claim number into one claim.
+
+    Rows must not contain embedded newlines, so byte offsets stay exact.
+    """
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]))
+        key = header.index("claim_claim_number") if "claim_claim_number" in header else None
+        line_no = 0
+        if offset < len(header_line):
+            offset, line_no = len(header_line), 1
+        f.seek(offset)
+
+        rows, first_line = [], 0
+        for line in f:
+            line_no += 1
+            row = next(csv.reader([line.decode("utf-8")]), None)
+            if not row:
+                offset += len(line)
+                continue
+            if rows and key is not None and rows[0][key:key + 1] != row[key:key + 1]:
+                yield first_line, _csv_claim(header, rows), line_no - 1, offset
+                rows = []
+            if not rows:
+                first_line = line_no
+            rows.append(row)
+            offset += len(line)
+        if rows:
+            yield first_line, _csv_claim(header, rows), line_no, offset
+
+class ChunkReader:
+    """Turns source claims into validated, fee-computed COPY records."""
+
+    def __init__(self, claims: Iterator[SourceClaim], chunk_size: int, offset: int = 0, line: int = 0):
+        self.claims = claims
+        self.chunk_size = chunk_size
+        self.offset = offset
+        self.base_line = self.line = line
+
+    def next_chunk(self) -> Optional[Chunk]:
+        valid: List[ClaimCreate] = []
+        rejects = []
+        count = 0
+        for line_no, data, last_line, offset in self.claims:
+            self.offset = offset
+            self.line = self.base_line + last_line
+            line_no += self.base_line
+            count += 1
+            try:
+                if data is None:
+                    raise ValueError("Line is not valid JSON")
+                valid.append(ClaimCreate.model_validate(data))
+            except (ValidationError, ValueError, TypeError) as e:
+                claim_number = data.get("claim_number") if isinstance(data, dict) else None
+                rejects.append({"line": line_no, "claim_number": claim_number, "error": str(e)})
+            if count >= self.chunk_size:
+                break
+        if not count:
+            return None
+        return self.build(valid, rejects)
+
+    def build(self, claims: List[ClaimCreate], rejects: List[dict]) -> Chunk:
+        procedures = [procedure for claim in claims for procedure in claim.procedures]
+        fees = compute_fees(
+            [procedure.provider_fees for procedure in procedures],
+            [procedure.allowed_fees for procedure in procedures],
+            [procedure.member_coinsurance for procedure in procedures],
+            [procedure.member_copay for procedure in procedures],
+            [len(claim.procedures) for claim in claims],
+        )
+
+        claim_records, procedure_records = [], []
+        index = 0
+        for position, claim in enumerate(claims):
+            claim_id = uuid.uuid4()
+            claim_records.append((
+                claim_id, claim.claim_number, claim.plan_group, claim.subscriber_number,
+                fees.claim_net_fees[position], fees.claim_statuses[position],
+            ))
+            for procedure in claim.procedures:
+                procedure_records.append((
+                    uuid.uuid4(), claim_id, procedure.service_date, procedure.submitted_procedure,
+                    procedure.quadrant, procedure.provider_npi, procedure.provider_fees,
+                    procedure.allowed_fees, procedure.member_coinsurance, procedure.member_copay,
+                    fees.net_fees[index], fees.statuses[index],
+                ))
+                index += 1
+
+        first_month = min((p.service_date.date().replace(day=1) for p in procedures), default=None)
+        return Chunk(claim_records, procedure_records, rejects, first_month, self.offset, self.line)
+
+def merge_sql() -> str:
+    """Insert new claims, their procedures and NPI totals from the staging tables."""
+    claim, procedure, totals = Claim.__tablename__, ClaimProcedure.__tablename__, NpiNetFeeTotal.__tablename__
+    claim_columns = ", ".join(CLAIM_COLUMNS)
+    procedure_columns = ", ".join(PROCEDURE_COLUMNS)
+    return f"""
+        WITH inserted AS (
+            INSERT INTO {claim} ({claim_columns})
+            SELECT {claim_columns} FROM {CLAIM_STAGE}
+            ON CONFLICT (claim_number) DO NOTHING
+            RETURNING id
+        ), procedures AS (
+            INSERT INTO {procedure} ({procedure_columns})
+            SELECT {", ".join(f"s.{column}" for column in PROCEDURE_COLUMNS)}
+            FROM {PROCEDURE_STAGE} s JOIN inserted ON inserted.id = s.claim_id
+            RETURNING provider_npi, net_fee
+        ), totals AS (
+            INSERT INTO {totals} (provider_npi, total_net_fee)
+            SELECT provider_npi, sum(net_fee) FROM procedures GROUP BY provider_npi ORDER BY provider_npi
+            ON CONFLICT (provider_npi) DO UPDATE
+            SET total_net_fee = {totals}.total_net_fee + excluded.total_net_fee
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM inserted), (SELECT count(*) FROM procedures)
+    """
+
+class Checkpoint:
+    """Progress of one input file, saved after every committed chunk."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source
+        self.size = os.path.getsize(source)
+        self.state = {"offset": 0, "line": 0, "claims": 0, "loaded": 0, "procedures": 0, "rejected": 0, "done": False}
+
+    def load(self) -> bool:
+        """Restore saved progress for the same input; False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            saved = loads(f.read())
+        if saved.get("source") != os.path.abspath(self.source) or saved.get("size") != self.size:
+            logger.warning(f"Ignoring checkpoint {self.path}: it is for another input file")
+            return False
+        self.state.update({key: saved[key] for key in self.state if key in saved})
+        return True
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps({"source": os.path.abspath(self.source), "size": self.size, **self.state}))
+        os.replace(tmp, self.path)
+
+class BulkLoader:
+    def __init__(self, args):
+        self.args = args
+        self.checkpoint = Checkpoint(args.checkpoint or f"{args.path}.checkpoint", args.path)
+        self.rejects_path = args.rejects or f"{args.path}.rejects.ndjson"
+        self.partitions_from: Optional[date] = None
+        self.started = time.monotonic()
+        self.start_claims = 0
+        self.start_procedures = 0
+        self.start_offset = 0
+        self.last_report = 0.0
+
+    def reader(self) -> ChunkReader:
+        state = self.checkpoint.state
+        read = read_csv if self.args.format == "csv" else read_ndjson
+        return ChunkReader(read(self.args.path, state["offset"]), self.args.chunk_size, state["offset"], state["line"])
+
+    async def ensure_partitions(self, first_month: Optional[date]):
+        """Create monthly partitions back to the chunk's oldest service date."""
+        if first_month is None or (self.partitions_from and first_month >= self.partitions_from):
+            return
+        from app.db.connection import async_engine
+        from app.db.partitions import ensure_partitions
+
+        async with async_engine.begin() as conn:
+            await ensure_partitions(conn, first=first_month)
+        self.partitions_from = first_month
+
+    async def prepare(self, conn):
+        # Session-local and emptied by every commit
+        await conn.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {CLAIM_STAGE}
+                (LIKE {Claim.__tablename__} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+            CREATE TEMP TABLE IF NOT EXISTS {PROCEDURE_STAGE}
+                (LIKE {ClaimProcedure.__tablename__} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+        """)
+
+    async def load_chunk(self, conn, chunk: Chunk) -> Tuple[int, int]:
+        await self.ensure_partitions(chunk.first_month)
+        async with conn.transaction():
+            if chunk.claims:
+                await conn.copy_records_to_table(CLAIM_STAGE, records=chunk.claims, columns=CLAIM_COLUMNS)
+            if chunk.procedures:
+                await conn.copy_records_to_table(PROCEDURE_STAGE, records=chunk.procedures, columns=PROCEDURE_COLUMNS)
+            if not chunk.claims:
+                return 0, 0
+            return tuple(await conn.fetchrow(merge_sql()))
+
+    def record(self, chunk: Chunk, loaded: int, procedures: int):
+        if chunk.rejects:
+            with open(self.rejects_path, "ab") as f:
+                f.write(b"".join(dumps(reject) + b"\n" for reject in chunk.rejects))
+        state = self.checkpoint.state
+        state["offset"] = chunk.offset
+        state["line"] = chunk.line
+        state["claims"] += len(chunk.claims) + len(chunk.rejects)
+        state["loaded"] += loaded
+        state["procedures"] += procedures
+        state["rejected"] += len(chunk.rejects)
+        self.checkpoint.save()
+
+    def report(self, final: bool = False) -> dict:
+        state = self.checkpoint.state
+        elapsed = time.monotonic() - self.started
+        claims = state["claims"] - self.start_claims
+        rate = claims / elapsed if elapsed else 0.0
+        remaining = self.checkpoint.size - state["offset"]
+        bytes_rate = (state["offset"] - self.start_offset) / elapsed if elapsed else 0.0
+        progress = {
+            "percent": round(100 * state["offset"] / self.checkpoint.size, 1) if self.checkpoint.size else 100.0,
+            "claims": state["claims"],
+            "loaded": state["loaded"],
+            "skipped": state["claims"] - state["loaded"] - state["rejected"],
+            "rejected": state["rejected"],
+            "procedures": state["procedures"],
+            "claims_per_second": round(rate, 1),
+            "procedures_per_second": round((state["procedures"] - self.start_procedures) / elapsed, 1) if elapsed else 0.0,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(remaining / bytes_rate, 1) if bytes_rate and not final else None,
+        }
+        now = time.monotonic()
+        if final or now - self.last_report >= self.args.progress_interval:
+            self.last_report = now
+            logger.info(
+                f"{progress['percent']}%: {progress['claims']} claims ({progress['loaded']} loaded, "
+                f"{progress['skipped']} skipped, {progress['rejected']} rejected), "
+                f"{progress['claims_per_second']} claims/s, {progress['procedures_per_second']} procedures/s"
+                + (f", ETA {progress['eta_seconds']}s" if progress["eta_seconds"] is not None else "")
+            )
+        return progress
+
+    async def run(self) -> dict:
+        if not self.args.restart and self.checkpoint.load():
+            if self.checkpoint.state["done"]:
+                logger.info(f"{self.args.path} was already loaded; pass --restart to load it again")
+                return self.report(final=True)
+            logger.info(f"Resuming {self.args.path} at byte {self.checkpoint.state['offset']}")
+        state = self.checkpoint.state
+        self.start_claims, self.start_procedures, self.start_offset = state["claims"], state["procedures"], state["offset"]
+
+        reader = self.reader()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.args.queue_depth)
+
+        async def produce():
+            # Parsing runs in a thread so it overlaps the COPY of the previous chunk
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(reader.next_chunk)
+                    await queue.put(chunk)
+                    if chunk is None:
+                        return
+            except Exception as e:
+                await queue.put(e)
+
+        conn = await asyncpg.connect(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+        producer = asyncio.create_task(produce())
+        try:
+            await self.prepare(conn)
+            while True:
+                chunk = await queue.get()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk is None:
+                    break
+                loaded, procedures = await self.load_chunk(conn, chunk)
+                self.record(chunk, loaded, procedures)
+                self.report()
+        finally:
+            producer.cancel()
+            await conn.close()
+
+        state["done"] = True
+        self.checkpoint.save()
+        await self.invalidate_caches()
+        return self.report(final=True)
+
+    async def invalidate_caches(self):
+        """Drop cached top-NPI pages, whose totals just changed."""
+        from app.cache import bump_version, top_npis_cache
+        from app.db.redis import close_redis_pool, create_redis_pool
+
+        try:
+            redis = await create_redis_pool()
+            try:
+                await bump_version(redis, top_npis_cache.namespace)
+            finally:
+                await close_redis_pool(redis)
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached top NPIs, they expire on their own: {e}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load historical claims from NDJSON or CSV")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=BULKLOAD_CHUNK_SIZE, help="claims per transaction")
+    parser.add_argument("--queue-depth", type=int, default=BULKLOAD_QUEUE_DEPTH, help="parsed chunks held in memory")
+    parser.add_argument("--checkpoint", help="default: <path>.checkpoint")
+    parser.add_argument("--rejects", help="default: <path>.rejects.ndjson")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--progress-interval", type=float, default=BULKLOAD_PROGRESS_INTERVAL)
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = "csv" if args.path.lower().endswith(".csv") else "ndjson"
+    return args
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    summary = asyncio.run(BulkLoader(args).run())
+    print(dumps(summary).decode())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# app/cache.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from arq.connections import ArqRedis
+
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+TOP_NPIS_CACHE_TTL = float(os.getenv("TOP_NPIS_CACHE_TTL", 30))
+TOP_NPIS_CACHE_MAXSIZE = int(os.getenv("TOP_NPIS_CACHE_MAXSIZE", 256))
+TOP_NPIS_CACHE_SHARED = os.getenv("TOP_NPIS_CACHE_SHARED", "true").lower() == "true"
+
+class TTLCache:
+    """Async LRU cache with per-entry TTL and coalescing of concurrent misses.
+
+    When a Redis pool is passed to ``get_or_load`` the cache is shared across
+    processes: entries are stored under a version read from ``version_key``,
+    so bumping that key (see ``bump_version``) invalidates every process.
+    ``decode`` restores the types JSON loses (e.g. Decimals) on values read
+    back from Redis, so every path returns the same types as ``loader``.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        maxsize: int,
+        shared: bool = True,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        self.decode = decode
+        self.version_key = f"{namespace}:version"
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+
+    def _get_local(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _redis_key(self, version: int, key: Hashable) -> str:
+        return f"{self.namespace}:{version}:{':'.join(map(str, key))}"
+
+    async def _version(self, redis: Optional[ArqRedis]) -> int:
+        if redis is None or not self.shared:
+            return 0
+        try:
+            return int(await redis.get(self.version_key) or 0)
+        except Exception as e:
+            logger.warning(f"Cache version lookup failed for {self.namespace}: {e}")
+            return -1
+
+    async def get_or_load(
+        self,
+        key: tuple,
+        loader: Callable[[], Awaitable[Any]],
+        redis: Optional[ArqRedis] = None,
+    ) -> Any:
+        """Return the cached value for ``key`` or load it exactly once."""
+        version = await self._version(redis)
+        if version < 0:
+            # Redis is unavailable, so we can't know the current version
+            return await loader()
+
+        full_key = (version, key)
+        value = self._get_local(full_key)
+        if value is not None:
+            return value
+
+        # Coalesce: concurrent misses wait on the first caller's load
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._load(version, key, loader, redis)
+            self._set_local(full_key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody awaited isn't logged
+            future.exception()
+            raise
+        finally:
+            del self._inflight[full_key]
+
+    async def _load(self, version, key, loader, redis):
+        shared = redis is not None and self.shared
+        if shared:
+            try:
+                cached = await redis.get(self._redis_key(version, key))
+                if cached is not None:
+                    value = loads(cached)
+                    return self.decode(value) if self.decode is not None else value
+            except Exception as e:
+                logger.warning(f"Shared cache read failed for {self.namespace}: {e}")
+
+        value = await loader()
+
+        # Redis rejects a zero expiry, and a zero TTL means nothing to share
+        if shared and self.ttl > 0:
+            try:
+                await redis.set(
+                    self._redis_key(version, key),
+                    dumps(value),
+                    px=int(self.ttl * 1000),
+                )
+            except Exception as e:
+                logger.warning(f"Shared cache write failed for {self.namespace}: {e}")
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+async def bump_version(redis: ArqRedis, namespace: str):
+    """Invalidate a shared cache namespace in every process."""
+    await redis.incr(f"{namespace}:version")
+
+def _decode_top_npis(rows: list) -> list:
+    return [
+        {"provider_npi": row["provider_npi"], "total_net_fee": Decimal(row["total_net_fee"])}
+        for row in rows
+    ]
+
+top_npis_cache = TTLCache(
+    "top_npis",
+    ttl=TOP_NPIS_CACHE_TTL,
+    maxsize=TOP_NPIS_CACHE_MAXSIZE,
+    shared=TOP_NPIS_CACHE_SHARED,
+    decode=_decode_top_npis,
+)
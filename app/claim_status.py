@@ -0,0 +1,198 @@
+# app/claim_status.py
+
+"""Hot-path cache of claim statuses, and notifications of their changes.
+
+Every status transition writes ``claim_status:{claim_id}``, a hash with the
+claim's status and net fee: PENDING in the pipeline that enqueues the claim,
+then the outcome after the worker commits. GET /claims/{id} answers from
+the hash and only falls back to a primary-key lookup on a miss.
+
+Outcomes are also published on CLAIM_STATUS_CHANNEL, one message per
+processed batch. Each API process holds a single subscription
+(``StatusWatcher``) and fans messages out to the requests waiting on those
+claims, so clients waiting for a terminal state cost no queries at all.
+"""
+
+import asyncio
+import logging
+import os
+from decimal import Decimal
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from arq.connections import ArqRedis
+from fastapi import Request
+
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CLAIM_STATUS_TTL = int(os.getenv("CLAIM_STATUS_TTL", 24 * 3600))
+# Non-terminal entries expire sooner, so one missed update can't leave a
+# claim looking PENDING for long
+CLAIM_STATUS_PENDING_TTL = int(os.getenv("CLAIM_STATUS_PENDING_TTL", 300))
+CLAIM_STATUS_CHANNEL = os.getenv("CLAIM_STATUS_CHANNEL", "claim_status")
+# Waiters re-read the hash this often in case a notification was lost
+CLAIM_STATUS_RECHECK = float(os.getenv("CLAIM_STATUS_RECHECK", 5))
+
+TERMINAL_STATUSES = frozenset({"SUCCESS", "PARTIAL_FAILURE", "FAILURE", "FAILED"})
+
+def status_key(claim_id) -> str:
+    return f"claim_status:{claim_id}"
+
+def _ttl(status: str) -> int:
+    return CLAIM_STATUS_TTL if status in TERMINAL_STATUSES else CLAIM_STATUS_PENDING_TTL
+
+def _fields(status: str, net_fee) -> dict:
+    return {"status": status, "net_fee": str(net_fee)}
+
+def _status(claim_id, fields: dict) -> dict:
+    fields = {
+        key.decode() if isinstance(key, bytes) else key: value.decode() if isinstance(value, bytes) else value
+        for key, value in fields.items()
+    }
+    return {"id": str(claim_id), "status": fields["status"], "net_fee": Decimal(fields["net_fee"])}
+
+def is_terminal(status: dict) -> bool:
+    return status["status"] in TERMINAL_STATUSES
+
+def set_status(pipe, claim_id, status: str, net_fee=Decimal("0.00")):
+    """Queue the write of a claim's status on a pipeline."""
+    key = status_key(claim_id)
+    pipe.hset(key, mapping=_fields(status, net_fee))
+    pipe.expire(key, _ttl(status))
+
+async def publish_statuses(redis: ArqRedis, statuses: Dict[str, Tuple[str, Decimal]]):
+    """Write committed transitions and notify waiters in one round trip.
+
+    Best effort: the database stays the source of truth, and an entry left
+    behind by a failed write expires after CLAIM_STATUS_PENDING_TTL.
+    """
+    if not statuses:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for claim_id, (status, net_fee) in statuses.items():
+                set_status(pipe, claim_id, status, net_fee)
+            pipe.publish(CLAIM_STATUS_CHANNEL, dumps({
+                str(claim_id): _fields(status, net_fee) for claim_id, (status, net_fee) in statuses.items()
+            }))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Status update failed for {len(statuses)} claims: {e}")
+
+async def get_status(
+    redis: ArqRedis,
+    claim_id,
+    loader: Callable[[], Awaitable[Optional[Tuple[str, Decimal]]]],
+) -> Optional[dict]:
+    """The claim's status from the hash, or from ``loader`` on a miss; None if there is no such claim."""
+    key = status_key(claim_id)
+    try:
+        fields = await redis.hgetall(key)
+    except Exception as e:
+        logger.warning(f"Status cache read failed for claim {claim_id}: {e}")
+        fields, key = None, None
+    if fields:
+        return _status(claim_id, fields)
+
+    loaded = await loader()
+    if loaded is None:
+        return None
+    status, net_fee = loaded
+    if key is not None:
+        try:
+            # HSETNX, so a transition written since the lookup is never
+            # overwritten, and EXPIRE NX (Redis 7) so its TTL isn't either
+            async with redis.pipeline(transaction=True) as pipe:
+                for field, value in _fields(status, net_fee).items():
+                    pipe.hsetnx(key, field, value)
+                pipe.expire(key, _ttl(status), nx=True)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Status cache write failed for claim {claim_id}: {e}")
+    return _status(claim_id, _fields(status, net_fee))
+
+class StatusWatcher:
+    """One status channel subscription per process, fanned out to local waiters."""
+
+    def __init__(self, redis: ArqRedis, channel: str = CLAIM_STATUS_CHANNEL, recheck: float = CLAIM_STATUS_RECHECK):
+        self.redis = redis
+        self.channel = channel
+        self.recheck = recheck
+        self._waiters: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    logger.info(f"Watching claim statuses on {self.channel}")
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.notify(loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Waiters fall back to rechecking the hash until we're back
+                logger.warning(f"Claim status subscription lost ({e}), reconnecting")
+                await asyncio.sleep(1)
+
+    def notify(self, changes: Dict[str, dict]):
+        """Hand published changes to the requests waiting on those claims."""
+        for claim_id, fields in changes.items():
+            for queue in self._waiters.get(claim_id, ()):
+                queue.put_nowait(_status(claim_id, fields))
+
+    async def watch(
+        self,
+        claim_id: str,
+        load: Callable[[], Awaitable[Optional[dict]]],
+        timeout: float,
+    ) -> AsyncIterator[Optional[dict]]:
+        """Yield the claim's status, then each change, until it is terminal or ``timeout`` passes.
+
+        Yields a single None for an unknown claim. ``load`` reads the
+        current status; it runs once up front and then only every
+        ``recheck`` seconds without a notification.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        # Registered before the first read, so no change can slip in between
+        self._waiters.setdefault(claim_id, set()).add(queue)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            status = await load()
+            yield status
+            while status is not None and not is_terminal(status):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    update = await asyncio.wait_for(queue.get(), min(remaining, self.recheck))
+                except asyncio.TimeoutError:
+                    update = await load()
+                if update is not None and update != status:
+                    status = update
+                    yield status
+        finally:
+            waiters = self._waiters.get(claim_id)
+            if waiters is not None:
+                waiters.discard(queue)
+                if not waiters:
+                    del self._waiters[claim_id]
+
+# Dependency to provide the process-wide watcher
+async def get_status_watcher(request: Request) -> StatusWatcher:
+    return request.app.state.status_watcher
@@ -1,29 +1,18 @@
 # app/db/connection.py
 
 import os
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 import logging
 
-logger = logging.getLogger(__name__)
+from app.db.engine import create_engine
 
-# Get the DATABASE_URL from environment variables
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    "postgresql+asyncpg://postgres:postgres_change_me@db:5432/claims_db"
-)
+logger = logging.getLogger(__name__)
 
-logger.info(f"DATABASE_URL in app.db.connection: {DATABASE_URL}")
+# One engine per process; the API and the ARQ worker each name theirs
+ENGINE_NAME = os.getenv("DB_ENGINE_NAME", "api")
 
-# Create async engine with pool options
-async_engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    pool_recycle=1800
-)
+async_engine = create_engine(ENGINE_NAME)
 
 # Async session factory
 AsyncSessionLocal = sessionmaker(
@@ -0,0 +1,157 @@
+# app/db/engine.py
+
+"""Engine factory shared by the API and the ARQ worker.
+
+Pool sizing and driver options come from the environment so each process
+type can be tuned independently:
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_ECHO
+
+Every engine records pool metrics (checked-out connections, overflow,
+checkout wait time, connection age) in a ``PoolMetrics`` instance.
+"""
+
+import os
+import logging
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Get the DATABASE_URL from environment variables
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "postgresql+asyncpg://postgres:postgres_change_me@db:5432/claims_db"
+)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+class PoolMetrics:
+    """Pool counters fed by SQLAlchemy pool events and checkout timing."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.checkouts = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+        self.checkout_timeouts = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.connection_age_seconds_max = 0.0
+        self.connection_age_seconds_total = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.checkouts += 1
+        self.checkout_wait_seconds_total += seconds
+        if seconds > self.checkout_wait_seconds_max:
+            self.checkout_wait_seconds_max = seconds
+
+    def observe_age(self, seconds: float):
+        self.connection_age_seconds_total += seconds
+        if seconds > self.connection_age_seconds_max:
+            self.connection_age_seconds_max = seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        pool = self.pool
+        return {
+            "size": pool.size() if pool else 0,
+            "checked_out": pool.checkedout() if pool else 0,
+            "checked_in": pool.checkedin() if pool else 0,
+            "overflow": max(pool.overflow(), 0) if pool else 0,
+            # Most connections the pool will open; 0 when overflow is unbounded
+            "capacity": pool.size() + pool._max_overflow if pool and pool._max_overflow >= 0 else 0,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_seconds_avg": (
+                self.checkout_wait_seconds_total / self.checkouts if self.checkouts else 0.0
+            ),
+            "checkout_wait_seconds_max": self.checkout_wait_seconds_max,
+            "connections_opened": self.connections_opened,
+            "connections_closed": self.connections_closed,
+            "connection_age_seconds_avg": (
+                self.connection_age_seconds_total / self.checkouts if self.checkouts else 0.0
+            ),
+            "connection_age_seconds_max": self.connection_age_seconds_max,
+        }
+
+# Metrics of every engine created in this process, by name
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+def _instrumented_pool_class(metrics: PoolMetrics):
+    """Pool class that times each checkout, including time spent waiting."""
+
+    class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            metrics.pool = self
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                # Only pool exhaustion; refused connections or bad credentials
+                # say nothing about saturation
+                metrics.checkout_timeouts += 1
+                raise
+            finally:
+                metrics.observe_wait(time.perf_counter() - start)
+
+    return InstrumentedQueuePool
+
+def _instrument(engine: AsyncEngine, metrics: PoolMetrics):
+    pool = engine.sync_engine.pool
+    metrics.pool = pool
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connections_opened += 1
+        connection_record.info["connected_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            metrics.observe_age(time.monotonic() - connected_at)
+
+    @event.listens_for(pool, "close")
+    def on_close(dbapi_connection, connection_record):
+        metrics.connections_closed += 1
+
+def create_engine(name: str, **overrides) -> AsyncEngine:
+    """Create an async engine configured from the environment.
+
+    ``name`` identifies the engine in ``pool_metrics`` (e.g. "api", "worker").
+    """
+    metrics = PoolMetrics(name)
+    options = dict(
+        echo=DB_ECHO,
+        poolclass=_instrumented_pool_class(metrics),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if "+asyncpg" in DATABASE_URL:
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    options.update(overrides)
+
+    engine = create_async_engine(DATABASE_URL, **options)
+    _instrument(engine, metrics)
+    pool_metrics[name] = metrics
+    logger.info(
+        f"Created {name} engine (pool_size={options['pool_size']}, "
+        f"max_overflow={options['max_overflow']}, pre_ping={options['pool_pre_ping']})"
+    )
+    return engine
@@ -0,0 +1,99 @@
+# app/db/partitions.py
+
+"""Monthly range partitions of claimprocedure by service_date.
+
+Usage: python -m app.db.partitions (creates the current month and
+PARTITION_MONTHS_AHEAD months ahead; the worker does the same daily).
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+from typing import List, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "claimprocedure"
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+def month_start(value: Union[date, datetime]) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def months_between(first: date, last: date) -> List[date]:
+    """Every month start from ``first``'s month to ``last``'s month, inclusive."""
+    months = []
+    month = month_start(first)
+    while month <= month_start(last):
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def partition_name(month: date) -> str:
+    return f"{PARTITIONED_TABLE}_y{month.year}m{month.month:02d}"
+
+def create_partition_sql(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARTITIONED_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+def create_default_partition_sql() -> str:
+    # Catches service dates outside every monthly partition
+    return f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARTITIONED_TABLE} DEFAULT"
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": PARTITIONED_TABLE})
+    return result.first() is not None
+
+async def ensure_partitions(
+    conn: AsyncConnection,
+    first: Optional[date] = None,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+) -> List[str]:
+    """Create any missing monthly partitions from ``first`` (default: this month) onwards.
+
+    Returns the names of the partitions that are now in place. A month whose
+    rows already landed in the default partition cannot be created and is
+    logged and skipped.
+    """
+    if not await is_partitioned(conn):
+        logger.warning(f"{PARTITIONED_TABLE} is not partitioned; run the Alembic migrations")
+        return []
+
+    today = date.today()
+    months = months_between(first or today, add_months(month_start(today), months_ahead))
+    ensured = []
+    await conn.execute(text(create_default_partition_sql()))
+    for month in months:
+        try:
+            # A savepoint per partition so one failure doesn't abort the rest
+            async with conn.begin_nested():
+                await conn.execute(text(create_partition_sql(month)))
+            ensured.append(partition_name(month))
+        except Exception as e:
+            logger.error(f"Could not create partition {partition_name(month)}: {e}")
+    return ensured
+
+async def main():
+    from app.db.connection import async_engine
+
+    async with async_engine.begin() as conn:
+        ensured = await ensure_partitions(conn)
+    logger.info(f"Partitions in place: {', '.join(ensured) or 'none'}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
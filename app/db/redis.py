@@ -0,0 +1,46 @@
+# app/db/redis.py
+
+import os
+import logging
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from fastapi import Request
+
+from app.serialization import job_serializer, job_deserializer
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing and timeouts for the API's long-lived Redis pool
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_CONN_TIMEOUT = int(os.getenv("REDIS_CONN_TIMEOUT", 1))
+REDIS_CONN_RETRIES = int(os.getenv("REDIS_CONN_RETRIES", 5))
+REDIS_CONN_RETRY_DELAY = int(os.getenv("REDIS_CONN_RETRY_DELAY", 1))
+
+def get_redis_settings() -> RedisSettings:
+    """Build the RedisSettings shared by the API and the ARQ worker."""
+    return RedisSettings(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        conn_timeout=REDIS_CONN_TIMEOUT,
+        conn_retries=REDIS_CONN_RETRIES,
+        conn_retry_delay=REDIS_CONN_RETRY_DELAY,
+        max_connections=REDIS_MAX_CONNECTIONS,
+    )
+
+async def create_redis_pool() -> ArqRedis:
+    """Open the ARQ/Redis pool owned by the application for its whole lifetime."""
+    redis = await create_pool(
+        get_redis_settings(),
+        job_serializer=job_serializer,
+        job_deserializer=job_deserializer,
+    )
+    logger.info(f"Redis pool ready (max_connections={REDIS_MAX_CONNECTIONS})")
+    return redis
+
+async def close_redis_pool(redis: ArqRedis):
+    """Close the pool and every connection it holds."""
+    await redis.aclose(close_connection_pool=True)
+
+# Dependency to provide the shared Redis pool
+async def get_redis(request: Request) -> ArqRedis:
+    return request.app.state.redis
@@ -0,0 +1,90 @@
+# app/export.py
+
+"""Streaming export of claims with their procedures as NDJSON or CSV.
+
+Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE and are
+encoded batch by batch, so memory use does not grow with the export size.
+"""
+
+import csv
+import io
+import os
+from typing import AsyncIterator, Optional, Sequence
+
+from sqlalchemy import select
+
+from app.db.connection import AsyncSessionLocal
+from app.models import Claim, ClaimProcedure
+from app.serialization import dumps
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+CLAIM_COLUMNS = ("id", "claim_number", "plan_group", "subscriber_number", "net_fee", "status")
+PROCEDURE_COLUMNS = (
+    "id", "service_date", "submitted_procedure", "quadrant", "provider_npi", "provider_fees",
+    "allowed_fees", "member_coinsurance", "member_copay", "net_fee", "status",
+)
+CSV_HEADER = [f"claim_{column}" for column in CLAIM_COLUMNS] + [f"procedure_{column}" for column in PROCEDURE_COLUMNS]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_query(status: Optional[str] = None):
+    """One row per procedure (or per claim without procedures), grouped by claim."""
+    query = (
+        select(
+            *(getattr(Claim, column) for column in CLAIM_COLUMNS),
+            *(getattr(ClaimProcedure, column) for column in PROCEDURE_COLUMNS),
+        )
+        .outerjoin(ClaimProcedure, ClaimProcedure.claim_id == Claim.id)
+        .order_by(Claim.id)
+    )
+    if status is not None:
+        query = query.where(Claim.status == status)
+    return query
+
+async def stream_rows(query, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[tuple]]:
+    """Yield batches of rows from a server-side cursor on its own session.
+
+    The session is opened here rather than injected, because a streaming
+    response outlives the request's dependencies.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield rows
+
+async def ndjson_chunks(batches: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    """One JSON object per claim with a nested ``procedures`` list."""
+    split = len(CLAIM_COLUMNS)
+    current = None
+    async for rows in batches:
+        lines = []
+        for row in rows:
+            if current is None or current["id"] != row[0]:
+                if current is not None:
+                    lines.append(dumps(current))
+                current = dict(zip(CLAIM_COLUMNS, row[:split]))
+                current["procedures"] = []
+            if row[split] is not None:
+                current["procedures"].append(dict(zip(PROCEDURE_COLUMNS, row[split:])))
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    if current is not None:
+        yield dumps(current) + b"\n"
+
+async def csv_chunks(batches: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    """One CSV line per procedure, prefixed with its claim's columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def export_chunks(format: str, status: Optional[str] = None) -> AsyncIterator[bytes]:
+    encode = ndjson_chunks if format == "ndjson" else csv_chunks
+    return encode(stream_rows(export_query(status)))
@@ -2,18 +2,51 @@
 
 import os
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import claim
-from app.middleware.lowercase_keys_middleware import LowercaseKeysMiddleware
+from app.db.redis import create_redis_pool, close_redis_pool
+from app.claim_status import StatusWatcher
+from app.serialization import JSONResponse
+from app.metrics import render_metrics
+from app.middleware.metrics_middleware import MetricsMiddleware
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the shared Redis pool and status watcher for the application's lifetime."""
+    if ENVIRONMENT == "development":
+        from sqlmodel import SQLModel
+        from app.db.connection import async_engine
+        from app.db.partitions import ensure_partitions
+
+        # Create all tables on startup if they don't already exist (dev only)
+        async with async_engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await ensure_partitions(conn)
+
+    app.state.redis = await create_redis_pool()
+    # One status subscription per process, shared by every waiting request
+    app.state.status_watcher = StatusWatcher(app.state.redis)
+    app.state.status_watcher.start()
+    try:
+        yield
+    finally:
+        await app.state.status_watcher.stop()
+        # Drain the pool so in-flight connections are closed cleanly on shutdown
+        await close_redis_pool(app.state.redis)
+
 app = FastAPI(
     title="Claim Process API",
     description="API for processing and retrieving claims.",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=JSONResponse,
 )
 
 app.add_middleware(
@@ -24,23 +57,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(LowercaseKeysMiddleware)
-
-ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
-
-if ENVIRONMENT == "development":
-    from sqlmodel import SQLModel
-    from app.db.connection import async_engine
-
-    @app.on_event("startup")
-    async def on_startup():
-        """Create all tables on startup if they don't already exist (dev only)."""
-        async with async_engine.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Simple health check endpoint."""
     return {"status": "OK"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    payload, content_type = render_metrics()
+    return Response(payload, media_type=content_type)
+
 app.include_router(claim.router, prefix="/claims", tags=["Claims"])
@@ -0,0 +1,204 @@
+# app/metrics.py
+
+"""Prometheus metrics for the API, the claim queue and the worker.
+
+The API serves them on ``/metrics``; the worker starts its own exporter on
+``WORKER_METRICS_PORT``. Set ``PROMETHEUS_MULTIPROC_DIR`` when running
+several processes (uvicorn workers, the worker supervisor) so scrapes
+aggregate all of them.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9100))
+QUEUE_METRICS_INTERVAL = float(os.getenv("QUEUE_METRICS_INTERVAL", 5))
+
+# Latency buckets from 1ms to 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROCESS_CLAIM_STAGE = Histogram(
+    "process_claim_stage_seconds",
+    "Duration of each process_claim stage, per batch",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROCESS_CLAIM_BATCH_SIZE = Histogram(
+    "process_claim_batch_size",
+    "Claims processed per batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+QUEUE_DEPTH = Gauge(
+    "arq_queue_depth",
+    "Jobs in the ARQ queue, ready to run or deferred",
+    ["state"],
+    multiprocess_mode="max",
+)
+
+QUEUE_OLDEST_JOB_AGE = Gauge(
+    "arq_queue_oldest_job_age_seconds",
+    "How long the oldest ready job has been waiting",
+    multiprocess_mode="max",
+)
+
+JOB_QUEUE_WAIT = Histogram(
+    "arq_job_queue_wait_seconds",
+    "Time from enqueue to start, by function",
+    ["function"],
+    buckets=LATENCY_BUCKETS + (30, 60, 300),
+)
+
+JOB_DURATION = Histogram(
+    "arq_job_duration_seconds",
+    "Job run time, by function",
+    ["function"],
+    buckets=LATENCY_BUCKETS + (30, 60),
+)
+
+WORKER_JOB_LIMIT = Gauge(
+    "arq_worker_job_limit",
+    "Current limit on concurrently running jobs",
+    multiprocess_mode="livesum",
+)
+
+CLAIM_RETRIES = Counter(
+    "claim_retries_total",
+    "process_claim retries scheduled, by error class",
+    ["error"],
+)
+
+CLAIM_DEAD_LETTERS = Counter(
+    "claim_dead_letters_total",
+    "Claims moved to the dead letter queue",
+)
+
+CLAIM_STATUS_TRANSITIONS = Counter(
+    "claim_status_transitions_total",
+    "Claim status changes, by new status",
+    ["status"],
+)
+
+CLAIM_PAYLOAD_BYTES = Histogram(
+    "claim_payload_bytes",
+    "Bytes stored in Redis per claim payload",
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144),
+)
+
+class StageTimer:
+    """Record consecutive stage durations into PROCESS_CLAIM_STAGE."""
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        PROCESS_CLAIM_STAGE.labels(stage).observe(now - self.last)
+        self.last = now
+
+class JobTimer:
+    """Context manager recording a job's run time into JOB_DURATION."""
+
+    def __init__(self, function: str):
+        self.function = function
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        JOB_DURATION.labels(self.function).observe(time.perf_counter() - self.start)
+        return False
+
+class PoolMetricsCollector:
+    """Expose app.db.engine pool metrics as gauges at scrape time."""
+
+    def collect(self):
+        from app.db.engine import pool_metrics
+
+        families = {}
+        for name, metrics in pool_metrics.items():
+            for key, value in metrics.snapshot().items():
+                family = families.get(key)
+                if family is None:
+                    family = families[key] = GaugeMetricFamily(
+                        f"db_pool_{key}", f"SQLAlchemy pool {key.replace('_', ' ')}", labels=["engine"]
+                    )
+                family.add_metric([name], value)
+        return list(families.values())
+
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    REGISTRY.register(PoolMetricsCollector())
+
+def render_metrics():
+    """Return the metrics payload and its content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(PoolMetricsCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def start_worker_exporter():
+    """Serve worker metrics over HTTP if WORKER_METRICS_PORT is set."""
+    if not WORKER_METRICS_PORT:
+        return
+    from prometheus_client import start_http_server
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(WORKER_METRICS_PORT, registry=registry)
+    else:
+        start_http_server(WORKER_METRICS_PORT)
+    logger.info(f"Worker metrics exporter listening on :{WORKER_METRICS_PORT}")
+
+async def sample_queue(redis, queue_name: str):
+    """Record queue depth and the age of the oldest ready job."""
+    now_ms = time.time() * 1000
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zcard(queue_name)
+        pipe.zcount(queue_name, "-inf", now_ms)
+        pipe.zrange(queue_name, 0, 0, withscores=True)
+        total, ready, oldest = await pipe.execute()
+
+    QUEUE_DEPTH.labels("ready").set(ready)
+    QUEUE_DEPTH.labels("deferred").set(total - ready)
+    # Scores are enqueue (or defer-until) times in ms
+    age = (now_ms - oldest[0][1]) / 1000 if oldest and ready else 0
+    QUEUE_OLDEST_JOB_AGE.set(max(age, 0))
+
+async def sample_queue_forever(redis, queue_name: str):
+    """Background loop started by the worker."""
+    while True:
+        try:
+            await sample_queue(redis, queue_name)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Queue metrics sampling failed: {e}")
+        await asyncio.sleep(QUEUE_METRICS_INTERVAL)
@@ -1,3 +1,5 @@
 # app/models/__init__.py
 
 from .claim import Claim, ClaimProcedure
+from .npi import NpiNetFeeTotal
+from .payment import PaymentOutbox
@@ -7,9 +7,13 @@ from datetime import datetime
 from typing import Optional, List
 
 class ClaimProcedure(SQLModel, table=True):
+    # Range-partitioned by month of service_date (see app/db/partitions.py),
+    # so the partition key is part of the primary key
+    __table_args__ = {"postgresql_partition_by": "RANGE (service_date)"}
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     claim_id: uuid.UUID = Field(foreign_key="claim.id", nullable=False, index=True)
-    service_date: datetime
+    service_date: datetime = Field(primary_key=True)
     submitted_procedure: str
     quadrant: Optional[str] = None
     provider_npi: str = Field(index=True)
@@ -50,12 +54,17 @@ class Claim(SQLModel, table=True):
 
     def update_status(self):
         """Update the status based on the status of related procedures."""
-        statuses = {procedure.status for procedure in self.procedures}
+        self.status = Claim.status_from_procedures(self.procedures)
+
+    @staticmethod
+    def status_from_procedures(procedures: List[ClaimProcedure]) -> str:
+        """Derive a claim status from the statuses of its procedures."""
+        statuses = {procedure.status for procedure in procedures}
         if "FAILED" in statuses and "SUCCESS" in statuses:
-            self.status = "PARTIAL_FAILURE"
+            return "PARTIAL_FAILURE"
         elif "FAILED" in statuses:
-            self.status = "FAILURE"
+            return "FAILURE"
         elif all(status == "SUCCESS" for status in statuses):
-            self.status = "SUCCESS"
+            return "SUCCESS"
         else:
-            self.status = "PROCESSING"
+            return "PROCESSING"
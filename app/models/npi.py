@@ -0,0 +1,20 @@
+# app/models/npi.py
+
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+from decimal import Decimal
+
+class NpiNetFeeTotal(SQLModel, table=True):
+    """Running total of net fees per provider NPI, maintained by the worker."""
+    __tablename__ = "npi_net_fee_totals"
+    __table_args__ = (
+        # Descending index so top-N (and keyset paging) is an index scan
+        Index(
+            "ix_npi_net_fee_totals_total_net_fee",
+            text("total_net_fee DESC"),
+            text("provider_npi DESC"),
+        ),
+    )
+
+    provider_npi: str = Field(primary_key=True)
+    total_net_fee: Decimal = Decimal("0.00")
@@ -0,0 +1,35 @@
+# app/models/payment.py
+
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, DateTime, Index, text
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+import uuid
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class PaymentOutbox(SQLModel, table=True):
+    """One payment per processed claim, written in the claim's transaction."""
+    __tablename__ = "payment_outbox"
+    __table_args__ = (
+        # Only pending rows are ever swept, so keep the index to those
+        Index(
+            "ix_payment_outbox_pending",
+            "updated_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
+
+    claim_id: uuid.UUID = Field(foreign_key="claim.id", primary_key=True)
+    idempotency_key: str = Field(unique=True)
+    amount: Decimal
+    status: str = Field(default="PENDING")
+    attempts: int = 0
+    last_error: Optional[str] = None
+    # Timezone-aware, matching the migration. The defaults live on the
+    # columns: SQLModel ignores default_factory once sa_column is given
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False, default=utcnow))
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False, default=utcnow))
+    sent_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
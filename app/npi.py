@@ -0,0 +1,145 @@
+# app/npi.py
+
+"""NPI check digit validation and the optional provider registry.
+
+An NPI's 10th digit is a Luhn check digit computed over the 9 leading
+digits prefixed with the card issuer code 80840. When NPI_REGISTRY_PATH
+points to an index built from an NPPES extract, submitted NPIs must also
+be registered providers:
+
+    python -m app.npi build npidata_pfile.csv /data/npi.idx
+
+The index is the sorted, de-duplicated NPIs as little-endian uint64 after
+a 16-byte header. It is memory-mapped, so the OS pages in only the parts
+binary searches touch and every worker process shares one copy, and an
+in-process LRU answers repeated NPIs without searching at all.
+"""
+
+import argparse
+import bisect
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+NPI_REGISTRY_PATH = os.getenv("NPI_REGISTRY_PATH")
+NPI_REGISTRY_CACHE_SIZE = int(os.getenv("NPI_REGISTRY_CACHE_SIZE", 65536))
+
+INDEX_MAGIC = b"NPIIDX1\0"
+INDEX_HEADER = struct.Struct("<8sQ")  # magic, entry count
+
+# The prefix 80840 adds a constant 24 to the Luhn sum of the 9 leading digits
+NPI_PREFIX_SUM = 24
+# ASCII digit -> its Luhn value in a plain or a doubled position
+_PLAIN = bytes.maketrans(b"0123456789", bytes(range(10)))
+_DOUBLED = bytes.maketrans(b"0123456789", bytes((0, 2, 4, 6, 8, 1, 3, 5, 7, 9)))
+
+def _luhn_sum(base: bytes) -> int:
+    # Counting from the check digit, the 9th, 7th, ... digits are doubled
+    return NPI_PREFIX_SUM + sum(base[0:9:2].translate(_DOUBLED)) + sum(base[1:9:2].translate(_PLAIN))
+
+def npi_check_digit(base: str) -> int:
+    """Check digit for the 9 leading digits of an NPI."""
+    return (10 - _luhn_sum(base.encode()) % 10) % 10
+
+def is_valid_npi(npi: str) -> bool:
+    """True for 10 digits whose last digit is the Luhn check digit."""
+    if len(npi) != 10 or not npi.isdigit() or not npi.isascii():
+        return False
+    data = npi.encode()
+    return (_luhn_sum(data) + data[9] - 48) % 10 == 0
+
+class NpiRegistry:
+    """Read-only, memory-mapped index of registered NPIs."""
+
+    def __init__(self, path: str, cache_size: int = NPI_REGISTRY_CACHE_SIZE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = INDEX_HEADER.unpack_from(self._mmap)
+        if magic != INDEX_MAGIC or len(self._mmap) != INDEX_HEADER.size + count * 8:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an NPI registry index")
+        if sys.byteorder != "little":  # pragma: no cover - no such hosts in production
+            raise RuntimeError("NPI registry indexes are little-endian")
+        # C-level bisect straight over the mapped bytes, nothing is copied
+        self._npis = memoryview(self._mmap)[INDEX_HEADER.size:].cast("Q")
+        self.contains = lru_cache(maxsize=cache_size)(self._contains)
+
+    def __len__(self) -> int:
+        return len(self._npis)
+
+    def _contains(self, npi: str) -> bool:
+        value = int(npi)
+        index = bisect.bisect_left(self._npis, value)
+        return index < len(self._npis) and self._npis[index] == value
+
+    def __contains__(self, npi: str) -> bool:
+        return self.contains(npi)
+
+    def close(self):
+        self._npis.release()
+        self._mmap.close()
+
+@lru_cache(maxsize=1)
+def _load_registry(path: str) -> NpiRegistry:
+    registry = NpiRegistry(path)
+    logger.info(f"Loaded NPI registry {path} with {len(registry)} providers")
+    return registry
+
+def get_registry() -> Optional[NpiRegistry]:
+    """The configured registry, opened on first use, or None without one."""
+    if not NPI_REGISTRY_PATH:
+        return None
+    return _load_registry(NPI_REGISTRY_PATH)
+
+def build_index(npis: Iterable[str], path: str) -> int:
+    """Write the sorted, unique NPIs to an index file and return how many."""
+    values = array("Q", sorted({int(npi) for npi in npis}))
+    if sys.byteorder != "little":  # pragma: no cover
+        values.byteswap()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(values)))
+        values.tofile(f)
+    # Readers never see a partially written index
+    os.replace(tmp, path)
+    return len(values)
+
+def read_nppes(path: str, column: str = "NPI") -> Iterable[str]:
+    """Valid NPIs from the ``column`` of an NPPES CSV extract."""
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        for row in csv.DictReader(f):
+            npi = (row.get(column) or "").strip()
+            if is_valid_npi(npi):
+                yield npi
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the NPI registry index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index the NPIs of an NPPES CSV extract")
+    build.add_argument("csv")
+    build.add_argument("index")
+    build.add_argument("--column", default="NPI")
+    check = commands.add_parser("check", help="look NPIs up in an index")
+    check.add_argument("index")
+    check.add_argument("npis", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(read_nppes(args.csv, args.column), args.index)
+        print(f"Indexed {count} NPIs into {args.index}")
+    else:
+        registry = NpiRegistry(args.index)
+        for npi in args.npis:
+            print(npi, "valid" if is_valid_npi(npi) else "bad check digit", "registered" if npi in registry else "not registered")
+
+if __name__ == "__main__":
+    main()
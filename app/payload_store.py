@@ -0,0 +1,125 @@
+# app/payload_store.py
+
+"""Single-copy store for claim procedure payloads awaiting processing.
+
+Each claim's procedures are written once to ``claim_procedures:{claim_id}``
+as compact rows (no repeated field names), zlib-compressed above a size
+threshold and with a TTL. Jobs reference the payload by claim ID, and the
+worker deletes it once the claim reaches a terminal state.
+
+Compact rows are only ever written from procedures the API already
+validated, so the worker trusts them: ``decode_procedures(data, typed=True)``
+restores Decimal and datetime values directly instead of validating again.
+"""
+
+import logging
+import os
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from arq.connections import ArqRedis
+
+from app.metrics import CLAIM_PAYLOAD_BYTES
+from app.schemas.procedure import validate_procedures
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CLAIM_PAYLOAD_TTL = int(os.getenv("CLAIM_PAYLOAD_TTL", 7 * 24 * 3600))
+CLAIM_PAYLOAD_COMPRESS_MIN = int(os.getenv("CLAIM_PAYLOAD_COMPRESS_MIN", 1024))
+
+# Field order of the compact row encoding
+PROCEDURE_FIELDS = (
+    "service_date",
+    "submitted_procedure",
+    "quadrant",
+    "provider_npi",
+    "provider_fees",
+    "allowed_fees",
+    "member_coinsurance",
+    "member_copay",
+)
+
+# First byte of every stored payload
+RAW, COMPRESSED = b"\x01", b"\x02"
+
+def payload_key(claim_id) -> str:
+    return f"claim_procedures:{claim_id}"
+
+def _row(procedure) -> list:
+    if isinstance(procedure, dict):
+        return [procedure.get(field) for field in PROCEDURE_FIELDS]
+    # Validated models are read directly, without a model_dump() per procedure
+    return [getattr(procedure, field) for field in PROCEDURE_FIELDS]
+
+def encode_procedures(procedures: Iterable) -> bytes:
+    """Encode procedure dicts or ProcedureCreate models as compact, optionally compressed rows."""
+    body = dumps([_row(procedure) for procedure in procedures])
+    if len(body) >= CLAIM_PAYLOAD_COMPRESS_MIN:
+        return COMPRESSED + zlib.compress(body, 1)
+    return RAW + body
+
+def procedure_from_row(row: list) -> dict:
+    """Typed procedure dict from a trusted compact row, without validation."""
+    service_date, submitted_procedure, quadrant, provider_npi, provider_fees, allowed_fees, coinsurance, copay = row
+    return {
+        "service_date": datetime.fromisoformat(service_date),
+        "submitted_procedure": submitted_procedure,
+        "quadrant": quadrant,
+        "provider_npi": provider_npi,
+        "provider_fees": Decimal(provider_fees),
+        "allowed_fees": Decimal(allowed_fees),
+        "member_coinsurance": Decimal(coinsurance),
+        "member_copay": Decimal(copay),
+    }
+
+def decode_procedures(data: bytes, typed: bool = False) -> List[dict]:
+    """Decode a stored payload back into procedure dicts.
+
+    With ``typed`` the values are Decimals and datetimes, ready to build
+    ClaimProcedure rows from.
+    """
+    if data[:1] == COMPRESSED:
+        body = zlib.decompress(data[1:])
+    elif data[:1] == RAW:
+        body = data[1:]
+    else:
+        # Plain JSON list of dicts written by earlier releases, not trusted
+        procedures = loads(data)
+        if typed:
+            return [procedure.model_dump() for procedure in validate_procedures(procedures)]
+        return procedures
+    if typed:
+        return [procedure_from_row(row) for row in loads(body)]
+    return [dict(zip(PROCEDURE_FIELDS, row)) for row in loads(body)]
+
+def store_procedures(pipe, claim_id, procedures: Iterable) -> int:
+    """Queue the payload write on a pipeline and return its size in bytes."""
+    data = encode_procedures(procedures)
+    pipe.set(payload_key(claim_id), data, ex=CLAIM_PAYLOAD_TTL)
+    CLAIM_PAYLOAD_BYTES.observe(len(data))
+    return len(data)
+
+async def load_payloads(redis: ArqRedis, claim_ids: List[str]) -> Dict[str, Optional[bytes]]:
+    """Fetch the encoded payloads of many claims with one MGET."""
+    if not claim_ids:
+        return {}
+    blobs = await redis.mget([payload_key(claim_id) for claim_id in claim_ids])
+    return dict(zip(claim_ids, blobs))
+
+async def load_procedures(
+    redis: ArqRedis, claim_ids: List[str], typed: bool = False
+) -> Dict[str, Optional[List[dict]]]:
+    """Fetch and decode the payloads of many claims with one MGET."""
+    return {
+        claim_id: decode_procedures(blob, typed) if blob is not None else None
+        for claim_id, blob in (await load_payloads(redis, claim_ids)).items()
+    }
+
+async def delete_procedures(redis: ArqRedis, claim_ids: Iterable[str]):
+    """Drop payloads of claims that reached a terminal state."""
+    keys = [payload_key(claim_id) for claim_id in claim_ids]
+    if keys:
+        await redis.delete(*keys)
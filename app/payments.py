@@ -0,0 +1,222 @@
+# app/payments.py
+
+"""Payments client, batched dispatcher and the payment outbox.
+
+Every fully successful claim gets a ``payment_outbox`` row in the same
+transaction that stores its results. The worker then hands the payment to
+a ``PaymentDispatcher``, which groups up to PAYMENTS_BATCH_SIZE payments
+(or whatever arrived within PAYMENTS_FLUSH_MS) into one request to the
+Payments service. The outcome is recorded on the outbox rows. Rows still
+PENDING after PAYMENTS_RETRY_AFTER seconds, e.g. because the worker
+restarted mid-flight, are swept and sent again. Each payment carries an
+idempotency key derived from its claim ID, so a resend is never paid twice.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.batching import MicroBatcher
+from app.db.connection import AsyncSessionLocal
+from app.models import PaymentOutbox
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+PAYMENTS_URL = os.getenv("PAYMENTS_URL")
+PAYMENTS_BATCH_SIZE = int(os.getenv("PAYMENTS_BATCH_SIZE", 100))
+PAYMENTS_FLUSH_MS = float(os.getenv("PAYMENTS_FLUSH_MS", 50))
+PAYMENTS_TIMEOUT = float(os.getenv("PAYMENTS_TIMEOUT", 10))
+PAYMENTS_MAX_CONNECTIONS = int(os.getenv("PAYMENTS_MAX_CONNECTIONS", 20))
+PAYMENTS_RETRY_AFTER = float(os.getenv("PAYMENTS_RETRY_AFTER", 60))
+PAYMENTS_SWEEP_LIMIT = int(os.getenv("PAYMENTS_SWEEP_LIMIT", 1000))
+
+# Fixed namespace so a claim's key is the same in every process and release
+IDEMPOTENCY_NAMESPACE = uuid.UUID("6f1c2a8e-93d4-4b5e-8a7c-0d2e4f6b8a10")
+
+Payment = Tuple[str, Decimal]
+
+class PaymentRejected(Exception):
+    """The Payments service refused a payment; resending won't change that."""
+
+def idempotency_key(claim_id) -> str:
+    return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, f"payment:{claim_id}"))
+
+async def add_to_outbox(session: AsyncSession, payments: Iterable[Payment]):
+    """Record payments within the caller's transaction; existing rows are kept."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "claim_id": uuid.UUID(str(claim_id)),
+            "idempotency_key": idempotency_key(claim_id),
+            "amount": amount,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for claim_id, amount in payments
+    ]
+    if rows:
+        await session.execute(
+            insert(PaymentOutbox).values(rows).on_conflict_do_nothing(index_elements=[PaymentOutbox.claim_id])
+        )
+
+async def record_results(results: Dict[str, Optional[Exception]]):
+    """Mark outbox rows SENT or REJECTED, or count the failed attempt and keep them PENDING."""
+    sent = [uuid.UUID(claim_id) for claim_id, error in results.items() if error is None]
+    failed = {claim_id: error for claim_id, error in results.items() if error is not None}
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        if sent:
+            await session.execute(
+                update(PaymentOutbox)
+                # A late success never overrides a REJECTED (or already SENT) row
+                .where(PaymentOutbox.claim_id.in_(sent), PaymentOutbox.status == "PENDING")
+                .values(status="SENT", sent_at=now, updated_at=now, attempts=PaymentOutbox.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+        for claim_id, error in failed.items():
+            status = "REJECTED" if isinstance(error, PaymentRejected) else "PENDING"
+            await session.execute(
+                update(PaymentOutbox)
+                .where(PaymentOutbox.claim_id == uuid.UUID(claim_id), PaymentOutbox.status == "PENDING")
+                .values(status=status, last_error=str(error)[:500], updated_at=now, attempts=PaymentOutbox.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+
+class PaymentsClient:
+    """Pooled HTTP client for the Payments service's batch endpoint."""
+
+    def __init__(self, base_url: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=PAYMENTS_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=PAYMENTS_MAX_CONNECTIONS,
+                max_keepalive_connections=PAYMENTS_MAX_CONNECTIONS,
+            ),
+            transport=transport,
+        )
+
+    async def send_batch(self, payments: List[Payment]) -> Dict[str, Optional[Exception]]:
+        """POST one batch and return each claim's outcome (None when paid)."""
+        body = {
+            "payments": [
+                {"idempotency_key": idempotency_key(claim_id), "claim_id": str(claim_id), "amount": amount}
+                for claim_id, amount in payments
+            ]
+        }
+        response = await self.http.post(
+            "/payments/batch", content=dumps(body), headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+
+        by_key = {item["idempotency_key"]: item for item in loads(response.content)["results"]}
+        results = {}
+        for claim_id, _ in payments:
+            item = by_key.get(idempotency_key(claim_id))
+            if item is None:
+                results[str(claim_id)] = RuntimeError("No result returned for payment")
+            elif item["status"] in ("accepted", "duplicate"):
+                results[str(claim_id)] = None
+            else:
+                results[str(claim_id)] = PaymentRejected(item.get("error") or item["status"])
+        return results
+
+    async def close(self):
+        await self.http.aclose()
+
+class PaymentDispatcher:
+    """Batch payments from concurrent claims into few downstream requests."""
+
+    def __init__(
+        self,
+        client: PaymentsClient,
+        batch_size: int = PAYMENTS_BATCH_SIZE,
+        flush_ms: float = PAYMENTS_FLUSH_MS,
+        record: Callable[[Dict[str, Optional[Exception]]], Awaitable[None]] = record_results,
+    ):
+        self.client = client
+        self.record = record
+        self.batcher = MicroBatcher(self._send, max_size=batch_size, max_wait_ms=flush_ms)
+        self._tasks = set()
+
+    async def _send(self, items: List[Tuple[str, Decimal]]) -> Dict[str, Optional[Exception]]:
+        try:
+            results = await self.client.send_batch(items)
+        except Exception as e:
+            logger.warning(f"Payment batch of {len(items)} failed, will retry from the outbox: {e}")
+            results = {claim_id: e for claim_id, _ in items}
+        await self.record(results)
+        return results
+
+    async def send(self, payments: Iterable[Payment]) -> Dict[str, Optional[Exception]]:
+        """Send payments and wait for their outcomes."""
+        payments = [(str(claim_id), amount) for claim_id, amount in payments]
+        outcomes = await asyncio.gather(
+            *(self.batcher.submit(claim_id, amount) for claim_id, amount in payments),
+            return_exceptions=True,
+        )
+        return {claim_id: outcome for (claim_id, _), outcome in zip(payments, outcomes)}
+
+    def dispatch(self, payments: Iterable[Payment]):
+        """Send payments in the background; failures stay in the outbox."""
+        payments = list(payments)
+        if not payments:
+            return
+        task = asyncio.create_task(self.send(payments))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Flush pending payments, wait for in-flight ones and close the client."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.batcher.close()
+        await self.client.close()
+
+async def sweep_outbox(dispatcher: PaymentDispatcher, limit: int = PAYMENTS_SWEEP_LIMIT) -> int:
+    """Resend payments left PENDING for longer than PAYMENTS_RETRY_AFTER seconds."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        # Claim the rows by touching updated_at, so concurrent sweepers skip them
+        stale = (
+            select(PaymentOutbox.claim_id)
+            .where(
+                PaymentOutbox.status == "PENDING",
+                PaymentOutbox.updated_at < now - timedelta(seconds=PAYMENTS_RETRY_AFTER),
+            )
+            .order_by(PaymentOutbox.updated_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = (await session.execute(
+            update(PaymentOutbox)
+            .where(PaymentOutbox.claim_id.in_(stale.scalar_subquery()))
+            .values(updated_at=now)
+            .returning(PaymentOutbox.claim_id, PaymentOutbox.amount)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await session.commit()
+
+    if rows:
+        logger.info(f"Resending {len(rows)} pending payments from the outbox")
+        await dispatcher.send([(str(claim_id), amount) for claim_id, amount in rows])
+    return len(rows)
+
+def create_dispatcher() -> Optional[PaymentDispatcher]:
+    """The worker's dispatcher, or None when PAYMENTS_URL isn't configured."""
+    if not PAYMENTS_URL:
+        logger.warning("PAYMENTS_URL is not set; payments stay in the outbox until it is")
+        return None
+    return PaymentDispatcher(PaymentsClient(PAYMENTS_URL))
@@ -0,0 +1,51 @@
+# app/payments_stub.py
+
+"""Stand-in for the downstream Payments service, for local runs and tests.
+
+    python -m app.payments_stub  # serves on PAYMENTS_STUB_PORT (8001)
+
+Implements ``POST /payments/batch`` with the contract ``app.payments``
+relies on: each payment is answered ``accepted`` the first time its
+idempotency key is seen and ``duplicate`` after that.
+"""
+
+import os
+from decimal import Decimal
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from app.serialization import JSONResponse
+
+PAYMENTS_STUB_PORT = int(os.getenv("PAYMENTS_STUB_PORT", 8001))
+
+class PaymentIn(BaseModel):
+    idempotency_key: str
+    claim_id: str
+    amount: Decimal
+
+class PaymentBatch(BaseModel):
+    payments: List[PaymentIn]
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Payments stub", default_response_class=JSONResponse)
+    app.state.paid = {}
+
+    @app.post("/payments/batch")
+    async def pay_batch(batch: PaymentBatch):
+        results = []
+        for payment in batch.payments:
+            status = "duplicate" if payment.idempotency_key in app.state.paid else "accepted"
+            app.state.paid.setdefault(payment.idempotency_key, payment)
+            results.append({"idempotency_key": payment.idempotency_key, "status": status})
+        return {"results": results}
+
+    return app
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=PAYMENTS_STUB_PORT)
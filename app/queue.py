@@ -0,0 +1,36 @@
+# app/queue.py
+
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+from arq.connections import ArqRedis
+from arq.constants import default_queue_name, expires_extra_ms, job_key_prefix
+from arq.jobs import serialize_job
+from arq.utils import timestamp_ms
+
+def add_job(
+    pipe,
+    redis: ArqRedis,
+    function: str,
+    args: Tuple[Any, ...] = (),
+    kwargs: Optional[Dict[str, Any]] = None,
+    enqueue_time_ms: Optional[int] = None,
+) -> str:
+    """Queue an ARQ job on an open pipeline and return its job ID.
+
+    Job IDs are fresh UUIDs, so ARQ's WATCH/EXISTS uniqueness check is
+    skipped and any number of jobs can share one round trip.
+    """
+    enqueue_time_ms = enqueue_time_ms or timestamp_ms()
+    job_id = uuid4().hex
+    job = serialize_job(
+        function,
+        args,
+        kwargs or {},
+        None,
+        enqueue_time_ms,
+        serializer=redis.job_serializer
+    )
+    pipe.psetex(job_key_prefix + job_id, expires_extra_ms, job)
+    pipe.zadd(default_queue_name, {job_id: enqueue_time_ms})
+    return job_id
@@ -0,0 +1,68 @@
+# app/retry.py
+
+"""Exponential-backoff retry policy for claim processing.
+
+Failed jobs are re-queued in place with ``arq.worker.Retry(defer=...)``,
+which defers the same job (like ``_defer_by``) and increments its
+``job_try``. The attempt count therefore lives in the job's own metadata
+instead of a separate Redis key.
+
+Policies are chosen by exception class name, walking the MRO, and can be
+overridden with ``RETRY_POLICIES``, e.g.
+``{"OperationalError": {"max_attempts": 10, "base_delay": 2, "max_delay": 600}}``.
+"""
+
+import json
+import os
+import random
+from typing import Dict, NamedTuple, Optional
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int
+    base_delay: float  # seconds before the first retry (upper bound)
+    max_delay: float  # cap on the backoff window
+
+DEFAULT_POLICY = RetryPolicy(max_attempts=5, base_delay=2, max_delay=120)
+
+POLICIES: Dict[str, RetryPolicy] = {
+    # Database or network blips: retry longer and spread out further
+    "OperationalError": RetryPolicy(max_attempts=8, base_delay=1, max_delay=300),
+    "InterfaceError": RetryPolicy(max_attempts=8, base_delay=1, max_delay=300),
+    "TimeoutError": RetryPolicy(max_attempts=8, base_delay=1, max_delay=300),
+    "ConnectionError": RetryPolicy(max_attempts=8, base_delay=1, max_delay=300),
+    "OSError": RetryPolicy(max_attempts=8, base_delay=1, max_delay=300),
+    # Bad or missing data rarely fixes itself
+    "ValueError": RetryPolicy(max_attempts=3, base_delay=5, max_delay=60),
+    "ValidationError": RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+}
+
+POLICIES.update({
+    name: RetryPolicy(**{**DEFAULT_POLICY._asdict(), **overrides})
+    for name, overrides in json.loads(os.getenv("RETRY_POLICIES", "{}")).items()
+})
+
+MAX_ATTEMPTS = max(policy.max_attempts for policy in [DEFAULT_POLICY, *POLICIES.values()])
+
+def policy_for(exc: BaseException) -> RetryPolicy:
+    """Return the policy of the closest exception class that has one."""
+    for cls in type(exc).__mro__:
+        policy = POLICIES.get(cls.__name__)
+        if policy is not None:
+            return policy
+    return DEFAULT_POLICY
+
+def backoff_delay(policy: RetryPolicy, attempt: int, rng: random.Random = random) -> float:
+    """Delay before retry number ``attempt`` (1-based), with equal jitter.
+
+    Half of the exponential window is fixed so retries never bunch up near
+    zero; the other half is random so failing claims don't retry in lockstep.
+    """
+    window = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    return window / 2 + rng.uniform(0, window / 2)
+
+def next_retry_delay(exc: BaseException, job_try: int) -> Optional[float]:
+    """Seconds to defer the next attempt, or None once attempts are exhausted."""
+    policy = policy_for(exc)
+    if job_try >= policy.max_attempts:
+        return None
+    return backoff_delay(policy, job_try)
@@ -1,77 +1,366 @@
 # app/routers/claim.py
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy import func, desc
+from sqlalchemy import desc, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from slowapi.util import get_remote_address
 from slowapi import Limiter
-from uuid import UUID
+from typing import Any, List, Optional
+from uuid import UUID, uuid4
+from arq.connections import ArqRedis
+from pydantic import ValidationError
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import base64
+import binascii
 import logging
+import os
 
-from app.tasks import enqueue_process_claim
-from app.db.connection import get_session
-from app.models import Claim, ClaimProcedure
-from app.schemas.claim import ClaimCreate
+from app.cache import top_npis_cache
+from app.claim_status import StatusWatcher, get_status, get_status_watcher
+from app.export import MEDIA_TYPES, export_chunks
+from app.tasks import enqueue_process_claim, enqueue_process_claims, enqueue_process_stored_claims
+from app.db.connection import AsyncSessionLocal, get_session
+from app.db.redis import get_redis
+from app.models import Claim, ClaimProcedure, NpiNetFeeTotal
+from app.schemas.base import lowercase_keys
+from app.schemas.claim import ClaimCreate, ClaimBatchResult, ClaimStatus
+from app.serialization import dumps
 
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
 logger = logging.getLogger(__name__)
 
+MAX_CLAIM_BATCH_SIZE = int(os.getenv("MAX_CLAIM_BATCH_SIZE", 10000))
+TOP_NPIS_RATE_LIMIT = os.getenv("TOP_NPIS_RATE_LIMIT", "120/minute")
+# "payload" sends procedures to the worker through Redis; "stored" inserts them
+# PENDING with the claim and the job carries only the claim ID
+CLAIM_SUBMIT_MODE = os.getenv("CLAIM_SUBMIT_MODE", "payload")
+# Upper bound, in seconds, for long-polls and event streams on a claim's status
+CLAIM_STATUS_MAX_WAIT = float(os.getenv("CLAIM_STATUS_MAX_WAIT", 300))
+
+def _insert_claims():
+    """INSERT for claims that skips existing claim numbers and returns the new rows.
+
+    The unique index on claim_number enforces uniqueness, so concurrent submissions
+    of the same claim number cannot both succeed.
+    """
+    return (
+        insert(Claim)
+        .on_conflict_do_nothing(index_elements=[Claim.claim_number])
+        .returning(Claim.id, Claim.claim_number)
+    )
+
+def _claim_row(claim: ClaimCreate, claim_id: UUID) -> dict:
+    return {
+        "id": claim_id,
+        "claim_number": claim.claim_number,
+        "plan_group": claim.plan_group,
+        "subscriber_number": claim.subscriber_number,
+        "net_fee": Decimal("0.00"),
+        "status": "PENDING",
+    }
+
+def _validation_error(error: ValidationError) -> str:
+    """One line per failed field, e.g. ``procedures.0.provider_npi: ...``."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'claim'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+def _encode_cursor(row: dict) -> str:
+    raw = f"{row['total_net_fee']}|{row['provider_npi']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        total_net_fee, provider_npi = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return Decimal(total_net_fee), provider_npi
+    except (binascii.Error, UnicodeDecodeError, ValueError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _procedure_rows(claim: ClaimCreate, claim_id: UUID) -> List[dict]:
+    return [
+        {
+            **procedure.model_dump(),
+            "id": uuid4(),
+            "claim_id": claim_id,
+            "net_fee": Decimal("0.00"),
+            "status": "PENDING",
+        }
+        for procedure in claim.procedures
+    ]
+
+async def _query_claim_status(claim_id: UUID) -> Optional[tuple]:
+    """Primary-key lookup behind the status cache."""
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(select(Claim.status, Claim.net_fee).where(Claim.id == claim_id))).first()
+    return None if row is None else (row.status, row.net_fee)
+
+async def _claim_status(redis: ArqRedis, claim_id: UUID) -> Optional[dict]:
+    return await get_status(redis, claim_id, lambda: _query_claim_status(claim_id))
+
+def _status_event(status: dict) -> bytes:
+    return b"event: status\ndata: " + dumps(status) + b"\n\n"
+
+async def _query_top_npis(
+    session: AsyncSession,
+    limit: int,
+    offset: int,
+    service_date_from: Optional[date] = None,
+    service_date_to: Optional[date] = None,
+    after: Optional[tuple] = None,
+):
+    if service_date_from is None and service_date_to is None:
+        # Served from the incrementally maintained totals table (index scan)
+        query = (
+            select(NpiNetFeeTotal.provider_npi, NpiNetFeeTotal.total_net_fee)
+            .order_by(desc(NpiNetFeeTotal.total_net_fee), desc(NpiNetFeeTotal.provider_npi))
+            .limit(limit)
+            .offset(offset)
+        )
+        if after is not None:
+            # Keyset: continue below the last row seen, straight off the index
+            query = query.where(tuple_(NpiNetFeeTotal.total_net_fee, NpiNetFeeTotal.provider_npi) < after)
+    else:
+        # Aggregated from claimprocedure; the service_date range prunes the
+        # scan to the matching monthly partitions
+        total_net_fee = func.sum(ClaimProcedure.net_fee)
+        query = (
+            select(ClaimProcedure.provider_npi, total_net_fee)
+            .group_by(ClaimProcedure.provider_npi)
+            .order_by(desc(total_net_fee), desc(ClaimProcedure.provider_npi))
+            .limit(limit)
+            .offset(offset)
+        )
+        if service_date_from is not None:
+            query = query.where(ClaimProcedure.service_date >= datetime.combine(service_date_from, time.min))
+        if service_date_to is not None:
+            # Inclusive of the whole last day
+            query = query.where(
+                ClaimProcedure.service_date < datetime.combine(service_date_to + timedelta(days=1), time.min)
+            )
+        if after is not None:
+            query = query.having(tuple_(total_net_fee, ClaimProcedure.provider_npi) < after)
+
+    # Execute the query and fetch results
+    results = (await session.execute(query)).all()
+    return [{"provider_npi": npi, "total_net_fee": net_fee} for npi, net_fee in results]
+
 @router.get("/top-npis/", response_model=list[dict])
-@limiter.limit("10/minute")
+@limiter.limit(TOP_NPIS_RATE_LIMIT)
 async def get_top_npis(
     request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session),
+    redis: ArqRedis = Depends(get_redis),
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    service_date_from: Optional[date] = Query(None),
+    service_date_to: Optional[date] = Query(None),
+    cursor: Optional[str] = Query(None),
 ):
-    """Return the top NPIs by total net fees generated with pagination."""
+    """Return the top NPIs by total net fees generated with pagination.
+
+    With ``service_date_from``/``service_date_to`` (inclusive) only procedures
+    with a service date in that range are counted. A full page sets the
+    ``X-Next-Cursor`` header; pass it back as ``cursor`` to fetch the next
+    page by keyset instead of by offset.
+    """
+    if service_date_from and service_date_to and service_date_from > service_date_to:
+        raise HTTPException(status_code=400, detail="service_date_from must not be after service_date_to")
+    if cursor is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    after = _decode_cursor(cursor) if cursor is not None else None
+
     try:
-        query = (
-            select(
-                ClaimProcedure.provider_npi,
-                func.sum(ClaimProcedure.net_fee).label("total_net_fee")
-            )
-            .group_by(ClaimProcedure.provider_npi)
-            .order_by(desc("total_net_fee"))
-            .limit(limit)
-            .offset(offset)
+        results = await top_npis_cache.get_or_load(
+            (limit, offset, service_date_from, service_date_to, cursor),
+            lambda: _query_top_npis(session, limit, offset, service_date_from, service_date_to, after),
+            redis=redis,
         )
-
-        # Execute the query and fetch results
-        results = (await session.execute(query)).all()
-        return [{"provider_npi": npi, "total_net_fee": net_fee} for npi, net_fee in results]
     except Exception as e:
         logger.error(f"Error fetching top NPIs: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    if len(results) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(results[-1])
+    return results
+
+@router.get("/export")
+async def export_claims(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+):
+    """Stream every claim with its procedures as NDJSON (one claim per line) or CSV."""
+    return StreamingResponse(export_chunks(format, status), media_type=MEDIA_TYPES[format])
+
 @router.post("/", response_model=UUID)
 async def create_claim(
     claim: ClaimCreate,
     session: AsyncSession = Depends(get_session),
+    redis: ArqRedis = Depends(get_redis),
 ):
     """Create a new claim and add it to the processing queue."""
-    existing_claim = (await session.execute(
-        select(Claim).where(Claim.claim_number == claim.claim_number)
-    )).scalar_one_or_none()
+    # A single INSERT ... ON CONFLICT DO NOTHING RETURNING replaces the
+    # duplicate SELECT and the refresh; no row back means the number exists
+    inserted = (await session.execute(
+        _insert_claims().values(_claim_row(claim, uuid4()))
+    )).first()
 
-    if existing_claim:
+    if inserted is None:
+        await session.rollback()
         raise HTTPException(status_code=400, detail="Claim number already exists")
 
-    claim_data = Claim(
-        claim_number=claim.claim_number,
-        plan_group=claim.plan_group,
-        subscriber_number=claim.subscriber_number,
-        status="PENDING"
-    )
-
-    session.add(claim_data)
+    if CLAIM_SUBMIT_MODE == "stored":
+        procedure_rows = _procedure_rows(claim, inserted.id)
+        if procedure_rows:
+            await session.execute(insert(ClaimProcedure), procedure_rows)
     await session.commit()
-    await session.refresh(claim_data)
 
     # Enqueue the claim processing task using ARQ
-    await enqueue_process_claim(claim_data.id, claim.procedures)
+    if CLAIM_SUBMIT_MODE == "stored":
+        await enqueue_process_stored_claims(redis, [inserted.id])
+    else:
+        await enqueue_process_claim(redis, inserted.id, claim.procedures)
+
+    return inserted.id
+
+@router.post("/batch", response_model=List[ClaimBatchResult])
+async def create_claims_batch(
+    claims: List[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+    redis: ArqRedis = Depends(get_redis),
+):
+    """Create many claims at once and add them to the processing queue.
+
+    Claims are validated one by one, so an invalid claim gets its own error
+    in the results instead of failing the whole batch.
+    """
+    if len(claims) > MAX_CLAIM_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch exceeds the maximum of {MAX_CLAIM_BATCH_SIZE} claims"
+        )
+
+    # Invalid claims and duplicates within the batch are rejected up front;
+    # duplicates of stored claims are skipped by the INSERT itself
+    results = []
+    rows = []
+    seen = set()
+    submitted = {}
+    for data in claims:
+        try:
+            claim = ClaimCreate.model_validate(data)
+        except ValidationError as e:
+            claim_number = lowercase_keys(data).get("claim_number") if isinstance(data, dict) else None
+            results.append(ClaimBatchResult(
+                claim_number=claim_number if isinstance(claim_number, str) else None,
+                error=_validation_error(e),
+            ))
+            continue
+
+        if claim.claim_number in seen:
+            results.append(ClaimBatchResult(
+                claim_number=claim.claim_number,
+                error="Claim number already exists"
+            ))
+            continue
+
+        seen.add(claim.claim_number)
+        claim_id = uuid4()
+        rows.append(_claim_row(claim, claim_id))
+        submitted[claim_id] = claim
+        results.append(ClaimBatchResult(claim_number=claim.claim_number, id=claim_id))
+
+    if not rows:
+        return results
+
+    # Executed as multi-row INSERT ... VALUES statements; only rows that did
+    # not conflict come back
+    inserted = {
+        row.claim_number: row.id
+        for row in (await session.execute(_insert_claims(), rows)).all()
+    }
+
+    accepted = []
+    for result in results:
+        if result.id is None:
+            continue
+        if inserted.get(result.claim_number) != result.id:
+            result.id = None
+            result.error = "Claim number already exists"
+            continue
+        accepted.append((result.id, submitted[result.id].procedures))
+
+    if CLAIM_SUBMIT_MODE == "stored":
+        # Procedures of the accepted claims go in the same transaction
+        procedure_rows = [
+            row
+            for claim_id, _ in accepted
+            for row in _procedure_rows(submitted[claim_id], claim_id)
+        ]
+        if procedure_rows:
+            await session.execute(insert(ClaimProcedure), procedure_rows)
+    await session.commit()
+
+    # Enqueue every claim processing task in one Redis pipeline
+    if accepted and CLAIM_SUBMIT_MODE == "stored":
+        await enqueue_process_stored_claims(redis, [claim_id for claim_id, _ in accepted])
+    elif accepted:
+        await enqueue_process_claims(redis, accepted)
+
+    return results
+
+# Declared last: the uuid convertor keeps the routes above (and their
+# slash redirects) from ever matching here
+@router.get("/{claim_id:uuid}/events")
+async def claim_status_events(
+    claim_id: UUID,
+    timeout: float = Query(CLAIM_STATUS_MAX_WAIT, gt=0, le=CLAIM_STATUS_MAX_WAIT),
+    redis: ArqRedis = Depends(get_redis),
+    watcher: StatusWatcher = Depends(get_status_watcher),
+):
+    """Server-sent events with the claim's status and each change until it is terminal."""
+    updates = watcher.watch(str(claim_id), lambda: _claim_status(redis, claim_id), timeout)
+    first = await anext(updates)
+    if first is None:
+        await updates.aclose()
+        raise HTTPException(status_code=404, detail="Claim not found")
+
+    async def events():
+        try:
+            yield _status_event(first)
+            async for status in updates:
+                yield _status_event(status)
+        finally:
+            await updates.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/{claim_id:uuid}", response_model=ClaimStatus)
+async def get_claim_status(
+    claim_id: UUID,
+    wait: float = Query(0, ge=0, le=CLAIM_STATUS_MAX_WAIT),
+    redis: ArqRedis = Depends(get_redis),
+    watcher: StatusWatcher = Depends(get_status_watcher),
+):
+    """Return a claim's status and net fee from the status cache.
 
-    return claim_data.id
+    With ``wait`` (seconds) the request is held until the claim reaches a
+    terminal status or the time runs out, and answers with the latest
+    status either way.
+    """
+    if wait:
+        status = None
+        async for status in watcher.watch(str(claim_id), lambda: _claim_status(redis, claim_id), wait):
+            pass
+    else:
+        status = await _claim_status(redis, claim_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    return status
@@ -1,4 +1,4 @@
 # app/schemas/__init__.py
 
-from .claim import ClaimCreate
+from .claim import ClaimCreate, ClaimBatchResult
 from .procedure import ProcedureCreate
@@ -0,0 +1,26 @@
+# app/schemas/base.py
+
+from pydantic import BaseModel, model_validator
+
+def lowercase_keys(data):
+    """Lowercase the keys of a dict, returning it unchanged if they already are."""
+    if not isinstance(data, dict):
+        return data
+    for key in data:
+        # islower() is True for typical keys, so this doesn't allocate
+        if isinstance(key, str) and not key.islower() and key != key.lower():
+            return {k.lower() if isinstance(k, str) else k: v for k, v in data.items()}
+    return data
+
+class CaseInsensitiveModel(BaseModel):
+    """Model that accepts field names in any case.
+
+    Each nested model normalizes its own keys while the request body is
+    validated, so the body is parsed only once and nothing is copied for
+    payloads that are already lowercase.
+    """
+
+    @model_validator(mode="before")
+    @classmethod
+    def _lowercase_keys(cls, data):
+        return lowercase_keys(data)
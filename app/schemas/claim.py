@@ -1,10 +1,13 @@
 # app/schemas/claim.py
 
 from pydantic import BaseModel, Field
-from typing import List
+from decimal import Decimal
+from typing import List, Optional
+from uuid import UUID
+from app.schemas.base import CaseInsensitiveModel
 from app.schemas.procedure import ProcedureCreate
 
-class ClaimCreate(BaseModel):
+class ClaimCreate(CaseInsensitiveModel):
     claim_number: str = Field(
         ...,
         min_length=5,
@@ -14,3 +17,14 @@ class ClaimCreate(BaseModel):
     plan_group: str
     subscriber_number: str
     procedures: List[ProcedureCreate]
+
+class ClaimBatchResult(BaseModel):
+    # None when the submitted claim had no usable claim number
+    claim_number: Optional[str] = None
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+class ClaimStatus(BaseModel):
+    id: UUID
+    status: str
+    net_fee: Decimal
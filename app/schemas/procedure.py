@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import Field, TypeAdapter, field_validator
+from typing import Any, List, Optional
 from datetime import datetime
 from decimal import Decimal
+from app.npi import get_registry, is_valid_npi
+from app.schemas.base import CaseInsensitiveModel
 
-class ProcedureCreate(BaseModel):
+class ProcedureCreate(CaseInsensitiveModel):
     service_date: datetime
     submitted_procedure: str = Field(
         ...,
@@ -15,7 +17,7 @@ class ProcedureCreate(BaseModel):
         min_length=10,
         max_length=10,
         pattern=r"^\d{10}$",
-        description="Provider NPI must be exactly 10 digits."
+        description="Provider NPI must be exactly 10 digits, the last one its check digit."
     )
     provider_fees: Decimal = Field(..., gt=0, description="Provider fees must be greater than 0.")
     allowed_fees: Decimal = Field(..., gt=0, description="Allowed fees must be greater than 0.")
@@ -23,7 +25,24 @@ class ProcedureCreate(BaseModel):
     member_copay: Decimal = Field(..., ge=0, description="Copay must be non-negative.")
     quadrant: Optional[str] = None
 
+    @field_validator("provider_npi")
+    @classmethod
+    def _check_npi(cls, npi: str) -> str:
+        if not is_valid_npi(npi):
+            raise ValueError("Provider NPI has an invalid check digit.")
+        registry = get_registry()
+        if registry is not None and npi not in registry:
+            raise ValueError("Provider NPI is not in the provider registry.")
+        return npi
+
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat(),  # Converts datetime to ISO 8601 string
         }
+
+# Validates a whole list in a single call into pydantic-core
+PROCEDURE_LIST = TypeAdapter(List[ProcedureCreate])
+
+def validate_procedures(data: List[Any]) -> List[ProcedureCreate]:
+    """Validate a claim's procedures as one batch."""
+    return PROCEDURE_LIST.validate_python(data)
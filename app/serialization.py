@@ -0,0 +1,76 @@
+# app/serialization.py
+
+"""Pluggable JSON serialization for API responses, Redis blobs and ARQ jobs.
+
+Uses orjson when it is installed, falling back to the stdlib ``json``
+module. Choose explicitly with ``JSON_BACKEND=orjson|json``. Decimals are
+encoded as strings so no precision is lost; datetimes as ISO 8601.
+"""
+
+import json
+import logging
+import os
+import pickle
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Union
+from uuid import UUID
+
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson" if orjson is not None else "json")
+
+if JSON_BACKEND == "orjson" and orjson is None:
+    logger.warning("JSON_BACKEND=orjson but orjson is not installed, using json")
+    JSON_BACKEND = "json"
+
+def default(obj: Any) -> Any:
+    """Encode the types our payloads carry that JSON has no native form for."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if JSON_BACKEND == "orjson":
+    # orjson encodes datetime and UUID natively, in the same format as default()
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(default=default, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+def job_serializer(job: Any) -> bytes:
+    """ARQ ``job_serializer`` using the configured JSON backend."""
+    return dumps(job)
+
+def job_deserializer(data: Union[bytes, str]) -> Any:
+    """ARQ ``job_deserializer`` that still reads jobs pickled by older releases."""
+    if isinstance(data, bytes) and data[:1] == b"\x80":
+        return pickle.loads(data)
+    return loads(data)
+
+class JSONResponse(StarletteJSONResponse):
+    """Default response class rendering with the configured JSON backend."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
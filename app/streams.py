@@ -0,0 +1,395 @@
+# app/streams.py
+
+"""Redis Streams transport for claim processing.
+
+Selected with ``CLAIM_TRANSPORT=streams`` (the default, ``arq``, queues one
+ARQ job per claim). Each submitted claim becomes one entry
+``{claim_id, mode}`` on CLAIM_STREAM; its procedures travel as before,
+through the payload store or as PENDING rows. Workers share the consumer
+group CLAIM_STREAM_GROUP and:
+
+* read up to CLAIM_STREAM_COUNT entries per XREADGROUP and process them as
+  one batch through ``process_claims``/``process_stored_claims``;
+* XACK the batch's finished entries in one call;
+* leave failed entries pending, made reclaimable after the retry policy's
+  backoff, and take them over with XAUTOCLAIM once idle that long;
+* move entries out of attempts to the CLAIM_DLQ_STREAM stream, where they
+  can be inspected and replayed. Dead-lettered claims are marked FAILED;
+  replaying one reopens it as PENDING before its entry goes back on the
+  stream, so it is processed again rather than skipped as done:
+
+    python -m app.streams info
+    python -m app.streams dead [--count N]
+    python -m app.streams replay [ENTRY_ID ...] [--all]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from redis.exceptions import ResponseError
+from sqlalchemy import update
+
+from app.claim_status import set_status
+from app.db.connection import AsyncSessionLocal
+from app.metrics import CLAIM_DEAD_LETTERS, CLAIM_RETRIES
+from app.models import Claim
+from app.retry import next_retry_delay
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TRANSPORT = os.getenv("CLAIM_TRANSPORT", "arq")
+CLAIM_STREAM = os.getenv("CLAIM_STREAM", "claims:stream")
+CLAIM_STREAM_GROUP = os.getenv("CLAIM_STREAM_GROUP", "claim-workers")
+CLAIM_DLQ_STREAM = os.getenv("CLAIM_DLQ_STREAM", "claims:dead")
+CLAIM_STREAM_COUNT = int(os.getenv("CLAIM_STREAM_COUNT", 100))
+CLAIM_STREAM_BLOCK_MS = int(os.getenv("CLAIM_STREAM_BLOCK_MS", 1000))
+# Entries pending this long without an ack belong to a crashed or stuck consumer
+CLAIM_STREAM_MIN_IDLE_MS = int(os.getenv("CLAIM_STREAM_MIN_IDLE_MS", 60000))
+CLAIM_STREAM_CLAIM_INTERVAL = float(os.getenv("CLAIM_STREAM_CLAIM_INTERVAL", 5))
+# Approximate cap on the entries kept in each stream, acked or not
+CLAIM_STREAM_MAXLEN = int(os.getenv("CLAIM_STREAM_MAXLEN", 1_000_000))
+
+# An entry: (entry_id, claim_id, mode, attempt)
+Entry = Tuple[str, str, str, int]
+Handler = Callable[[List[Entry]], Awaitable[Dict[str, Optional[Exception]]]]
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+def _fields(fields) -> Dict[str, str]:
+    return {_text(key): _text(value) for key, value in (fields or {}).items()}
+
+def add_claim_entry(pipe, claim_id, mode: str):
+    """Queue one claim on an open pipeline."""
+    pipe.xadd(
+        CLAIM_STREAM,
+        {"claim_id": str(claim_id), "mode": mode},
+        maxlen=CLAIM_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+async def ensure_group(redis, stream: str = CLAIM_STREAM, group: str = CLAIM_STREAM_GROUP):
+    """Create the stream and its consumer group unless they exist."""
+    try:
+        await redis.xgroup_create(stream, group, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class StreamConsumer:
+    """One consumer of the claim stream's group, feeding batches to ``handler``.
+
+    ``handler`` returns a mapping of claim_id to None or the exception that
+    failed it, like ``process_claims``. ``on_dead_letter`` is awaited with
+    the claim IDs moved to the dead-letter stream.
+    """
+
+    def __init__(
+        self,
+        redis,
+        handler: Handler,
+        on_dead_letter: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+        name: Optional[str] = None,
+        stream: str = CLAIM_STREAM,
+        group: str = CLAIM_STREAM_GROUP,
+        dead_letter_stream: str = CLAIM_DLQ_STREAM,
+        count: int = CLAIM_STREAM_COUNT,
+        block_ms: int = CLAIM_STREAM_BLOCK_MS,
+        min_idle_ms: int = CLAIM_STREAM_MIN_IDLE_MS,
+        claim_interval: float = CLAIM_STREAM_CLAIM_INTERVAL,
+    ):
+        self.redis = redis
+        self.handler = handler
+        self.on_dead_letter = on_dead_letter
+        self.name = name or consumer_name()
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        self.count = count
+        self.block_ms = block_ms
+        self.min_idle_ms = min_idle_ms
+        self.claim_interval = claim_interval
+        self._stopping = False
+        self._next_claim = 0.0
+        # XAUTOCLAIM scan position, so the scan moves past entries not idle yet
+        self._claim_cursor = "0-0"
+        self._task: Optional[asyncio.Task] = None
+
+    async def read(self) -> List[Entry]:
+        """New entries for this consumer, blocking up to ``block_ms``."""
+        response = await self.redis.xreadgroup(
+            self.group, self.name, {self.stream: ">"}, count=self.count, block=self.block_ms
+        )
+        entries = []
+        for _, messages in response or []:
+            for entry_id, fields in messages:
+                fields = _fields(fields)
+                entries.append((_text(entry_id), fields.get("claim_id"), fields.get("mode", "payload"), 1))
+        return entries
+
+    async def reclaim(self) -> List[Entry]:
+        """Take over entries left pending past ``min_idle_ms``, with their attempt numbers."""
+        response = await self.redis.xautoclaim(
+            self.stream, self.group, self.name, self.min_idle_ms, start_id=self._claim_cursor, count=self.count
+        )
+        # "0-0" once the scan has covered the whole pending list
+        self._claim_cursor = _text(response[0])
+        messages = response[1]
+        entries, trimmed = [], []
+        for entry_id, fields in messages:
+            fields = _fields(fields)
+            if not fields:
+                # Trimmed away while pending; nothing left to process
+                trimmed.append(_text(entry_id))
+                continue
+            entries.append([_text(entry_id), fields.get("claim_id"), fields.get("mode", "payload")])
+        if trimmed:
+            await self.redis.xack(self.stream, self.group, *trimmed)
+        if not entries:
+            return []
+
+        # XAUTOCLAIM counts a delivery, so the count is this attempt's number
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entry_id, _, _ in entries:
+                pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+            pending = await pipe.execute()
+        return [
+            (entry_id, claim_id, mode, info[0]["times_delivered"] if info else 1)
+            for (entry_id, claim_id, mode), info in zip(entries, pending)
+        ]
+
+    async def settle(self, entries: List[Entry], outcomes: Dict[str, Optional[Exception]]):
+        """Ack finished entries, schedule retries and dead-letter exhausted ones."""
+        done, dead, retries = [], [], []
+        for entry in entries:
+            entry_id, claim_id, _, attempt = entry
+            error = outcomes.get(claim_id)
+            if error is None:
+                done.append(entry_id)
+                continue
+            delay = next_retry_delay(error, attempt)
+            if delay is not None:
+                # Entries can only be back-dated up to min_idle_ms, so that is
+                # the longest backoff the stream transport can honour
+                delay = min(delay, self.min_idle_ms / 1000)
+            if delay is None:
+                logger.error(f"Max retries reached for claim {claim_id} after {attempt} attempts")
+                dead.append((entry, error))
+            else:
+                logger.info(f"Retrying claim {claim_id} in {delay:.1f}s, attempt {attempt + 1}")
+                CLAIM_RETRIES.labels(type(error).__name__).inc()
+                retries.append((entry_id, delay))
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for (entry_id, claim_id, mode, attempt), error in dead:
+                pipe.xadd(
+                    self.dead_letter_stream,
+                    {
+                        "claim_id": claim_id,
+                        "mode": mode,
+                        "entry_id": entry_id,
+                        "attempts": attempt,
+                        "error": f"{type(error).__name__}: {error}"[:500],
+                        "failed_at": int(time.time()),
+                    },
+                    maxlen=CLAIM_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            acked = done + [entry[0] for entry, _ in dead]
+            if acked:
+                pipe.xack(self.stream, self.group, *acked)
+            for entry_id, delay in retries:
+                # Back-date the entry's idle time so XAUTOCLAIM picks it up
+                # once the backoff has passed; JUSTID leaves the delivery count
+                pipe.xclaim(
+                    self.stream,
+                    self.group,
+                    self.name,
+                    0,
+                    [entry_id],
+                    idle=max(self.min_idle_ms - int(delay * 1000), 0),
+                    justid=True,
+                )
+            await pipe.execute()
+
+        if dead:
+            CLAIM_DEAD_LETTERS.inc(len(dead))
+            if self.on_dead_letter is not None:
+                await self.on_dead_letter([entry[1] for entry, _ in dead])
+
+    async def process(self, entries: List[Entry]):
+        malformed = [entry for entry in entries if not entry[1]]
+        if malformed:
+            logger.error(f"Dropping {len(malformed)} stream entries without a claim_id")
+            await self.redis.xack(self.stream, self.group, *[entry[0] for entry in malformed])
+            entries = [entry for entry in entries if entry[1]]
+        if not entries:
+            return
+        try:
+            outcomes = await self.handler(entries)
+        except Exception as e:
+            logger.error(f"Batch of {len(entries)} stream entries failed: {e}", exc_info=True)
+            outcomes = {entry[1]: e for entry in entries}
+        await self.settle(entries, outcomes)
+
+    async def poll(self) -> int:
+        """Reclaim (every ``claim_interval``) or read one batch and process it."""
+        entries = []
+        if time.monotonic() >= self._next_claim:
+            entries = await self.reclaim()
+            if self._claim_cursor == "0-0":
+                self._next_claim = time.monotonic() + self.claim_interval
+        if not entries:
+            entries = await self.read()
+        await self.process(entries)
+        return len(entries)
+
+    async def run(self):
+        await ensure_group(self.redis, self.stream, self.group)
+        logger.info(f"Consuming {self.stream} as {self.name} in group {self.group}")
+        while not self._stopping:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Claim stream poll failed: {e}")
+                await asyncio.sleep(1)
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout: float):
+        """Finish the batch in hand, then stop; unacked entries are reclaimed later."""
+        self._stopping = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Claim stream consumer {self.name} did not stop in {timeout}s")
+        except Exception as e:
+            logger.warning(f"Claim stream consumer {self.name} stopped with {e}")
+
+async def dead_letters(redis, count: int = 100, stream: str = CLAIM_DLQ_STREAM) -> List[Tuple[str, dict]]:
+    """The oldest ``count`` dead-lettered claims."""
+    return [(_text(entry_id), _fields(fields)) for entry_id, fields in await redis.xrange(stream, count=count)]
+
+async def replay(
+    redis,
+    entry_ids: Optional[Iterable[str]] = None,
+    count: int = CLAIM_STREAM_COUNT,
+    stream: str = CLAIM_STREAM,
+    dead_letter_stream: str = CLAIM_DLQ_STREAM,
+) -> int:
+    """Move dead-lettered claims back onto the claim stream for a fresh set of attempts.
+
+    Replays the given dead-letter entry IDs, or the oldest ``count`` entries.
+    Claims marked FAILED are reset to PENDING and committed first, so the
+    consumer never sees a replayed claim as already processed. The entries
+    are re-added and removed from the dead-letter stream in one transaction
+    afterwards; if that fails, replaying again picks up where this left off.
+    """
+    if entry_ids is None:
+        entries = await dead_letters(redis, count, dead_letter_stream)
+    else:
+        async with redis.pipeline(transaction=False) as pipe:
+            for entry_id in entry_ids:
+                pipe.xrange(dead_letter_stream, min=entry_id, max=entry_id)
+            entries = [
+                (_text(found[0][0]), _fields(found[0][1])) for found in await pipe.execute() if found
+            ]
+    if not entries:
+        return 0
+
+    async with AsyncSessionLocal() as session:
+        reopened = (await session.execute(
+            update(Claim)
+            .where(Claim.id.in_([UUID(fields["claim_id"]) for _, fields in entries]), Claim.status == "FAILED")
+            .values(status="PENDING")
+            .returning(Claim.id)
+            .execution_options(synchronize_session=False)
+        )).scalars()
+        reopened = {str(claim_id) for claim_id in reopened}
+        await session.commit()
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for _, fields in entries:
+            if fields["claim_id"] in reopened:
+                set_status(pipe, fields["claim_id"], "PENDING")
+            pipe.xadd(
+                stream,
+                {"claim_id": fields["claim_id"], "mode": fields.get("mode", "payload")},
+                maxlen=CLAIM_STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.xdel(dead_letter_stream, *[entry_id for entry_id, _ in entries])
+        await pipe.execute()
+    logger.info(f"Replayed {len(entries)} dead-lettered claims, {len(reopened)} reopened from FAILED")
+    return len(entries)
+
+async def stream_info(redis) -> dict:
+    """Length, pending count and consumers of the claim stream and dead-letter stream."""
+    await ensure_group(redis)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xlen(CLAIM_STREAM)
+        pipe.xpending(CLAIM_STREAM, CLAIM_STREAM_GROUP)
+        pipe.xinfo_consumers(CLAIM_STREAM, CLAIM_STREAM_GROUP)
+        pipe.xlen(CLAIM_DLQ_STREAM)
+        length, pending, consumers, dead = await pipe.execute()
+    return {
+        "stream": CLAIM_STREAM,
+        "length": length,
+        "pending": pending["pending"],
+        "consumers": {_text(c["name"]): {"pending": c["pending"], "idle_ms": c["idle"]} for c in consumers},
+        "dead_letters": dead,
+    }
+
+async def _main(args):
+    from app.db.redis import create_redis_pool, close_redis_pool
+    from app.serialization import dumps
+
+    redis = await create_redis_pool()
+    try:
+        if args.command == "info":
+            print(dumps(await stream_info(redis)).decode())
+        elif args.command == "dead":
+            for entry_id, fields in await dead_letters(redis, args.count):
+                print(dumps({"id": entry_id, **fields}).decode())
+        elif args.command == "replay":
+            if not args.entry_ids and not args.all:
+                raise SystemExit("Give dead-letter entry IDs to replay, or --all")
+            if args.entry_ids:
+                print(await replay(redis, args.entry_ids))
+            else:
+                total = 0
+                while replayed := await replay(redis):
+                    total += replayed
+                print(total)
+    finally:
+        await close_redis_pool(redis)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the claim stream and replay dead letters")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="stream length, pending entries and consumers")
+    dead = commands.add_parser("dead", help="list dead-lettered claims, oldest first")
+    dead.add_argument("--count", type=int, default=100)
+    replay_parser = commands.add_parser("replay", help="requeue dead-lettered claims")
+    replay_parser.add_argument("entry_ids", nargs="*")
+    replay_parser.add_argument("--all", action="store_true", help="replay every dead-lettered claim")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# app/supervisor.py
+
+"""Fork and supervise several ARQ worker processes sharing one queue.
+
+Started by ``python -m app.worker --processes N``. Each child builds its
+own worker, event loop, Redis pool and DB connections after the fork. The
+supervisor forwards SIGTERM/SIGINT so children drain (stop taking jobs,
+finish running ones for up to WORKER_DRAIN_TIMEOUT seconds), restarts
+children that exit unexpectedly with a growing delay, and publishes an
+aggregated health record built from the children's health-check keys.
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional
+
+from arq.constants import health_check_key_suffix
+
+logger = logging.getLogger(__name__)
+
+WORKER_DRAIN_TIMEOUT = int(os.getenv("WORKER_DRAIN_TIMEOUT", 60))
+WORKER_RESTART_MAX_DELAY = float(os.getenv("WORKER_RESTART_MAX_DELAY", 30))
+# A child that stayed up this long resets the restart backoff
+WORKER_STABLE_AFTER = float(os.getenv("WORKER_STABLE_AFTER", 60))
+SUPERVISOR_HEALTH_INTERVAL = float(os.getenv("SUPERVISOR_HEALTH_INTERVAL", 5))
+
+def child_health_key(queue_name: str, index: int) -> str:
+    return f"{queue_name}{health_check_key_suffix}:{socket.gethostname()}:{index}"
+
+def supervisor_health_key(queue_name: str) -> str:
+    return f"{queue_name}{health_check_key_suffix}:{socket.gethostname()}"
+
+class Child:
+    def __init__(self, index: int):
+        self.index = index
+        self.pid: Optional[int] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.failures = 0
+        self.restart_at: Optional[float] = None
+
+class Supervisor:
+    """Keep ``processes`` children running ``target(index)`` until stopped."""
+
+    def __init__(
+        self,
+        processes: int,
+        target: Callable[[int], None],
+        health: Optional[Callable[["Supervisor"], None]] = None,
+        drain_timeout: float = WORKER_DRAIN_TIMEOUT,
+        on_child_exit: Optional[Callable[[int], None]] = None,
+    ):
+        self.children: Dict[int, Child] = {index: Child(index) for index in range(processes)}
+        self.target = target
+        self.health = health
+        self.drain_timeout = drain_timeout
+        self.on_child_exit = on_child_exit
+        self.stopping = False
+
+    def spawn(self, child: Child):
+        pid = os.fork()
+        if pid == 0:
+            # The child runs the worker and never returns into the supervisor loop
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.target(child.index)
+            except BaseException:
+                logger.exception(f"Worker process {child.index} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        child.pid = pid
+        child.started_at = time.monotonic()
+        child.restart_at = None
+        logger.info(f"Started worker process {child.index} (pid {pid})")
+
+    def restart_delay(self, child: Child) -> float:
+        return min(2 ** max(child.failures - 1, 0), WORKER_RESTART_MAX_DELAY)
+
+    def reap(self):
+        """Collect exited children and schedule their restart."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = next((c for c in self.children.values() if c.pid == pid), None)
+            if child is None:
+                continue
+            child.pid = None
+            if self.on_child_exit:
+                self.on_child_exit(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                logger.info(f"Worker process {child.index} (pid {pid}) exited with {code}")
+                continue
+
+            uptime = time.monotonic() - child.started_at
+            child.failures = 1 if uptime >= WORKER_STABLE_AFTER else child.failures + 1
+            delay = self.restart_delay(child)
+            child.restart_at = time.monotonic() + delay
+            logger.error(
+                f"Worker process {child.index} (pid {pid}) exited with {code} "
+                f"after {uptime:.0f}s, restarting in {delay:.0f}s"
+            )
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Draining {len(self.alive())} worker processes")
+        self.signal_children(signal.SIGTERM)
+
+    def signal_children(self, signum):
+        for child in self.alive():
+            try:
+                os.kill(child.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def alive(self):
+        return [child for child in self.children.values() if child.pid is not None]
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for child in self.children.values():
+            self.spawn(child)
+
+        next_health = 0.0
+        while not self.stopping:
+            self.reap()
+            now = time.monotonic()
+            for child in self.children.values():
+                if child.pid is None and child.restart_at is not None and now >= child.restart_at:
+                    child.restarts += 1
+                    self.spawn(child)
+            if self.health and now >= next_health:
+                try:
+                    self.health(self)
+                except Exception as e:
+                    logger.warning(f"Supervisor health report failed: {e}")
+                next_health = now + SUPERVISOR_HEALTH_INTERVAL
+            time.sleep(0.2)
+
+        # Children stop taking jobs and finish running ones; ARQ cancels
+        # whatever is left after the drain timeout, then they get killed
+        deadline = time.monotonic() + self.drain_timeout + 10
+        while self.alive() and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.2)
+        if self.alive():
+            logger.warning(f"Killing {len(self.alive())} worker processes that did not drain")
+            self.signal_children(signal.SIGKILL)
+            while self.alive():
+                self.reap()
+                time.sleep(0.1)
+
+    def status(self) -> dict:
+        return {
+            "processes": len(self.children),
+            "alive": len(self.alive()),
+            "restarts": sum(child.restarts for child in self.children.values()),
+            "pids": {child.index: child.pid for child in self.children.values()},
+        }
+
+def _redis_client(redis_settings):
+    # The supervisor loop is synchronous, so it uses a plain blocking client
+    from redis import Redis
+
+    return Redis(
+        host=redis_settings.host,
+        port=redis_settings.port,
+        db=redis_settings.database,
+        password=redis_settings.password,
+        socket_timeout=redis_settings.conn_timeout,
+    )
+
+def health_reporter(redis_settings, queue_name: str):
+    """Publish the supervisor's status plus how many children are healthy.
+
+    A child is healthy when it is running and its ARQ health-check key is
+    current.
+    """
+    client = _redis_client(redis_settings)
+
+    def report(supervisor: Supervisor):
+        status = supervisor.status()
+        alive = supervisor.alive()
+        values = client.mget([child_health_key(queue_name, child.index) for child in alive]) if alive else []
+        status["healthy"] = sum(value is not None for value in values)
+        client.set(
+            supervisor_health_key(queue_name),
+            json.dumps(status),
+            px=int((SUPERVISOR_HEALTH_INTERVAL * 2 + 1) * 1000),
+        )
+
+    return report
+
+def check_health(redis_settings, queue_name: str, processes: int = 2) -> int:
+    """Exit code for container health checks: 0 when every child is healthy.
+
+    A single worker runs without a supervisor, so its own ARQ health-check
+    key is checked instead.
+    """
+    client = _redis_client(redis_settings)
+    if processes <= 1:
+        data = client.get(child_health_key(queue_name, 0))
+        if not data:
+            logger.warning("Health check failed: no worker health record")
+            return 1
+        logger.info(f"Health check: {data.decode() if isinstance(data, bytes) else data}")
+        return 0
+    data = client.get(supervisor_health_key(queue_name))
+    if not data:
+        logger.warning("Health check failed: no supervisor health record")
+        return 1
+    status = json.loads(data)
+    logger.info(f"Health check: {status}")
+    return 0 if status["healthy"] == status["processes"] else 1
@@ -1,239 +1,633 @@
 # app/tasks.py
 
 import os
+import asyncio
 import logging
-import json
-from uuid import UUID
-from typing import List, Dict
-
-from arq import create_pool
-from arq.connections import RedisSettings
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID, uuid4
+from typing import List, Dict, Optional, Tuple
+
+from arq import cron
+from arq.connections import ArqRedis
+from arq.constants import default_queue_name
+from arq.worker import Retry
+from arq.utils import timestamp_ms
+from sqlalchemy import and_, case, func, insert, update
 from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker, selectinload
 
+from app.aggregates import net_fee_deltas, upsert_npi_net_fee_totals
+from app.batching import MicroBatcher
+from app.cache import bump_version, top_npis_cache
+from app.claim_status import publish_statuses, set_status
+from app.db.connection import AsyncSessionLocal, async_engine
+from app.db.partitions import ensure_partitions
+from app.db.redis import get_redis_settings
+from app.fees import compute_fees
+from app.metrics import (
+    CLAIM_DEAD_LETTERS,
+    CLAIM_RETRIES,
+    CLAIM_STATUS_TRANSITIONS,
+    JOB_QUEUE_WAIT,
+    JobTimer,
+    PROCESS_CLAIM_BATCH_SIZE,
+    StageTimer,
+    sample_queue_forever,
+    start_worker_exporter,
+)
 from app.models import Claim, ClaimProcedure
-from app.schemas.procedure import ProcedureCreate
+from app.payments import PaymentDispatcher, add_to_outbox, create_dispatcher, sweep_outbox
+from app.queue import add_job
+from app.retry import DEFAULT_POLICY, MAX_ATTEMPTS, backoff_delay, next_retry_delay
+from app.schemas.procedure import ProcedureCreate, validate_procedures
+from app.payload_store import decode_procedures, delete_procedures, load_payloads, payload_key, store_procedures
+from app.serialization import job_serializer, job_deserializer
+from app.streams import CLAIM_TRANSPORT, StreamConsumer, add_claim_entry
 
 logger = logging.getLogger(__name__)
 
-# Get the DATABASE_URL from environment variables
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    "postgresql+asyncpg://postgres:postgres_change_me@db:5432/claims_db"
-)
-
-# Log the DATABASE_URL for debugging purposes
-logger.info(f"DATABASE_URL in worker tasks: {DATABASE_URL}")
-
-# Create the async engine within this file to ensure it's initialized properly
-async_engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    pool_recycle=1800
-)
+# Micro-batching of process_claim jobs; a batch size of 1 disables it
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", 1))
+CLAIM_BATCH_WAIT_MS = float(os.getenv("CLAIM_BATCH_WAIT_MS", 20))
+FEE_FIELDS = ("provider_fees", "allowed_fees", "member_coinsurance", "member_copay")
 
-# Create an async session factory
-AsyncSessionLocal = sessionmaker(
-    bind=async_engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+# How long shutdown waits for the stream consumer to finish its batch
+CLAIM_STREAM_STOP_TIMEOUT = float(os.getenv("CLAIM_STREAM_STOP_TIMEOUT", 60))
 
-async def enqueue_process_claim(claim_id: UUID, procedures_data: List[ProcedureCreate]):
+async def enqueue_process_claim(redis: ArqRedis, claim_id: UUID, procedures_data: List[ProcedureCreate]):
     """Enqueue the process_claim task using ARQ."""
-    redis = await create_pool(
-        RedisSettings(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379))
-        )
-    )
-
-    # Store procedures_data in Redis for retries
-    procedures_data_key = f"claim_procedures:{claim_id}"
-
-    # Serialize procedures data to JSON string
-    procedures_json = json.dumps(
-        [procedure.dict() for procedure in procedures_data],
-        default=str  # Handle datetime and Decimal serialization
-    )
-
-    # Save the serialized data to Redis
-    await redis.set(procedures_data_key, procedures_json)
-
-    # Enqueue the job to process the claim
-    await redis.enqueue_job(
-        'process_claim',
-        str(claim_id),
-        [procedure.dict() for procedure in procedures_data]
-    )
-    await redis.close()
+    await enqueue_process_claims(redis, [(claim_id, procedures_data)])
+
+async def enqueue_process_claims(redis: ArqRedis, claims: List[Tuple[UUID, List[ProcedureCreate]]]):
+    """Enqueue process_claim for many claims using a single Redis pipeline."""
+    if not claims:
+        return
+
+    enqueue_time_ms = timestamp_ms()
+    async with redis.pipeline(transaction=False) as pipe:
+        for claim_id, procedures_data in claims:
+            # The payload is stored once; the job only carries the claim ID
+            store_procedures(pipe, claim_id, procedures_data)
+            # Before the job, so the worker's outcome always lands after it
+            set_status(pipe, claim_id, "PENDING")
+            if CLAIM_TRANSPORT == "streams":
+                add_claim_entry(pipe, claim_id, "payload")
+            else:
+                add_job(pipe, redis, 'process_claim', (str(claim_id),), {}, enqueue_time_ms)
+        await pipe.execute()
+
+async def enqueue_process_stored_claims(redis: ArqRedis, claim_ids: List[UUID]):
+    """Enqueue process_stored_claim for claims whose procedures are already in Postgres."""
+    enqueue_time_ms = timestamp_ms()
+    async with redis.pipeline(transaction=False) as pipe:
+        for claim_id in claim_ids:
+            set_status(pipe, claim_id, "PENDING")
+            if CLAIM_TRANSPORT == "streams":
+                add_claim_entry(pipe, claim_id, "stored")
+            else:
+                add_job(pipe, redis, 'process_stored_claim', (str(claim_id),), {}, enqueue_time_ms)
+        await pipe.execute()
+
+async def process_claims(
+    redis: ArqRedis,
+    items: List[Tuple[str, Optional[List[dict]]]],
+    dispatcher: Optional[PaymentDispatcher] = None,
+) -> Dict[str, Optional[Exception]]:
+    """Process a batch of claims with one load, one insert, one update and one commit.
+
+    Returns a mapping of claim_id to None on success or to the exception that
+    failed it, for the caller to retry. A failure while writing the batch
+    falls back to processing each claim on its own, so one bad claim never
+    rolls back the others. Items without procedures read them from the
+    payload store. Fully successful claims get their payment outbox row in
+    the same transaction and are handed to ``dispatcher`` after the commit.
+
+    Claims are locked while loading, and those no longer PENDING (processed
+    by an earlier run of the job, or marked FAILED) are skipped as done, so
+    reruns never insert procedures or add to the totals twice. A FAILED
+    claim keeps its payload, so it can still be replayed from the
+    dead-letter stream.
+    """
+    outcomes: Dict[str, Optional[Exception]] = {}
+    payments = []
+    statuses = {}
+    done = []
+    failed = []
+    timer = StageTimer()
+    PROCESS_CLAIM_BATCH_SIZE.observe(len(items))
+
+    payloads = await load_payloads(redis, [claim_id for claim_id, procedures_data in items if procedures_data is None])
 
-async def process_claim(ctx, claim_id: str, procedures_data: List[dict]):
-    """Asynchronous task to process a claim."""
     async with AsyncSessionLocal() as session:
         try:
+            # Load and lock every claim at once; a concurrent run of the same
+            # claim waits here and then sees it is no longer PENDING
             stmt = (
-                select(Claim)
-                .options(selectinload(Claim.procedures))
-                .where(Claim.id == UUID(claim_id))
+                select(Claim.id, Claim.status)
+                .where(Claim.id.in_([UUID(claim_id) for claim_id, _ in items]))
+                .order_by(Claim.id)
+                .with_for_update()
+            )
+            claims = {str(claim.id): claim for claim in (await session.execute(stmt)).all()}
+            timer.mark("load")
+
+            batch = []
+            for claim_id, procedures_data in items:
+                try:
+                    claim = claims.get(claim_id)
+                    if not claim:
+                        raise ValueError(f"Claim with ID {claim_id} not found")
+                    if claim.status != "PENDING":
+                        logger.info(f"Claim {claim_id} is already {claim.status}, skipping")
+                        (failed if claim.status == "FAILED" else done).append(claim_id)
+                        continue
+                    if procedures_data is None:
+                        payload = payloads.get(claim_id)
+                        if payload is None:
+                            raise ValueError(f"No procedures data found for claim {claim_id}")
+                        # Stored from procedures the API validated; only types are restored
+                        procedures_data = decode_procedures(payload, typed=True)
+                    else:
+                        # Job arguments (earlier releases) arrive JSON-decoded and unchecked
+                        procedures_data = [procedure.model_dump() for procedure in validate_procedures(procedures_data)]
+                    # Plain insert rows; building ORM objects would cost more than the rest
+                    procedures = [{**procedure, "id": uuid4(), "claim_id": claim.id} for procedure in procedures_data]
+                except Exception as e:
+                    outcomes[claim_id] = e
+                    continue
+                batch.append((claim_id, claim, procedures))
+
+            # Net fees, procedure statuses and claim rollups for the whole batch
+            rows = [procedure for _, _, procedures in batch for procedure in procedures]
+            fees = compute_fees(
+                *([procedure[field] for procedure in rows] for field in FEE_FIELDS),
+                [len(procedures) for _, _, procedures in batch],
             )
-            result = await session.execute(stmt)
-            claim = result.scalars().first()
-
-            if not claim:
-                raise ValueError(f"Claim with ID {claim_id} not found")
-
-            all_success = True
-            new_procedures = []
-
-            # Process each procedure and update status
-            for procedure_data in procedures_data:
-                procedure = ClaimProcedure(**procedure_data, claim_id=UUID(claim_id))
-                procedure.calculate_and_store_net_fee()
 
-                if procedure.net_fee < 0:
-                    procedure.status = "FAILED"
-                    all_success = False
-                else:
-                    procedure.status = "SUCCESS"
+            procedure_rows = []
+            claim_rows = []
+            start = 0
+            for index, (claim_id, claim, procedures) in enumerate(batch):
+                end = start + len(procedures)
+                for offset in range(start, end):
+                    procedure = rows[offset]
+                    procedure["net_fee"] = fees.net_fees[offset]
+                    procedure["status"] = fees.statuses[offset]
+                    procedure_rows.append(procedure)
+
+                net_fee = fees.claim_net_fees[index]
+                claim_rows.append({
+                    "id": claim.id,
+                    "net_fee": net_fee,
+                    "status": fees.claim_statuses[index],
+                })
+                all_success = "FAILED" not in fees.statuses[start:end]
+                payments.append((claim_id, net_fee, all_success))
+                statuses[claim_id] = (fees.claim_statuses[index], net_fee)
+                start = end
+            timer.mark("compute")
+
+            if claim_rows:
+                if procedure_rows:
+                    await session.execute(insert(ClaimProcedure), procedure_rows)
+                await session.execute(update(Claim), claim_rows)
+
+                # Keep the per-NPI leaderboard totals in the same transaction
+                await upsert_npi_net_fee_totals(session, net_fee_deltas(procedure_rows))
+                await add_to_outbox(
+                    session,
+                    [(claim_id, net_fee) for claim_id, net_fee, all_success in payments if all_success],
+                )
+                timer.mark("flush")
+                await session.commit()
+                timer.mark("commit")
 
-                session.add(procedure)
-                new_procedures.append(procedure)
+                for row in claim_rows:
+                    CLAIM_STATUS_TRANSITIONS.labels(row["status"]).inc()
 
-            await session.flush()
-            claim.procedures.extend(new_procedures)
+        except Exception as e:
+            await session.rollback()
+            if len(items) > 1:
+                logger.warning(f"Batch of {len(items)} claims failed ({e}), processing individually")
+                results = {}
+                for item in items:
+                    results.update(await process_claims(redis, [item], dispatcher))
+                return results
+            outcomes[items[0][0]] = e
+            payments = []
+            statuses = {}
+            done = []
+            failed = []
+
+    for claim_id in done + failed:
+        outcomes[claim_id] = None
+    await _finish_claims(redis, outcomes, payments, statuses, timer, dispatcher, payload_store=True, done=done)
+    return outcomes
+
+async def process_stored_claims(
+    redis: ArqRedis,
+    claim_ids: List[str],
+    dispatcher: Optional[PaymentDispatcher] = None,
+) -> Dict[str, Optional[Exception]]:
+    """Process claims whose procedures were stored PENDING at submit time.
+
+    Net fees and statuses are computed by one set-based UPDATE of the
+    pending procedure rows and the claim rollups by a second one, without
+    loading any rows into the ORM. Both only touch claims that are still
+    PENDING, so a job that runs again after its commit (an ARQ retry, a
+    redelivered stream entry) or after the claim was marked FAILED changes
+    nothing, adds no deltas and pays nothing; such claims count as done.
+    Returns the same mapping as ``process_claims``.
+    """
+    outcomes: Dict[str, Optional[Exception]] = {}
+    payments = []
+    timer = StageTimer()
+    PROCESS_CLAIM_BATCH_SIZE.observe(len(claim_ids))
+    ids = [UUID(claim_id) for claim_id in claim_ids]
+    pending_ids = select(Claim.id).where(Claim.id.in_(ids), Claim.status == "PENDING")
+    done = set()
 
-            # Calculate net fee and update claim status
-            claim.calculate_and_store_net_fee()
-            claim.update_status()
-            session.add(claim)
+    async with AsyncSessionLocal() as session:
+        try:
+            net_fee = (
+                ClaimProcedure.provider_fees
+                + ClaimProcedure.member_coinsurance
+                + ClaimProcedure.member_copay
+                - ClaimProcedure.allowed_fees
+            )
+            procedures = (await session.execute(
+                update(ClaimProcedure)
+                .where(ClaimProcedure.claim_id.in_(pending_ids), ClaimProcedure.status == "PENDING")
+                .values(net_fee=net_fee, status=case((net_fee < 0, "FAILED"), else_="SUCCESS"))
+                .returning(ClaimProcedure.claim_id, ClaimProcedure.provider_npi, ClaimProcedure.net_fee, ClaimProcedure.status)
+                .execution_options(synchronize_session=False)
+            )).all()
+            timer.mark("compute")
+
+            totals = (
+                select(
+                    Claim.id.label("id"),
+                    func.coalesce(func.sum(ClaimProcedure.net_fee), Decimal("0.00")).label("net_fee"),
+                    func.coalesce(func.bool_or(ClaimProcedure.status == "FAILED"), False).label("failed"),
+                    func.coalesce(func.bool_or(ClaimProcedure.status == "SUCCESS"), False).label("succeeded"),
+                )
+                .select_from(Claim)
+                .outerjoin(ClaimProcedure, ClaimProcedure.claim_id == Claim.id)
+                .where(Claim.id.in_(pending_ids))
+                .group_by(Claim.id)
+                .subquery()
+            )
+            claims = (await session.execute(
+                update(Claim)
+                .where(Claim.id == totals.c.id, Claim.status == "PENDING")
+                .values(
+                    net_fee=totals.c.net_fee,
+                    status=case(
+                        (and_(totals.c.failed, totals.c.succeeded), "PARTIAL_FAILURE"),
+                        (totals.c.failed, "FAILURE"),
+                        else_="SUCCESS",
+                    ),
+                )
+                .returning(Claim.id, Claim.net_fee, Claim.status)
+                .execution_options(synchronize_session=False)
+            )).all()
+
+            await upsert_npi_net_fee_totals(session, net_fee_deltas(procedures))
+            await add_to_outbox(
+                session,
+                [(str(claim.id), claim.net_fee) for claim in claims if claim.status == "SUCCESS"],
+            )
+            missing = set(ids) - {claim.id for claim in claims}
+            if missing:
+                # Processed by an earlier run, or out of retries
+                done = {str(claim_id) for claim_id in (await session.execute(
+                    select(Claim.id).where(Claim.id.in_(missing))
+                )).scalars()}
+            timer.mark("flush")
             await session.commit()
+            timer.mark("commit")
+        except Exception as e:
+            await session.rollback()
+            if len(claim_ids) > 1:
+                logger.warning(f"Batch of {len(claim_ids)} claims failed ({e}), processing individually")
+                results = {}
+                for claim_id in claim_ids:
+                    results.update(await process_stored_claims(redis, [claim_id], dispatcher))
+                return results
+            outcomes[claim_ids[0]] = e
+            claims = []
+            done = set()
+
+    statuses = {}
+    for claim in claims:
+        CLAIM_STATUS_TRANSITIONS.labels(claim.status).inc()
+        payments.append((str(claim.id), claim.net_fee, claim.status == "SUCCESS"))
+        statuses[str(claim.id)] = (claim.status, claim.net_fee)
+    found = {claim_id for claim_id, _, _ in payments}
+    for claim_id in claim_ids:
+        if claim_id in done:
+            outcomes[claim_id] = None
+        elif claim_id not in found and claim_id not in outcomes:
+            outcomes[claim_id] = ValueError(f"Claim with ID {claim_id} not found")
+
+    await _finish_claims(redis, outcomes, payments, statuses, timer, dispatcher, payload_store=False)
+    return outcomes
+
+async def _finish_claims(
+    redis: ArqRedis,
+    outcomes,
+    payments,
+    statuses: Dict[str, Tuple[str, Decimal]],
+    timer: StageTimer,
+    dispatcher: Optional[PaymentDispatcher],
+    payload_store: bool,
+    done: List[str] = (),
+):
+    """Shared tail of a committed batch: caches, status notifications, payments and error logs.
+
+    The batch is committed by now, so Redis errors here are only logged:
+    raising would retry claims that are already processed.
+    """
+    to_pay = []
+    if payments:
+        # Leaderboard totals changed, so invalidate cached top-NPI pages
+        try:
+            await bump_version(redis, top_npis_cache.namespace)
+        except Exception as e:
+            logger.warning(f"Top NPIs cache invalidation failed: {e}")
+        await publish_statuses(redis, statuses)
 
-            net_fee = float(claim.net_fee)
-
-            # Enqueue further tasks if needed
-            if all_success:
-                await ctx['redis'].enqueue_job(
-                    'process_payment',
-                    claim_id=claim_id,
-                    net_fee=net_fee
-                )
+    # Processed claims are terminal and no longer need a retry copy
+    terminal = [claim_id for claim_id, _, _ in payments] + list(done)
+    if payload_store and terminal:
+        try:
+            await delete_procedures(redis, terminal)
+        except Exception as e:
+            # Left to expire with CLAIM_PAYLOAD_TTL
+            logger.warning(f"Deleting {len(terminal)} processed payloads failed: {e}")
+
+    for claim_id, net_fee, all_success in payments:
+        outcomes[claim_id] = None
+        # Failed procedures (negative net fee) are final; retrying can't change them
+        if all_success:
+            to_pay.append((claim_id, net_fee))
+
+    for claim_id, error in outcomes.items():
+        if error is not None:
+            logger.error(f"Error processing claim {claim_id}: {error}", exc_info=error)
+
+    # The outbox rows are committed, so the batch's payments can go out in
+    # the background; anything not confirmed is resent by the sweeper
+    if dispatcher is not None:
+        dispatcher.dispatch(to_pay)
+    timer.mark("enqueue")
+
+async def process_stream_entries(ctx, entries) -> Dict[str, Optional[Exception]]:
+    """Process one block read from the claim stream, one batch per submit mode."""
+    redis, dispatcher = ctx['redis'], ctx.get('payment_dispatcher')
+    payload_ids = [claim_id for _, claim_id, mode, _ in entries if mode != "stored"]
+    stored_ids = [claim_id for _, claim_id, mode, _ in entries if mode == "stored"]
+    outcomes = {}
+    with JobTimer('process_stream_claims'):
+        # Outcomes per sub-batch, so one failing never retries the other's committed claims
+        for claim_ids, process in (
+            (payload_ids, lambda: process_claims(redis, [(claim_id, None) for claim_id in payload_ids], dispatcher)),
+            (stored_ids, lambda: process_stored_claims(redis, stored_ids, dispatcher)),
+        ):
+            if not claim_ids:
+                continue
+            try:
+                outcomes.update(await process())
+            except Exception as e:
+                logger.error(f"Batch of {len(claim_ids)} stream claims failed: {e}", exc_info=True)
+                outcomes.update({claim_id: e for claim_id in claim_ids})
+    return outcomes
+
+async def mark_claims_as_failed(claim_ids: List[str], redis: Optional[ArqRedis] = None):
+    for claim_id in claim_ids:
+        await mark_claim_as_failed(claim_id, redis)
+
+async def process_claim(ctx, claim_id: str, procedures_data: Optional[List[dict]] = None):
+    """Asynchronous task to process a claim, micro-batched with concurrent jobs."""
+    observe_queue_wait(ctx, 'process_claim')
+    batcher = ctx.get('claim_batcher')
+    with JobTimer('process_claim'):
+        try:
+            if batcher is None:
+                error = (await process_claims(
+                    ctx['redis'], [(claim_id, procedures_data)], ctx.get('payment_dispatcher')
+                ))[claim_id]
+                if error is not None:
+                    raise error
             else:
-                await ctx['redis'].enqueue_job(
-                    'retry_claim',
-                    claim_id=claim_id
-                )
+                await batcher.submit(claim_id, procedures_data)
+        except Exception as e:
+            await schedule_retry(ctx, claim_id, e)
 
+async def process_stored_claim(ctx, claim_id: str):
+    """Process a claim submitted with its procedures already stored in Postgres."""
+    observe_queue_wait(ctx, 'process_stored_claim')
+    batcher = ctx.get('stored_claim_batcher')
+    with JobTimer('process_stored_claim'):
+        try:
+            if batcher is None:
+                error = (await process_stored_claims(
+                    ctx['redis'], [claim_id], ctx.get('payment_dispatcher')
+                ))[claim_id]
+                if error is not None:
+                    raise error
+            else:
+                await batcher.submit(claim_id, None)
         except Exception as e:
-            await session.rollback()
-            logger.error(f"Error processing claim {claim_id}: {e}", exc_info=True)
-            # Enqueue retry task
-            await ctx['redis'].enqueue_job(
-                'retry_claim',
-                claim_id=claim_id
-            )
+            await schedule_retry(ctx, claim_id, e)
+
+async def schedule_retry(ctx, claim_id: str, error: Exception):
+    """Defer the current job with backoff, or dead-letter the claim when out of attempts."""
+    job_try = ctx.get('job_try', 1)
+    delay = next_retry_delay(error, job_try)
+    if delay is None:
+        logger.error(f"Max retries reached for claim {claim_id} after {job_try} attempts")
+        CLAIM_DEAD_LETTERS.inc()
+        # Enqueue to dead letter queue
+        await ctx['redis'].enqueue_job(
+            'dead_letter_queue',
+            claim_id=claim_id
+        )
+        # Mark the claim as FAILED
+        await mark_claim_as_failed(claim_id, ctx['redis'])
+        return
+
+    logger.info(f"Retrying claim {claim_id} in {delay:.1f}s, attempt {job_try + 1}")
+    CLAIM_RETRIES.labels(type(error).__name__).inc()
+    # Re-queues this same job; ARQ increments job_try
+    raise Retry(defer=delay)
 
 async def process_payment(ctx, claim_id: str, net_fee: float):
-    """Asynchronous task to process a payment."""
+    """Pay a claim through the outbox.
+
+    Claims now get their outbox row when they are processed; this job is kept
+    so process_payment jobs queued by earlier releases still drain.
+    """
     logger.info(f"Processing payment for claim {claim_id} with net fee {net_fee}")
+    payment = (claim_id, Decimal(str(net_fee)))
+    async with AsyncSessionLocal() as session:
+        await add_to_outbox(session, [payment])
+        await session.commit()
 
-    # Enqueue payment processing on the same Redis host
-    await ctx['redis'].enqueue_job(
-        'process_payment_task',
-        claim_id=claim_id,
-        net_fee=net_fee,
-        _job_id=f"payment_{claim_id}"
-    )
+    dispatcher = ctx.get('payment_dispatcher')
+    if dispatcher is not None:
+        error = (await dispatcher.send([payment]))[claim_id]
+        if error is not None:
+            logger.warning(f"Payment for claim {claim_id} not sent yet: {error}")
 
 async def process_payment_task(ctx, claim_id: str, net_fee: float):
-    """Simulate payment processing."""
-    try:
-        # Simulate payment processing logic
-        logger.info(f"Payment processed for claim {claim_id} with net fee {net_fee}")
-    except Exception as e:
-        logger.error(f"Payment processing failed for claim {claim_id}: {e}", exc_info=True)
-        raise
-
-async def retry_claim(ctx, claim_id: str):
-    """Asynchronous task to retry processing a claim."""
-    max_retries = 5  # Maximum number of retries
-    retry_count_key = f"claim_retry_count:{claim_id}"
-
-    # Get the current retry count from Redis
-    retry_count = await ctx['redis'].get(retry_count_key) or 0
-    retry_count = int(retry_count)
-
-    if retry_count < max_retries:
-        # Increment the retry count
-        await ctx['redis'].set(retry_count_key, retry_count + 1)
+    """Kept so process_payment_task jobs queued by earlier releases still drain."""
+    await process_payment(ctx, claim_id, net_fee)
 
-        logger.info(f"Retrying claim {claim_id}, attempt {retry_count + 1}")
+async def sweep_payments(ctx):
+    """Resend payments whose dispatch was never confirmed."""
+    dispatcher = ctx.get('payment_dispatcher')
+    if dispatcher is None:
+        return
+    await sweep_outbox(dispatcher)
 
-        # Retrieve the procedures data from Redis
-        procedures_data_key = f"claim_procedures:{claim_id}"
-        procedures_data_json = await ctx['redis'].get(procedures_data_key)
+async def retry_claim(ctx, claim_id: str):
+    """Re-enqueue a claim with backoff.
 
-        if procedures_data_json:
-            # Deserialize procedures_data
-            procedures_data = json.loads(procedures_data_json)
+    Kept so retry_claim jobs queued by earlier releases still drain; new
+    failures are retried in place by process_claim.
+    """
+    await ctx['redis'].delete(f"claim_retry_count:{claim_id}")
 
-            # Enqueue the process_claim task again
-            await ctx['redis'].enqueue_job(
-                'process_claim',
-                claim_id=claim_id,
-                procedures_data=procedures_data
-            )
-        else:
-            logger.error(f"No procedures data found for claim {claim_id}")
-            # Mark the claim as FAILED
-            await mark_claim_as_failed(claim_id)
-    else:
-        logger.error(f"Max retries reached for claim {claim_id}")
-        # Enqueue to dead letter queue
+    # The payload stays in the store until the claim is terminal
+    if await ctx['redis'].exists(payload_key(claim_id)):
         await ctx['redis'].enqueue_job(
-            'dead_letter_queue',
-            claim_id=claim_id
+            'process_claim',
+            claim_id=claim_id,
+            _defer_by=backoff_delay(DEFAULT_POLICY, 1)
         )
+    else:
+        logger.error(f"No procedures data found for claim {claim_id}")
         # Mark the claim as FAILED
-        await mark_claim_as_failed(claim_id)
+        await mark_claim_as_failed(claim_id, ctx['redis'])
+
+async def mark_claim_as_failed(claim_id: str, redis: Optional[ArqRedis] = None):
+    """Helper function to mark a claim as FAILED in the database (and the status cache).
 
-async def mark_claim_as_failed(claim_id: str):
-    """Helper function to mark a claim as FAILED in the database."""
+    Only a claim still PENDING is marked: one whose results were committed
+    by an earlier attempt keeps them.
+    """
     async with AsyncSessionLocal() as session:
-        stmt = select(Claim).where(Claim.id == UUID(claim_id))
-        result = await session.execute(stmt)
-        claim = result.scalars().first()
+        stmt = (
+            update(Claim)
+            .where(Claim.id == UUID(claim_id), Claim.status == "PENDING")
+            .values(status="FAILED")
+            .returning(Claim.net_fee)
+            .execution_options(synchronize_session=False)
+        )
+        claim = (await session.execute(stmt)).first()
+        await session.commit()
 
         if claim:
-            claim.status = "FAILED"
-            session.add(claim)
-            await session.commit()
+            CLAIM_STATUS_TRANSITIONS.labels("FAILED").inc()
             logger.info(f"Claim {claim_id} marked as FAILED in the database")
+            if redis is not None:
+                await publish_statuses(redis, {claim_id: ("FAILED", claim.net_fee)})
+        else:
+            logger.info(f"Claim {claim_id} is not PENDING, not marking it FAILED")
 
 async def dead_letter_queue(ctx, claim_id: str):
     """Handle tasks that have failed after maximum retries."""
     logger.error(f"Claim {claim_id} moved to dead letter queue")
+    await delete_procedures(ctx['redis'], [claim_id])
 
     # Implement any additional logic for dead letter queue processing
     # For example, alerting, logging to external systems, etc.
 
+async def maintain_partitions(ctx):
+    """Create the claimprocedure partitions for the coming months."""
+    async with async_engine.begin() as conn:
+        ensured = await ensure_partitions(conn)
+    logger.info(f"{len(ensured)} claimprocedure partitions in place")
+
+def observe_queue_wait(ctx, function: str):
+    """Record how long a job waited in the queue before starting."""
+    enqueue_time = ctx.get('enqueue_time')
+    if enqueue_time is not None:
+        JOB_QUEUE_WAIT.labels(function).observe(
+            max((datetime.now(timezone.utc) - enqueue_time).total_seconds(), 0)
+        )
+
+async def startup(ctx):
+    """Set up per-worker state."""
+    start_worker_exporter()
+    ctx['queue_sampler'] = asyncio.create_task(
+        sample_queue_forever(ctx['redis'], default_queue_name)
+    )
+    ctx['payment_dispatcher'] = create_dispatcher()
+    if CLAIM_BATCH_SIZE > 1:
+        ctx['claim_batcher'] = MicroBatcher(
+            lambda items: process_claims(ctx['redis'], items, ctx['payment_dispatcher']),
+            max_size=CLAIM_BATCH_SIZE,
+            max_wait_ms=CLAIM_BATCH_WAIT_MS,
+        )
+        ctx['stored_claim_batcher'] = MicroBatcher(
+            lambda items: process_stored_claims(
+                ctx['redis'], [claim_id for claim_id, _ in items], ctx['payment_dispatcher']
+            ),
+            max_size=CLAIM_BATCH_SIZE,
+            max_wait_ms=CLAIM_BATCH_WAIT_MS,
+        )
+    if CLAIM_TRANSPORT == "streams":
+        # Runs next to the ARQ worker, which still serves cron and legacy jobs
+        ctx['claim_stream'] = StreamConsumer(
+            ctx['redis'],
+            lambda entries: process_stream_entries(ctx, entries),
+            on_dead_letter=lambda claim_ids: mark_claims_as_failed(claim_ids, ctx['redis']),
+        )
+        ctx['claim_stream'].start()
+
+async def shutdown(ctx):
+    """Flush any partially filled claim batch before exiting."""
+    sampler = ctx.get('queue_sampler')
+    if sampler is not None:
+        sampler.cancel()
+    consumer = ctx.get('claim_stream')
+    if consumer is not None:
+        await consumer.stop(CLAIM_STREAM_STOP_TIMEOUT)
+    for name in ('claim_batcher', 'stored_claim_batcher'):
+        batcher = ctx.get(name)
+        if batcher is not None:
+            await batcher.close()
+    # After the claim batches, whose payments it may still be sending
+    dispatcher = ctx.get('payment_dispatcher')
+    if dispatcher is not None:
+        await dispatcher.close()
+
 class WorkerSettings:
     functions = [
         process_claim,
+        process_stored_claim,
         process_payment,
         retry_claim,
         dead_letter_queue,
         process_payment_task
     ]
-    redis_settings = RedisSettings(
-        host=os.getenv('REDIS_HOST', 'localhost'),
-        port=int(os.getenv('REDIS_PORT', 6379))
-    )
-    max_jobs = 10  # Adjust based on your requirements
-
-    # Retry configuration
-    retry_jobs = False  # We handle retries manually in the code
+    cron_jobs = [
+        # Daily, and once at startup, so partitions always exist ahead of time
+        cron(maintain_partitions, hour={3}, minute={0}, run_at_startup=True),
+        # Every minute
+        cron(sweep_payments),
+    ]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = get_redis_settings()
+    job_serializer = job_serializer
+    job_deserializer = job_deserializer
+    # A batch can only fill up to the number of jobs running concurrently
+    max_jobs = max(int(os.getenv("WORKER_MAX_JOBS", 10)), CLAIM_BATCH_SIZE)
+
+    # Retry configuration: process_claim raises Retry(defer=...) with backoff
+    # per app.retry, so ARQ keeps the attempt count in the job's job_try
+    retry_jobs = True
+    max_tries = MAX_ATTEMPTS
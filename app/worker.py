@@ -0,0 +1,280 @@
+# app/worker.py
+
+"""ARQ worker entry point with load-aware concurrency.
+
+Usage: python -m app.worker [--processes N] [--check]
+
+Runs ``app.tasks.WorkerSettings`` like ``arq app.tasks.WorkerSettings``
+does, but adjusts the limit on concurrently running jobs every
+WORKER_AUTOSCALE_INTERVAL seconds, between WORKER_MIN_JOBS and
+WORKER_MAX_JOBS_LIMIT:
+
+* additive increase while ready jobs wait and every slot is busy;
+* multiplicative decrease when claim jobs run slower than
+  WORKER_TARGET_JOB_LATENCY or the DB pool is saturated;
+* a slow drift back down while the queue is empty.
+
+With ``--processes N`` (or WORKER_PROCESSES) it forks N such workers under
+``app.supervisor.Supervisor``; ``--check`` exits non-zero unless every
+process is healthy.
+"""
+
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import sys
+from typing import Optional
+
+from arq.constants import default_queue_name
+from arq.worker import Worker, create_worker
+from arq.utils import timestamp_ms
+from prometheus_client import REGISTRY
+
+from app import metrics as app_metrics
+from app.db.connection import ENGINE_NAME, async_engine
+from app.db.engine import DB_MAX_OVERFLOW, DB_POOL_SIZE, pool_metrics
+from app.metrics import WORKER_JOB_LIMIT, start_worker_exporter
+from app.supervisor import (
+    WORKER_DRAIN_TIMEOUT,
+    Supervisor,
+    check_health,
+    child_health_key,
+    health_reporter,
+)
+from app.tasks import CLAIM_BATCH_SIZE, WorkerSettings
+
+logger = logging.getLogger(__name__)
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 1))
+WORKER_HEALTH_CHECK_INTERVAL = int(os.getenv("WORKER_HEALTH_CHECK_INTERVAL", 30))
+WORKER_AUTOSCALE = os.getenv("WORKER_AUTOSCALE", "true").lower() == "true"
+WORKER_AUTOSCALE_INTERVAL = float(os.getenv("WORKER_AUTOSCALE_INTERVAL", 5))
+WORKER_MIN_JOBS = int(os.getenv("WORKER_MIN_JOBS", 2))
+# Each running batch holds one connection, so by default the limit can't
+# outgrow what the worker's DB pool can serve
+WORKER_MAX_JOBS_LIMIT = int(os.getenv(
+    "WORKER_MAX_JOBS_LIMIT", (DB_POOL_SIZE + max(DB_MAX_OVERFLOW, 0)) * max(CLAIM_BATCH_SIZE, 1)
+))
+WORKER_TARGET_JOB_LATENCY = float(os.getenv("WORKER_TARGET_JOB_LATENCY", 2.0))
+WORKER_POOL_SATURATION_HIGH = float(os.getenv("WORKER_POOL_SATURATION_HIGH", 0.9))
+
+CLAIM_FUNCTIONS = ("process_claim", "process_stored_claim")
+
+class ConcurrencyController:
+    """AIMD decision rule for the concurrent job limit."""
+
+    def __init__(
+        self,
+        min_jobs: int,
+        max_jobs: int,
+        target_latency: float,
+        pool_saturation_high: float,
+        increase: int = 1,
+        decrease: float = 0.75,
+    ):
+        self.min_jobs = max(min_jobs, 1)
+        self.max_jobs = max(max_jobs, self.min_jobs)
+        self.target_latency = target_latency
+        self.pool_saturation_high = pool_saturation_high
+        self.increase = increase
+        self.decrease = decrease
+
+    def clamp(self, limit: int) -> int:
+        return min(max(limit, self.min_jobs), self.max_jobs)
+
+    def decide(
+        self,
+        limit: int,
+        running: int,
+        ready: int,
+        latency: Optional[float],
+        pool_saturation: float,
+        pool_timeouts: int = 0,
+    ) -> int:
+        """Return the next limit given the signals of the last interval."""
+        if (
+            pool_timeouts
+            or pool_saturation >= self.pool_saturation_high
+            or (latency is not None and latency > self.target_latency)
+        ):
+            return self.clamp(int(limit * self.decrease))
+        if ready and running >= limit:
+            return self.clamp(limit + self.increase)
+        if not ready and not running:
+            return self.clamp(limit - 1)
+        return self.clamp(limit)
+
+class LoadSignals:
+    """Reads the controller's inputs since the previous sample."""
+
+    def __init__(self, worker: Worker, engine_name: str = ENGINE_NAME):
+        self.worker = worker
+        self.engine_name = engine_name
+        self._duration = self._job_duration()
+        self._timeouts = self._pool_timeouts()
+
+    def _job_duration(self):
+        total = count = 0.0
+        for function in CLAIM_FUNCTIONS:
+            labels = {"function": function}
+            total += REGISTRY.get_sample_value("arq_job_duration_seconds_sum", labels) or 0.0
+            count += REGISTRY.get_sample_value("arq_job_duration_seconds_count", labels) or 0.0
+        return total, count
+
+    def _pool_timeouts(self) -> int:
+        metrics = pool_metrics.get(self.engine_name)
+        return metrics.checkout_timeouts if metrics else 0
+
+    def latency(self) -> Optional[float]:
+        """Mean claim job run time since the last call, or None without jobs."""
+        total, count = self._job_duration()
+        previous_total, previous_count = self._duration
+        self._duration = (total, count)
+        if count <= previous_count:
+            return None
+        return (total - previous_total) / (count - previous_count)
+
+    def pool_saturation(self) -> float:
+        metrics = pool_metrics.get(self.engine_name)
+        if metrics is None:
+            return 0.0
+        snapshot = metrics.snapshot()
+        return snapshot["checked_out"] / snapshot["capacity"] if snapshot["capacity"] else 0.0
+
+    def pool_timeouts(self) -> int:
+        timeouts = self._pool_timeouts()
+        new, self._timeouts = timeouts - self._timeouts, timeouts
+        return new
+
+    async def ready_jobs(self) -> int:
+        return await self.worker.pool.zcount(self.worker.queue_name, "-inf", timestamp_ms())
+
+async def autoscale(worker: Worker, controller: ConcurrencyController, interval: float):
+    """Adjust ``worker.max_jobs`` for as long as the worker runs."""
+    signals = LoadSignals(worker)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            limit = controller.decide(
+                worker.max_jobs,
+                running=worker.job_counter,
+                ready=await signals.ready_jobs(),
+                latency=signals.latency(),
+                pool_saturation=signals.pool_saturation(),
+                pool_timeouts=signals.pool_timeouts(),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Concurrency autoscaling skipped: {e}")
+            continue
+        if limit != worker.max_jobs:
+            logger.info(f"Worker job limit {worker.max_jobs} -> {limit}")
+            # ARQ reads max_jobs before starting each job; running jobs finish
+            worker.max_jobs = limit
+        WORKER_JOB_LIMIT.set(limit)
+
+def enable_autoscaling(worker: Worker, controller: ConcurrencyController, interval: float):
+    """Start and stop the autoscaling loop with the worker's own hooks.
+
+    The worker must be created with ``max_jobs=controller.max_jobs``: ARQ
+    sizes its semaphore once, so the limit can only move below that.
+    """
+    on_startup, on_shutdown = worker.on_startup, worker.on_shutdown
+    worker.max_jobs = controller.clamp(WorkerSettings.max_jobs)
+    WORKER_JOB_LIMIT.set(worker.max_jobs)
+
+    async def startup(ctx):
+        if on_startup:
+            await on_startup(ctx)
+        ctx['autoscaler'] = asyncio.create_task(autoscale(worker, controller, interval))
+
+    async def shutdown(ctx):
+        task = ctx.get('autoscaler')
+        if task is not None:
+            task.cancel()
+        if on_shutdown:
+            await on_shutdown(ctx)
+
+    worker.on_startup, worker.on_shutdown = startup, shutdown
+
+def build_worker(**kwargs) -> Worker:
+    # On SIGTERM stop taking jobs and let running ones finish before cancelling
+    kwargs.setdefault("job_completion_wait", WORKER_DRAIN_TIMEOUT)
+    if not WORKER_AUTOSCALE:
+        return create_worker(WorkerSettings, **kwargs)
+    controller = ConcurrencyController(
+        # Below CLAIM_BATCH_SIZE running jobs a micro-batch can never fill, so
+        # each one waits out CLAIM_BATCH_WAIT_MS; that wait counts towards the
+        # job latency the controller backs off on, and would keep it there
+        max(WORKER_MIN_JOBS, CLAIM_BATCH_SIZE),
+        WORKER_MAX_JOBS_LIMIT,
+        WORKER_TARGET_JOB_LATENCY,
+        WORKER_POOL_SATURATION_HIGH,
+    )
+    worker = create_worker(WorkerSettings, max_jobs=controller.max_jobs, **kwargs)
+    enable_autoscaling(worker, controller, WORKER_AUTOSCALE_INTERVAL)
+    return worker
+
+def run_process(index: int, processes: int):
+    """Body of one supervised worker process, after the fork."""
+    # Pooled connections must never be shared across a fork; the child
+    # opens its own on first use
+    async_engine.sync_engine.dispose(close=False)
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # The supervisor serves the aggregate of every process
+        app_metrics.WORKER_METRICS_PORT = 0
+    elif app_metrics.WORKER_METRICS_PORT:
+        app_metrics.WORKER_METRICS_PORT += index
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    build_worker(
+        health_check_key=child_health_key(default_queue_name, index),
+        health_check_interval=WORKER_HEALTH_CHECK_INTERVAL,
+    ).run()
+
+def supervise(processes: int):
+    on_child_exit = None
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        # Files left by an earlier run would be aggregated as live processes
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+        start_worker_exporter()
+        on_child_exit = multiprocess.mark_process_dead
+    else:
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR is not set; each worker process serves its own "
+            "metrics on WORKER_METRICS_PORT + its index"
+        )
+
+    Supervisor(
+        processes,
+        target=lambda index: run_process(index, processes),
+        health=health_reporter(WorkerSettings.redis_settings, default_queue_name),
+        on_child_exit=on_child_exit,
+    ).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the claim processing worker")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="worker processes to fork")
+    parser.add_argument("--check", action="store_true", help="health check the running worker(s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.check:
+        sys.exit(check_health(WorkerSettings.redis_settings, default_queue_name, args.processes))
+    if args.processes > 1:
+        supervise(args.processes)
+    else:
+        # Same key as a supervised process 0, which --check looks for
+        build_worker(
+            health_check_key=child_health_key(default_queue_name, 0),
+            health_check_interval=WORKER_HEALTH_CHECK_INTERVAL,
+        ).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_fees.py
+
+"""Micro-benchmark of the fee engine against the per-object model path.
+
+    python -m benchmarks.bench_fees --claims 500 --procedures 20
+"""
+
+import argparse
+import json
+import random
+import timeit
+from decimal import Decimal
+
+from app.fees import compute_fees
+from app.models import Claim, ClaimProcedure
+
+def model_path(columns, claim_sizes):
+    """Net fees and statuses one ORM object at a time, as the worker used to."""
+    procedures = []
+    for provider, allowed, coinsurance, copay in zip(*columns):
+        procedure = ClaimProcedure(
+            provider_fees=provider,
+            allowed_fees=allowed,
+            member_coinsurance=coinsurance,
+            member_copay=copay,
+        )
+        procedure.calculate_and_store_net_fee()
+        procedure.status = "FAILED" if procedure.net_fee < 0 else "SUCCESS"
+        procedures.append(procedure)
+
+    start = 0
+    for size in claim_sizes:
+        claim = Claim()
+        claim.procedures = procedures[start:start + size]
+        claim.calculate_and_store_net_fee()
+        claim.update_status()
+        start += size
+
+def run(claims: int, procedures: int, number: int) -> dict:
+    rng = random.Random(0)
+    claim_sizes = [procedures] * claims
+    columns = [
+        [Decimal(rng.randint(0, 10 ** 5)).scaleb(-2) for _ in range(claims * procedures)]
+        for _ in range(4)
+    ]
+    paths = {
+        "compute_fees": lambda: compute_fees(*columns, claim_sizes),
+        "model": lambda: model_path(columns, claim_sizes),
+    }
+    results = {}
+    for name, path in paths.items():
+        elapsed = min(timeit.repeat(path, number=number, repeat=5)) / number
+        results[name] = {
+            "batch_ms": round(elapsed * 1000, 3),
+            "per_procedure_us": round(elapsed / (claims * procedures) * 1e6, 3),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--claims", type=int, default=500)
+    parser.add_argument("--procedures", type=int, default=20)
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.claims, args.procedures, args.number), indent=2))
+
+if __name__ == "__main__":
+    main()
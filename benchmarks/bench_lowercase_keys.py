@@ -0,0 +1,63 @@
+# benchmarks/bench_lowercase_keys.py
+
+"""Per-request cost of key normalization for POST /claims/ bodies.
+
+Compares the removed LowercaseKeysMiddleware path (json.loads, rebuild,
+json.dumps, then FastAPI's own json.loads) with normalizing keys inside
+ClaimCreate/ProcedureCreate validation (a single json.loads).
+
+    python -m benchmarks.bench_lowercase_keys --procedures 50
+"""
+
+import argparse
+import json
+import timeit
+
+from app.schemas.claim import ClaimCreate
+from benchmarks.payloads import make_claim, uppercase_keys
+
+def legacy_path(body: bytes):
+    # What LowercaseKeysMiddleware did before FastAPI parsed the body again
+    json_body = json.loads(body)
+    if isinstance(json_body, dict):
+        json_body = {k.lower(): v for k, v in json_body.items()}
+        body = json.dumps(json_body).encode("utf-8")
+    return ClaimCreate.model_validate(json.loads(body))
+
+def schema_path(body: bytes):
+    return ClaimCreate.model_validate(json.loads(body))
+
+def run(procedures: int, number: int) -> dict:
+    claim = make_claim(0, procedures=procedures)
+    results = {}
+    # Uppercase nested keys only work on the schema path, so the legacy
+    # path is measured with lowercase procedure keys
+    cases = {
+        "lowercase": (claim, claim),
+        "mixed_case": (
+            {**uppercase_keys({k: v for k, v in claim.items() if k != "procedures"}), "procedures": claim["procedures"]},
+            uppercase_keys(claim),
+        ),
+    }
+    for name, (legacy_payload, schema_payload) in cases.items():
+        legacy_body = json.dumps(legacy_payload).encode()
+        schema_body = json.dumps(schema_payload).encode()
+        legacy = min(timeit.repeat(lambda: legacy_path(legacy_body), number=number, repeat=5)) / number
+        schema = min(timeit.repeat(lambda: schema_path(schema_body), number=number, repeat=5)) / number
+        results[name] = {
+            "body_bytes": len(legacy_body),
+            "legacy_us": round(legacy * 1e6, 1),
+            "schema_us": round(schema * 1e6, 1),
+            "saved_us": round((legacy - schema) * 1e6, 1),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procedures", type=int, default=50)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.procedures, args.number), indent=2))
+
+if __name__ == "__main__":
+    main()
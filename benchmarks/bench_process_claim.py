@@ -0,0 +1,141 @@
+# benchmarks/bench_process_claim.py
+
+"""Drive process_claim directly at a fixed concurrency against Postgres.
+
+    python -m benchmarks.bench_process_claim --claims 2000 --concurrency 20 --output results.json
+
+Seeds the claims first (not timed), then runs one process_claim job per
+claim and reports throughput, latency percentiles and DB/Redis round trips
+per claim. Redis is faked in memory unless --redis is given. Use a scratch
+database: the run leaves its claims and their NPI totals behind.
+"""
+
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+from arq.worker import Retry
+
+from app import tasks
+from app.batching import MicroBatcher
+from app.db.connection import AsyncSessionLocal, async_engine
+from app.models import ClaimProcedure
+from app.payload_store import store_procedures
+from app.routers.claim import _claim_row, _insert_claims, _procedure_rows
+from app.schemas.claim import ClaimCreate
+from benchmarks.fakes import FakeRedis
+from benchmarks.payloads import make_claim
+from benchmarks.stats import RoundTripCounter, summarize, write_results
+
+SEED_CHUNK = 500
+
+async def seed(redis, claims, mode: str):
+    """Insert the claims (and their procedures or payloads) as the API would."""
+    claim_ids = []
+    for start in range(0, len(claims), SEED_CHUNK):
+        chunk = {uuid4(): claim for claim in claims[start:start + SEED_CHUNK]}
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                _insert_claims(), [_claim_row(claim, claim_id) for claim_id, claim in chunk.items()]
+            )
+            if mode == "stored":
+                await session.execute(
+                    ClaimProcedure.__table__.insert(),
+                    [row for claim_id, claim in chunk.items() for row in _procedure_rows(claim, claim_id)],
+                )
+            await session.commit()
+
+        if mode == "payload":
+            async with redis.pipeline(transaction=False) as pipe:
+                for claim_id, claim in chunk.items():
+                    store_procedures(pipe, claim_id, claim.procedures)
+                await pipe.execute()
+        claim_ids.extend(str(claim_id) for claim_id in chunk)
+    return claim_ids
+
+def build_ctx(redis, batch_size: int, wait_ms: float) -> dict:
+    """A worker ctx like tasks.startup builds, without the exporter and sampler."""
+    ctx = {"redis": redis, "job_try": 1}
+    if batch_size > 1:
+        ctx["claim_batcher"] = MicroBatcher(
+            lambda items: tasks.process_claims(redis, items), max_size=batch_size, max_wait_ms=wait_ms
+        )
+        ctx["stored_claim_batcher"] = MicroBatcher(
+            lambda items: tasks.process_stored_claims(redis, [claim_id for claim_id, _ in items]),
+            max_size=batch_size,
+            max_wait_ms=wait_ms,
+        )
+    return ctx
+
+async def drive(ctx, claim_ids, mode: str, concurrency: int):
+    job = tasks.process_stored_claim if mode == "stored" else tasks.process_claim
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def run_one(claim_id):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await job(ctx, claim_id)
+            except Retry:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(claim_id) for claim_id in claim_ids))
+    return latencies, errors, time.perf_counter() - started
+
+async def run(args) -> dict:
+    if args.redis:
+        from app.db.redis import create_redis_pool
+        redis = await create_redis_pool()
+    else:
+        redis = FakeRedis()
+
+    claims = [
+        ClaimCreate.model_validate(make_claim(index, procedures=args.procedures, seed=args.seed, npis=args.npis))
+        for index in range(args.claims)
+    ]
+    claim_ids = await seed(redis, claims, args.mode)
+
+    ctx = build_ctx(redis, args.batch_size, args.batch_wait_ms)
+    redis_round_trips = getattr(redis, "round_trips", None)
+    with RoundTripCounter().attach(async_engine) as counter:
+        latencies, errors, elapsed = await drive(ctx, claim_ids, args.mode, args.concurrency)
+        for name in ("claim_batcher", "stored_claim_batcher"):
+            if name in ctx:
+                await ctx[name].close()
+
+    results = summarize(latencies, elapsed, errors)
+    results["db_round_trips_per_claim"] = round(counter.round_trips / len(claim_ids), 2)
+    results["db_statements_per_claim"] = round(counter.statements / len(claim_ids), 2)
+    if redis_round_trips is not None:
+        results["redis_round_trips_per_claim"] = round((redis.round_trips - redis_round_trips) / len(claim_ids), 2)
+
+    await redis.aclose()
+    await async_engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--claims", type=int, default=1000)
+    parser.add_argument("--procedures", type=int, default=20)
+    parser.add_argument("--npis", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mode", choices=["payload", "stored"], default="payload")
+    parser.add_argument("--batch-size", type=int, default=1, help="like CLAIM_BATCH_SIZE")
+    parser.add_argument("--batch-wait-ms", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=int(time.time()) % 1000, help="keeps claim numbers unique per run")
+    parser.add_argument("--redis", action="store_true", help="use the real Redis from REDIS_HOST/REDIS_PORT")
+    parser.add_argument("--output", help="write the results JSON here as well")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    write_results(args.output, "process_claim", vars(args), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_serialization.py
+
+"""Micro-benchmark of the serializers used for responses, Redis blobs and jobs.
+
+    python -m benchmarks.bench_serialization --procedures 20
+"""
+
+import argparse
+import json
+import pickle
+import timeit
+
+from app.schemas.claim import ClaimCreate
+from benchmarks.payloads import make_claim
+
+def build_codecs():
+    from app import serialization
+
+    codecs = {
+        "pickle": (pickle.dumps, pickle.loads),
+        "json": (lambda obj: json.dumps(obj, default=serialization.default).encode(), json.loads),
+    }
+    try:
+        import orjson
+        codecs["orjson"] = (
+            lambda obj: orjson.dumps(obj, default=serialization.default, option=orjson.OPT_NON_STR_KEYS),
+            orjson.loads,
+        )
+    except ImportError:
+        pass
+    return codecs
+
+def run(procedures: int, number: int) -> dict:
+    claim = ClaimCreate.model_validate(make_claim(0, procedures=procedures))
+    # The process_claim job as ARQ stores it
+    job = {
+        "t": None,
+        "f": "process_claim",
+        "a": ("8a8c5f0e-4a0d-4c3e-9d0a-2f1b1b0f6c11", [p.model_dump() for p in claim.procedures]),
+        "k": {},
+        "et": 1730196000000,
+    }
+    results = {}
+    for name, (dumps, loads) in build_codecs().items():
+        encoded = dumps(job)
+        encode = min(timeit.repeat(lambda: dumps(job), number=number, repeat=5)) / number
+        decode = min(timeit.repeat(lambda: loads(encoded), number=number, repeat=5)) / number
+        results[name] = {
+            "bytes": len(encoded),
+            "dumps_us": round(encode * 1e6, 1),
+            "loads_us": round(decode * 1e6, 1),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procedures", type=int, default=20)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.procedures, args.number), indent=2))
+
+if __name__ == "__main__":
+    main()
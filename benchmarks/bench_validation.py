@@ -0,0 +1,86 @@
+# benchmarks/bench_validation.py
+
+"""Per-claim cost of carrying validated procedures from the API to the worker.
+
+Compares the previous path (model_dump() per procedure to store the
+payload, then ProcedureCreate.model_validate(...).model_dump() and a
+ClaimProcedure object per procedure in the worker) with the trusted path
+(compact rows read straight off the models, typed back in the worker
+without validation into plain insert rows). Both end with the same values.
+
+    python -m benchmarks.bench_validation --procedures 20
+"""
+
+import argparse
+import json
+import timeit
+from uuid import uuid4
+
+from app.models import ClaimProcedure
+from app.payload_store import decode_procedures, encode_procedures
+from app.schemas.claim import ClaimCreate
+from app.schemas.procedure import ProcedureCreate, validate_procedures
+from benchmarks.payloads import make_claim
+
+def legacy_store(claim: ClaimCreate) -> bytes:
+    return encode_procedures([procedure.model_dump() for procedure in claim.procedures])
+
+def legacy_load(payload: bytes, claim_id) -> list:
+    return [
+        ClaimProcedure(**ProcedureCreate.model_validate(procedure).model_dump(), claim_id=claim_id)
+        for procedure in decode_procedures(payload)
+    ]
+
+def trusted_store(claim: ClaimCreate) -> bytes:
+    return encode_procedures(claim.procedures)
+
+def trusted_load(payload: bytes, claim_id) -> list:
+    return [{**procedure, "id": uuid4(), "claim_id": claim_id} for procedure in decode_procedures(payload, typed=True)]
+
+def batch_validate(payload: bytes, claim_id) -> list:
+    # Untrusted input (e.g. legacy job arguments) validated as one batch
+    return [
+        {**procedure.model_dump(), "id": uuid4(), "claim_id": claim_id}
+        for procedure in validate_procedures(decode_procedures(payload))
+    ]
+
+def timed(function, number: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+def run(procedures: int, number: int) -> dict:
+    claim = ClaimCreate.model_validate(make_claim(0, procedures=procedures))
+    claim_id = uuid4()
+    payload = trusted_store(claim)
+    legacy = [p.model_dump(exclude={"id", "net_fee", "status"}) for p in legacy_load(payload, claim_id)]
+    assert legacy == [{k: v for k, v in row.items() if k != "id"} for row in trusted_load(payload, claim_id)]
+
+    results = {
+        "legacy": {
+            "store_us": timed(lambda: legacy_store(claim), number),
+            "load_us": timed(lambda: legacy_load(payload, claim_id), number),
+        },
+        "trusted": {
+            "store_us": timed(lambda: trusted_store(claim), number),
+            "load_us": timed(lambda: trusted_load(payload, claim_id), number),
+        },
+        "batch_validated": {
+            "store_us": timed(lambda: trusted_store(claim), number),
+            "load_us": timed(lambda: batch_validate(payload, claim_id), number),
+        },
+    }
+    for path in results.values():
+        path["total_us"] = path["store_us"] + path["load_us"]
+        for key in path:
+            path[key] = round(path[key] * 1e6, 1)
+    results["saved_us_per_claim"] = round(results["legacy"]["total_us"] - results["trusted"]["total_us"], 1)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procedures", type=int, default=20)
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(run(args.procedures, args.number), indent=2))
+
+if __name__ == "__main__":
+    main()
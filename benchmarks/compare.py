@@ -0,0 +1,47 @@
+# benchmarks/compare.py
+
+"""Compare two benchmark result files, e.g. from two commits.
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+def flatten(results: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+def compare(before: Dict, after: Dict) -> Dict[str, Dict[str, float]]:
+    """Every numeric result present in both runs, with its relative change."""
+    old = dict(flatten(before["results"]))
+    changes = {}
+    for name, new_value in flatten(after["results"]):
+        if name not in old:
+            continue
+        old_value = old[name]
+        change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+        changes[name] = {"before": old_value, "after": new_value, "change_pct": round(change, 1)}
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    for name, change in compare(before, after).items():
+        print(f"{name:50} {change['before']:>12} {change['after']:>12} {change['change_pct']:>+8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/fakes.py
+
+"""In-memory stand-in for the Redis commands the API and worker use.
+
+Counts round trips (one per command, one per pipeline execute) so a run
+without Redis still reports how many the real thing would need.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+from app.queue import add_job
+from app.serialization import job_serializer, job_deserializer
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, f"_{name}")
+        return lambda *args, **kwargs: self.calls.append((command, args, kwargs))
+
+    async def execute(self) -> List[Any]:
+        self.redis.round_trips += 1
+        self.redis.commands += len(self.calls)
+        calls, self.calls = self.calls, []
+        return [command(*args, **kwargs) for command, args, kwargs in calls]
+
+class FakeRedis:
+    job_serializer = staticmethod(job_serializer)
+    job_deserializer = staticmethod(job_deserializer)
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+        self.round_trips = 0
+        self.commands = 0
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def __getattr__(self, name):
+        command = getattr(self, f"_{name}", None)
+        if command is None:
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            self.commands += 1
+            return command(*args, **kwargs)
+        return call
+
+    def _live(self, key: str) -> Optional[Any]:
+        expires = self.expires.get(key)
+        if expires is not None and expires < time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _set(self, key, value, ex=None, px=None):
+        self.data[key] = value
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        elif px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+        return True
+
+    def _psetex(self, key, ms, value):
+        return self._set(key, value, px=ms)
+
+    def _get(self, key):
+        return self._live(key)
+
+    def _mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    def _delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def _exists(self, *keys):
+        return sum(self._live(key) is not None for key in keys)
+
+    def _strlen(self, key):
+        return len(self._live(key) or b"")
+
+    def _incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def _hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def _hsetnx(self, key, field, value):
+        return int(self.data.setdefault(key, {}).setdefault(field, value) is value)
+
+    def _hgetall(self, key):
+        return dict(self._live(key) or {})
+
+    def _expire(self, key, seconds, nx=False):
+        if key not in self.data or (nx and key in self.expires):
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    def _publish(self, channel, message):
+        return 0
+
+    def _zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def _zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    async def enqueue_job(self, function: str, *args, **kwargs):
+        kwargs = {key: value for key, value in kwargs.items() if not key.startswith("_")}
+        async with self.pipeline() as pipe:
+            add_job(pipe, self, function, args, kwargs)
+            await pipe.execute()
+
+    async def aclose(self, *args, **kwargs):
+        pass
@@ -0,0 +1,115 @@
+# benchmarks/load.py
+
+"""Async HTTP load generator for POST /claims/ and GET /claims/top-npis/.
+
+    python -m benchmarks.load --url http://localhost:8000 --duration 30 --concurrency 50 \
+        --mix claims=9,top-npis=1 --output results.json
+
+Each virtual user sends requests back to back, choosing the endpoint by the
+weights in --mix. Claims are generated like example_payload.json with
+claim numbers unique to the run.
+
+The API rate limits top-npis to TOP_NPIS_RATE_LIMIT (120/minute per client),
+which the default mix exceeds within seconds. Responses with status 429 are
+reported as rate_limited, apart from errors and latencies; start the API
+with e.g. TOP_NPIS_RATE_LIMIT=100000/minute to measure the endpoint itself.
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict
+
+import httpx
+
+from benchmarks.payloads import make_claim
+from benchmarks.stats import summarize, write_results
+
+ENDPOINTS = {
+    "claims": ("POST", "/claims/"),
+    "top-npis": ("GET", "/claims/top-npis/"),
+}
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r}, expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+async def run(args) -> dict:
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    claim_index = itertools.count()
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    rate_limited = defaultdict(int)
+    statuses = defaultdict(int)
+    deadline = time.perf_counter() + args.duration
+    remaining = itertools.count() if args.requests is None else iter(range(args.requests))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        async def user(rng: random.Random):
+            for _ in remaining:
+                if args.requests is None and time.perf_counter() >= deadline:
+                    return
+                name = rng.choices(names, weights)[0]
+                method, path = ENDPOINTS[name]
+                body = None
+                if name == "claims":
+                    body = make_claim(next(claim_index), procedures=args.procedures, seed=args.seed, npis=args.npis)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    statuses[f"{name} {response.status_code}"] += 1
+                    if response.is_success:
+                        latencies[name].append(time.perf_counter() - started)
+                    elif response.status_code == 429:
+                        rate_limited[name] += 1
+                    else:
+                        errors[name] += 1
+                except httpx.HTTPError:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(random.Random(args.seed * 10_000 + i)) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {name: summarize(latencies[name], elapsed, errors[name]) for name in names}
+    results["all"] = summarize(
+        [latency for values in latencies.values() for latency in values], elapsed, sum(errors.values())
+    )
+    for name in names:
+        results[name]["rate_limited"] = rate_limited[name]
+    results["all"]["rate_limited"] = sum(rate_limited.values())
+    if rate_limited:
+        print(f"Rate limited (429): {dict(rate_limited)}; raise TOP_NPIS_RATE_LIMIT on the API for load runs", file=sys.stderr)
+    results["statuses"] = dict(statuses)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=30, help="seconds, unless --requests is given")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("claims=9,top-npis=1"))
+    parser.add_argument("--procedures", type=int, default=20)
+    parser.add_argument("--npis", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=int(time.time()) % 1000, help="keeps claim numbers unique per run")
+    parser.add_argument("--output", help="write the results JSON here as well")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    write_results(args.output, "load", vars(args), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# benchmarks/payloads.py
+
+import random
+from datetime import datetime, timedelta
+
+from app.npi import npi_check_digit
+
+PROCEDURE_CODES = ["D0120", "D0140", "D0150", "D0210", "D0220", "D0274", "D1110", "D1120", "D2140", "D2330"]
+
+def make_procedure(rng: random.Random, npi: str) -> dict:
+    """Build one procedure shaped like example_payload.json."""
+    provider_fees = rng.randint(50, 500)
+    allowed_fees = round(provider_fees * rng.uniform(0.6, 0.95), 2)
+    return {
+        "service_date": (datetime(2024, 10, 29) - timedelta(days=rng.randint(0, 365))).isoformat(),
+        "submitted_procedure": rng.choice(PROCEDURE_CODES),
+        "quadrant": rng.choice([None, "UR", "UL", "LR", "LL"]),
+        "provider_npi": npi,
+        "provider_fees": float(provider_fees),
+        "allowed_fees": allowed_fees,
+        "member_coinsurance": round(provider_fees * 0.1, 2),
+        "member_copay": float(rng.choice([0, 5, 10, 25])),
+    }
+
+def make_claim(index: int, procedures: int = 20, seed: int = 0, npis: int = 1000) -> dict:
+    """Build a claim with a unique claim_number and ``procedures`` procedures."""
+    rng = random.Random(seed * 1_000_003 + index)
+    base = str(100_000_000 + rng.randrange(npis))
+    npi = f"{base}{npi_check_digit(base)}"
+    return {
+        "claim_number": f"CLM{seed:03d}{index:010d}",
+        "plan_group": f"GRP-{rng.randint(1000, 9999)}",
+        "subscriber_number": str(rng.randint(10 ** 9, 10 ** 10 - 1)),
+        "procedures": [make_procedure(rng, npi) for _ in range(procedures)],
+    }
+
+def uppercase_keys(data):
+    """Return a copy of a claim payload with Capitalized_Keys at every level."""
+    if isinstance(data, dict):
+        return {key.title(): uppercase_keys(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [uppercase_keys(item) for item in data]
+    return data
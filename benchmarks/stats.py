@@ -0,0 +1,98 @@
+# benchmarks/stats.py
+
+"""Latency summaries, DB round-trip counting and JSON result files."""
+
+import json
+import math
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> dict:
+    """Throughput and latency percentiles (in milliseconds) of one run."""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p95": round(percentile(values, 95) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3) if values else 0.0,
+        },
+    }
+
+class RoundTripCounter:
+    """Count statements sent through an engine, i.e. DB round trips.
+
+    BEGIN, COMMIT and ROLLBACK are round trips too, so they are counted
+    alongside cursor executions.
+    """
+
+    EVENTS = ("begin", "commit", "rollback")
+
+    def __init__(self):
+        self.statements = 0
+        self.transaction_control = 0
+
+    @property
+    def round_trips(self) -> int:
+        return self.statements + self.transaction_control
+
+    def _on_execute(self, *args, **kwargs):
+        self.statements += 1
+
+    def _on_transaction(self, *args, **kwargs):
+        self.transaction_control += 1
+
+    @contextmanager
+    def attach(self, async_engine):
+        engine = async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        for name in self.EVENTS:
+            event.listen(engine, name, self._on_transaction)
+        try:
+            yield self
+        finally:
+            event.remove(engine, "before_cursor_execute", self._on_execute)
+            for name in self.EVENTS:
+                event.remove(engine, name, self._on_transaction)
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path: Optional[str], benchmark: str, params: Dict, results: Dict) -> dict:
+    """Print the results and, with ``path``, save them for comparing commits."""
+    document = {
+        "benchmark": benchmark,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, default=str)
+    print(text)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    return document
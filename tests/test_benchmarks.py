@@ -0,0 +1,62 @@
+# tests/test_benchmarks.py
+
+import pytest
+from uuid import uuid4
+
+from app import tasks
+from app.payload_store import load_procedures
+from app.schemas.procedure import ProcedureCreate
+from benchmarks.fakes import FakeRedis
+from benchmarks.stats import percentile, summarize
+from tests.test_workers import PROCEDURE
+
+def test_percentile_uses_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 50) == 0.0
+
+def test_summarize_reports_throughput_and_percentiles_in_ms():
+    summary = summarize([0.01, 0.02, 0.03, 0.04], elapsed=2.0, errors=1)
+    assert summary["count"] == 4
+    assert summary["errors"] == 1
+    assert summary["throughput_per_s"] == 2.0
+    assert summary["latency_ms"]["p50"] == 20.0
+    assert summary["latency_ms"]["max"] == 40.0
+
+@pytest.mark.asyncio
+async def test_fake_redis_counts_a_pipeline_as_one_round_trip():
+    redis = FakeRedis()
+    claim_ids = [uuid4() for _ in range(3)]
+    await tasks.enqueue_process_claims(redis, [(claim_id, [ProcedureCreate(**PROCEDURE)]) for claim_id in claim_ids])
+    assert redis.round_trips == 1
+    # Payload, PENDING status and its TTL, job and queue entry per claim
+    assert redis.commands == 15
+
+    stored = await load_procedures(redis, [str(claim_id) for claim_id in claim_ids])
+    assert redis.round_trips == 2
+    assert all(procedures[0]["provider_npi"] == PROCEDURE["provider_npi"] for procedures in stored.values())
+
+@pytest.mark.asyncio
+async def test_load_reports_rate_limited_requests_apart_from_errors(monkeypatch):
+    from argparse import Namespace
+    import httpx
+    from benchmarks import load
+
+    def respond(request):
+        if request.url.path == "/claims/top-npis/":
+            return httpx.Response(429)
+        return httpx.Response(200, json=str(uuid4()))
+
+    client = httpx.AsyncClient
+    monkeypatch.setattr(load.httpx, "AsyncClient", lambda **kwargs: client(transport=httpx.MockTransport(respond), **kwargs))
+    args = Namespace(
+        url="http://api", duration=30, requests=20, concurrency=2, mix={"claims": 1, "top-npis": 1},
+        procedures=1, npis=10, timeout=5, seed=1,
+    )
+    results = await load.run(args)
+
+    assert results["top-npis"]["errors"] == 0
+    assert results["top-npis"]["count"] == 0
+    assert results["top-npis"]["rate_limited"] + results["claims"]["count"] == 20
+    assert results["all"]["rate_limited"] == results["top-npis"]["rate_limited"]
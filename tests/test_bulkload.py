@@ -0,0 +1,92 @@
+# tests/test_bulkload.py
+
+import csv
+import json
+from decimal import Decimal
+
+from app.bulkload import Checkpoint, ChunkReader, merge_sql, read_csv, read_ndjson
+from app.export import CSV_HEADER
+from tests.test_workers import PROCEDURE
+
+def claim(number, **procedure):
+    return {
+        "claim_number": f"CLM-{number:05d}",
+        "plan_group": "GRP-1000",
+        "subscriber_number": "3730189502",
+        "procedures": [{**PROCEDURE, **procedure}],
+    }
+
+def write_ndjson(path, lines):
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+def test_chunks_validate_compute_fees_and_resume_from_offsets(tmp_path):
+    path = write_ndjson(tmp_path / "claims.ndjson", [
+        json.dumps(claim(1)),
+        json.dumps(claim(2, allowed_fees=200.0)),
+        "{not json",
+        json.dumps(claim(3, provider_npi="1497775531")),
+        json.dumps(claim(4)),
+    ])
+    reader = ChunkReader(read_ndjson(path), chunk_size=2)
+
+    first = reader.next_chunk()
+    assert [record[1] for record in first.claims] == ["CLM-00001", "CLM-00002"]
+    assert [record[4:] for record in first.claims] == [(Decimal("35.0"), "SUCCESS"), (Decimal("-85.0"), "FAILURE")]
+    assert [record[-2:] for record in first.procedures] == [(Decimal("35.0"), "SUCCESS"), (Decimal("-85.0"), "FAILED")]
+    assert first.procedures[0][1] == first.claims[0][0]
+    assert first.first_month.isoformat() == "2024-10-01"
+
+    second = reader.next_chunk()
+    assert second.claims == []
+    assert [reject["line"] for reject in second.rejects] == [3, 4]
+    assert second.rejects[1]["claim_number"] == "CLM-00003"
+
+    # A new reader picks up after the last checkpointed chunk
+    resumed = ChunkReader(read_ndjson(path, second.offset), chunk_size=2, offset=second.offset, line=second.line)
+    third = resumed.next_chunk()
+    assert [record[1] for record in third.claims] == ["CLM-00004"]
+    assert third.line == 5
+    assert resumed.next_chunk() is None
+
+def test_csv_export_rows_are_grouped_into_claims(tmp_path):
+    path = tmp_path / "claims.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for number, procedures in ((1, 2), (2, 1)):
+            for index in range(procedures):
+                writer.writerow([
+                    f"id-{number}", f"CLM-{number:05d}", "GRP-1000", "3730189502", "35.00", "SUCCESS",
+                    f"p-{index}", PROCEDURE["service_date"], "D0120", "", PROCEDURE["provider_npi"],
+                    "100.00", "80.00", "10.00", "5.00", "35.00", "SUCCESS",
+                ])
+
+    claims = list(read_csv(str(path)))
+    assert [(first, data["claim_number"], len(data["procedures"]), last) for first, data, last, _ in claims] == [
+        (2, "CLM-00001", 2, 3), (4, "CLM-00002", 1, 4),
+    ]
+    assert claims[0][1]["procedures"][0]["quadrant"] is None
+
+    chunk = ChunkReader(read_csv(str(path), claims[0][3]), chunk_size=10).next_chunk()
+    assert [record[1] for record in chunk.claims] == ["CLM-00002"]
+    assert chunk.rejects == []
+
+def test_checkpoint_round_trip_is_tied_to_the_input(tmp_path):
+    source = write_ndjson(tmp_path / "claims.ndjson", [json.dumps(claim(1))])
+    checkpoint = Checkpoint(str(tmp_path / "claims.checkpoint"), source)
+    checkpoint.state.update(offset=10, claims=1, loaded=1)
+    checkpoint.save()
+
+    restored = Checkpoint(checkpoint.path, source)
+    assert restored.load()
+    assert restored.state["offset"] == 10
+
+    write_ndjson(tmp_path / "claims.ndjson", [json.dumps(claim(1)), json.dumps(claim(2))])
+    assert not Checkpoint(checkpoint.path, source).load()
+
+def test_merge_only_adds_procedures_and_totals_of_new_claims():
+    sql = merge_sql()
+    assert "ON CONFLICT (claim_number) DO NOTHING" in sql
+    assert "JOIN inserted ON inserted.id = s.claim_id" in sql
+    assert "npi_net_fee_totals.total_net_fee + excluded.total_net_fee" in sql
@@ -0,0 +1,90 @@
+# tests/test_cache.py
+
+import asyncio
+import pytest
+from app.cache import TTLCache, bump_version
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    cache = TTLCache("test", ttl=60, maxsize=10, shared=False)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [{"provider_npi": "1497775530"}]
+
+    results = await asyncio.gather(*[cache.get_or_load((10, 0), loader) for _ in range(20)])
+    assert calls == 1
+    assert all(result == results[0] for result in results)
+
+@pytest.mark.asyncio
+async def test_lru_bound_and_ttl_expiry():
+    cache = TTLCache("test", ttl=0, maxsize=2, shared=False)
+
+    async def loader():
+        return ["value"]
+
+    for offset in range(3):
+        await cache.get_or_load((10, offset), loader)
+    assert len(cache._entries) == 2
+    # ttl=0 means every entry is already expired
+    assert cache._get_local((0, (10, 2))) is None
+
+@pytest.mark.asyncio
+async def test_version_bump_invalidates_shared_entries():
+    redis = DictRedis()
+    cache = TTLCache("test", ttl=60, maxsize=10)
+    values = iter([["first"], ["second"]])
+
+    async def loader():
+        return next(values)
+
+    assert await cache.get_or_load((10, 0), loader, redis=redis) == ["first"]
+    assert await cache.get_or_load((10, 0), loader, redis=redis) == ["first"]
+    await bump_version(redis, "test")
+    assert await cache.get_or_load((10, 0), loader, redis=redis) == ["second"]
+
+@pytest.mark.asyncio
+async def test_shared_entries_come_back_with_their_types():
+    from decimal import Decimal
+    from app.cache import top_npis_cache
+
+    redis = DictRedis()
+    rows = [{"provider_npi": "1497775530", "total_net_fee": Decimal("35.00")}]
+
+    async def loader():
+        return rows
+
+    cache = TTLCache("top_npis", ttl=60, maxsize=10, decode=top_npis_cache.decode)
+    assert await cache.get_or_load((10, 0), loader, redis=redis) == rows
+    # Another process fills its local cache from Redis
+    other = TTLCache("top_npis", ttl=60, maxsize=10, decode=top_npis_cache.decode)
+    [row] = await other.get_or_load((10, 0), None, redis=redis)
+    assert isinstance(row["total_net_fee"], Decimal)
+    assert row == rows[0]
+
+@pytest.mark.asyncio
+async def test_zero_ttl_skips_the_shared_write():
+    redis = DictRedis()
+    cache = TTLCache("test", ttl=0, maxsize=10)
+
+    async def loader():
+        return ["value"]
+
+    assert await cache.get_or_load((1,), loader, redis=redis) == ["value"]
+    assert redis.data == {}
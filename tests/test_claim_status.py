@@ -0,0 +1,160 @@
+# tests/test_claim_status.py
+
+import asyncio
+import pytest
+from decimal import Decimal
+from uuid import uuid4
+
+from httpx import ASGITransport, AsyncClient
+
+from app.claim_status import StatusWatcher, get_status, get_status_watcher, publish_statuses, status_key
+from app.db.redis import get_redis
+from app.main import app
+from app.routers import claim as claim_router
+from app.serialization import loads
+
+class FakeStatusPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        for name, args, kwargs in self.calls:
+            getattr(self.redis, f"_{name}")(*args, **kwargs)
+
+class FakeStatusRedis:
+    def __init__(self, watcher=None):
+        self.hashes = {}
+        self.ttls = {}
+        self.published = []
+        self.watcher = watcher
+
+    def pipeline(self, transaction=True):
+        return FakeStatusPipeline(self)
+
+    async def hgetall(self, key):
+        return {field.encode(): value.encode() for field, value in self.hashes.get(key, {}).items()}
+
+    def _hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def _hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field, value)
+
+    def _expire(self, key, seconds, nx=False):
+        if not nx or key not in self.ttls:
+            self.ttls[key] = seconds
+
+    def _publish(self, channel, message):
+        self.published.append(loads(message))
+        if self.watcher is not None:
+            self.watcher.notify(loads(message))
+
+@pytest.mark.asyncio
+async def test_status_is_read_from_the_hash_and_backfilled_on_a_miss():
+    redis = FakeStatusRedis()
+    claim_id = str(uuid4())
+    lookups = []
+
+    async def loader():
+        lookups.append(claim_id)
+        return "SUCCESS", Decimal("35.00")
+
+    status = await get_status(redis, claim_id, loader)
+    assert status == {"id": claim_id, "status": "SUCCESS", "net_fee": Decimal("35.00")}
+    assert await get_status(redis, claim_id, loader) == status
+    assert lookups == [claim_id]
+    assert redis.ttls[status_key(claim_id)] == 24 * 3600
+
+    async def missing():
+        return None
+
+    assert await get_status(redis, str(uuid4()), missing) is None
+
+@pytest.mark.asyncio
+async def test_backfill_never_overwrites_a_newer_transition():
+    redis = FakeStatusRedis()
+    claim_id = str(uuid4())
+
+    async def stale_loader():
+        # The worker commits and publishes between our miss and the backfill
+        await publish_statuses(redis, {claim_id: ("FAILURE", Decimal("-85.00"))})
+        return "PENDING", Decimal("0.00")
+
+    await get_status(redis, claim_id, stale_loader)
+    assert redis.hashes[status_key(claim_id)] == {"status": "FAILURE", "net_fee": "-85.00"}
+    # Nor the terminal entry's TTL
+    assert redis.ttls[status_key(claim_id)] == 24 * 3600
+    assert redis.published == [{claim_id: {"status": "FAILURE", "net_fee": "-85.00"}}]
+
+@pytest.mark.asyncio
+async def test_watchers_wake_on_notifications_until_terminal():
+    watcher = StatusWatcher(None, recheck=60)
+    redis = FakeStatusRedis(watcher)
+    claim_id = str(uuid4())
+    await publish_statuses(redis, {claim_id: ("PENDING", Decimal("0.00"))})
+    reads = []
+
+    async def load():
+        reads.append(claim_id)
+        return await get_status(redis, claim_id, None)
+
+    async def collect():
+        return [status["status"] async for status in watcher.watch(claim_id, load, timeout=5)]
+
+    waiting = asyncio.create_task(collect())
+    await asyncio.sleep(0)
+    await publish_statuses(redis, {claim_id: ("SUCCESS", Decimal("35.00"))})
+    assert await asyncio.wait_for(waiting, 1) == ["PENDING", "SUCCESS"]
+    # One read up front, the rest came from the subscription
+    assert reads == [claim_id]
+    assert watcher._waiters == {}
+
+@pytest.mark.asyncio
+async def test_status_endpoints(monkeypatch):
+    watcher = StatusWatcher(None, recheck=60)
+    redis = FakeStatusRedis(watcher)
+    claim_id, unknown = uuid4(), uuid4()
+    await publish_statuses(redis, {str(claim_id): ("PENDING", Decimal("0.00"))})
+
+    async def query_claim_status(claim_id):
+        return None
+
+    monkeypatch.setattr(claim_router, "_query_claim_status", query_claim_status)
+    app.dependency_overrides[get_redis] = lambda: redis
+    app.dependency_overrides[get_status_watcher] = lambda: watcher
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+            response = await client.get(f"/claims/{claim_id}")
+            assert response.status_code == 200
+            assert response.json()["status"] == "PENDING"
+
+            async def finish():
+                await asyncio.sleep(0.05)
+                await publish_statuses(redis, {str(claim_id): ("SUCCESS", Decimal("35.00"))})
+
+            finishing = asyncio.create_task(finish())
+            response = await client.get(f"/claims/{claim_id}", params={"wait": 5})
+            await finishing
+            assert response.json()["status"] == "SUCCESS"
+
+            response = await client.get(f"/claims/{claim_id}/events")
+            assert response.headers["content-type"].startswith("text/event-stream")
+            assert response.text.startswith("event: status\ndata: ")
+            assert loads(response.text.split("data: ")[1])["status"] == "SUCCESS"
+
+            assert (await client.get(f"/claims/{unknown}")).status_code == 404
+            assert (await client.get(f"/claims/{unknown}/events")).status_code == 404
+            # Other routes are not mistaken for claim IDs
+            assert (await client.get("/claims/top-npis")).status_code == 307
+    finally:
+        app.dependency_overrides.clear()
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlmodel import SQLModel, select
 from app.main import app
 from app.db.connection import get_session
+from app.db.redis import get_redis, create_redis_pool, close_redis_pool
 from app.models import Claim, ClaimProcedure
 from uuid import UUID
 import os
@@ -48,10 +49,16 @@ async def client():
     async def get_test_session():
         async with TestSessionLocal() as session:
             yield session
+    redis = await create_redis_pool()
+    async def get_test_redis():
+        return redis
     app.dependency_overrides[get_session] = get_test_session
+    app.dependency_overrides[get_redis] = get_test_redis
     async with AsyncClient(app=app, base_url="http://testserver") as ac:
         yield ac
     app.dependency_overrides.pop(get_session, None)
+    app.dependency_overrides.pop(get_redis, None)
+    await close_redis_pool(redis)
 
 @pytest.mark.asyncio
 async def test_create_claim(setup_database, client):
@@ -0,0 +1,53 @@
+# tests/test_engine.py
+
+import pytest
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.db import engine as engine_module
+
+def test_create_engine_uses_environment_pool_settings(monkeypatch):
+    monkeypatch.setattr(engine_module, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(engine_module, "DB_MAX_OVERFLOW", 1)
+    engine = engine_module.create_engine("test")
+
+    pool = engine.sync_engine.pool
+    assert isinstance(pool, AsyncAdaptedQueuePool)
+    assert pool.size() == 3
+    assert pool._max_overflow == 1
+    assert engine.echo is False
+    assert engine_module.pool_metrics["test"].pool is pool
+
+def test_pool_metrics_snapshot_averages():
+    metrics = engine_module.PoolMetrics("test")
+    metrics.observe_wait(0.01)
+    metrics.observe_wait(0.03)
+    metrics.observe_age(10)
+    metrics.observe_age(30)
+    snapshot = metrics.snapshot()
+    assert snapshot["checkouts"] == 2
+    assert abs(snapshot["checkout_wait_seconds_avg"] - 0.02) < 1e-9
+    assert snapshot["checkout_wait_seconds_max"] == 0.03
+    assert snapshot["connection_age_seconds_avg"] == 20
+    assert snapshot["checked_out"] == 0
+
+@pytest.mark.asyncio
+async def test_only_pool_timeouts_count_as_checkout_timeouts():
+    from unittest.mock import MagicMock
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from sqlalchemy.util import greenlet_spawn
+
+    metrics = engine_module.PoolMetrics("test")
+    pool_class = engine_module._instrumented_pool_class(metrics)
+
+    def refuse():
+        raise ConnectionRefusedError("db down")
+
+    with pytest.raises(ConnectionRefusedError):
+        await greenlet_spawn(pool_class(refuse, pool_size=1, max_overflow=0).connect)
+    assert metrics.checkout_timeouts == 0
+
+    pool = pool_class(MagicMock, pool_size=1, max_overflow=0, timeout=0.01)
+    held = await greenlet_spawn(pool.connect)
+    with pytest.raises(PoolTimeoutError):
+        await greenlet_spawn(pool.connect)
+    assert metrics.checkout_timeouts == 1
+    await greenlet_spawn(held.close)
@@ -0,0 +1,57 @@
+# tests/test_export.py
+
+import csv
+import io
+import json
+import pytest
+from datetime import datetime
+from decimal import Decimal
+
+from app.export import CSV_HEADER, csv_chunks, ndjson_chunks
+
+def claim(claim_id):
+    return (claim_id, f"CLM-{claim_id}", "GRP-1000", "3730189502", Decimal("35.00"), "SUCCESS")
+
+def procedure(procedure_id):
+    return (
+        procedure_id, datetime(2024, 10, 29, 10), "D0120", None, "1497775530", Decimal("100.00"),
+        Decimal("80.00"), Decimal("10.00"), Decimal("5.00"), Decimal("35.00"), "SUCCESS",
+    )
+
+NO_PROCEDURE = (None,) * len(procedure("p"))
+
+async def batches(*groups):
+    for rows in groups:
+        yield rows
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+@pytest.mark.asyncio
+async def test_ndjson_groups_procedures_by_claim_across_batches():
+    body = await collect(ndjson_chunks(batches(
+        [claim("a") + procedure("p1"), claim("a") + procedure("p2")],
+        [claim("a") + procedure("p3"), claim("b") + NO_PROCEDURE],
+    )))
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["id"] for line in lines] == ["a", "b"]
+    assert [p["id"] for p in lines[0]["procedures"]] == ["p1", "p2", "p3"]
+    assert lines[0]["procedures"][0]["provider_fees"] == "100.00"
+    assert lines[1]["procedures"] == []
+
+@pytest.mark.asyncio
+async def test_csv_writes_header_and_one_line_per_row():
+    body = await collect(csv_chunks(batches(
+        [claim("a") + procedure("p1")],
+        [claim("b") + procedure("p2")],
+    )))
+
+    rows = list(csv.reader(io.StringIO(body.decode())))
+    assert rows[0] == CSV_HEADER
+    assert [row[0] for row in rows[1:]] == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_csv_of_empty_export_is_just_the_header():
+    body = await collect(csv_chunks(batches()))
+    assert list(csv.reader(io.StringIO(body.decode()))) == [CSV_HEADER]
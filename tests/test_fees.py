@@ -0,0 +1,74 @@
+# tests/test_fees.py
+
+import random
+from decimal import Decimal
+import pytest
+from app.fees import compute_fees
+from app.models import Claim, ClaimProcedure
+
+def model_results(columns, claim_sizes):
+    """Run the ORM/Decimal path that the worker used before the fee engine."""
+    procedures = []
+    for provider, allowed, coinsurance, copay in zip(*columns):
+        procedure = ClaimProcedure(
+            provider_fees=provider,
+            allowed_fees=allowed,
+            member_coinsurance=coinsurance,
+            member_copay=copay,
+        )
+        procedure.calculate_and_store_net_fee()
+        procedure.status = "FAILED" if procedure.net_fee < 0 else "SUCCESS"
+        procedures.append(procedure)
+
+    claims = []
+    start = 0
+    for size in claim_sizes:
+        claim = Claim()
+        claim.procedures = procedures[start:start + size]
+        claim.calculate_and_store_net_fee()
+        claim.update_status()
+        claims.append(claim)
+        start += size
+    return procedures, claims
+
+def random_amount(rng):
+    places = rng.choice([0, 1, 2, 2, 2, 3, 4])
+    return Decimal(rng.randint(0, 10 ** 6)).scaleb(-places)
+
+def assert_parity(columns, claim_sizes):
+    procedures, claims = model_results(columns, claim_sizes)
+    result = compute_fees(*columns, claim_sizes)
+
+    # str() equality also checks the exponent, i.e. the scale Postgres stores
+    assert [str(fee) for fee in result.net_fees] == [str(p.net_fee) for p in procedures]
+    assert result.statuses == [p.status for p in procedures]
+    assert [str(fee) for fee in result.claim_net_fees] == [str(c.net_fee) for c in claims]
+    assert result.claim_statuses == [c.status for c in claims]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fee_engine_matches_decimal_path(seed):
+    rng = random.Random(seed)
+    claim_sizes = [rng.randint(0, 30) for _ in range(rng.randint(1, 50))]
+    count = sum(claim_sizes)
+    columns = [[random_amount(rng) for _ in range(count)] for _ in range(4)]
+    assert_parity(columns, claim_sizes)
+
+def test_fee_engine_matches_example_payload():
+    columns = [
+        [Decimal("100.0"), Decimal("150.0")],
+        [Decimal("80.0"), Decimal("120.0")],
+        [Decimal("10.0"), Decimal("15.0")],
+        [Decimal("5.0"), Decimal("5.0")],
+    ]
+    assert_parity(columns, [2])
+    assert compute_fees(*columns, [2]).claim_net_fees == [Decimal("85.0")]
+
+@pytest.mark.parametrize("value", ["1E+2", "0.000000001", "12345678901234567890.5"])
+def test_fee_engine_matches_unusual_scales(value):
+    # Positive exponents, very small scales and values past int64
+    columns = [[Decimal(value), Decimal("3")], [Decimal("1")] * 2, [Decimal("0")] * 2, [Decimal("0.5")] * 2]
+    assert_parity(columns, [1, 1])
+
+def test_fee_engine_rejects_mismatched_columns():
+    with pytest.raises(ValueError):
+        compute_fees([Decimal("1")], [], [], [], [1])
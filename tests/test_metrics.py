@@ -0,0 +1,55 @@
+# tests/test_metrics.py
+
+import time
+import pytest
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+from app.main import app
+from app import metrics
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_latency_by_route():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        assert (await client.get("/health")).status_code == 200
+        response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert "db_pool_checked_out" in response.text
+
+class QueuePipeline:
+    def __init__(self, results):
+        self.results = results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    async def execute(self):
+        return self.results
+
+class QueueRedis:
+    def __init__(self, results):
+        self.results = results
+
+    def pipeline(self, transaction=True):
+        return QueuePipeline(self.results)
+
+@pytest.mark.asyncio
+async def test_sample_queue_records_depth_and_oldest_age():
+    enqueued_ms = time.time() * 1000 - 30_000
+    await metrics.sample_queue(QueueRedis([5, 3, [(b"job", enqueued_ms)]]), "arq:queue")
+    assert REGISTRY.get_sample_value("arq_queue_depth", {"state": "ready"}) == 3
+    assert REGISTRY.get_sample_value("arq_queue_depth", {"state": "deferred"}) == 2
+    assert 29 < REGISTRY.get_sample_value("arq_queue_oldest_job_age_seconds") < 40
+
+def test_stage_timer_records_each_stage():
+    before = REGISTRY.get_sample_value("process_claim_stage_seconds_count", {"stage": "load"}) or 0
+    timer = metrics.StageTimer()
+    timer.mark("load")
+    timer.mark("compute")
+    assert REGISTRY.get_sample_value("process_claim_stage_seconds_count", {"stage": "load"}) == before + 1
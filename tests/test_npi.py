@@ -0,0 +1,49 @@
+# tests/test_npi.py
+
+import pytest
+from pydantic import ValidationError
+
+from app import npi as npi_module
+from app.npi import NpiRegistry, build_index, is_valid_npi, npi_check_digit
+from app.schemas.procedure import ProcedureCreate
+from tests.test_workers import PROCEDURE
+
+def test_check_digit_uses_the_80840_prefix():
+    # The CMS example NPI
+    assert npi_check_digit("123456789") == 3
+    assert is_valid_npi("1234567893")
+    assert is_valid_npi("1497775530")
+    assert not is_valid_npi("1234567890")
+    assert not is_valid_npi("123456789")
+    assert not is_valid_npi("12345678a3")
+
+def test_registry_index_lookups(tmp_path):
+    path = str(tmp_path / "npi.idx")
+    assert build_index(["1497775530", "1234567893", "1497775530"], path) == 2
+
+    registry = NpiRegistry(path)
+    assert len(registry) == 2
+    assert "1497775530" in registry
+    assert "1234567893" in registry
+    assert "1000002430" not in registry
+    # Repeats are answered by the LRU
+    assert "1497775530" in registry
+    assert registry.contains.cache_info().hits == 1
+    registry.close()
+
+def test_registry_rejects_other_files(tmp_path):
+    path = tmp_path / "npi.idx"
+    path.write_bytes(b"not an index at all")
+    with pytest.raises(ValueError):
+        NpiRegistry(str(path))
+
+def test_procedure_npi_must_pass_checksum_and_registry(tmp_path, monkeypatch):
+    with pytest.raises(ValidationError, match="check digit"):
+        ProcedureCreate(**{**PROCEDURE, "provider_npi": "1497775531"})
+
+    path = str(tmp_path / "npi.idx")
+    build_index(["1497775530"], path)
+    monkeypatch.setattr(npi_module, "NPI_REGISTRY_PATH", path)
+    assert ProcedureCreate(**PROCEDURE).provider_npi == "1497775530"
+    with pytest.raises(ValidationError, match="registry"):
+        ProcedureCreate(**{**PROCEDURE, "provider_npi": "1234567893"})
@@ -0,0 +1,26 @@
+# tests/test_partitions.py
+
+from datetime import date, datetime
+
+from app.db.partitions import (
+    add_months,
+    create_partition_sql,
+    months_between,
+    partition_name,
+)
+
+def test_add_months_crosses_year_boundaries():
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+
+def test_months_between_is_inclusive_of_both_months():
+    assert months_between(datetime(2024, 11, 15, 10), date(2025, 1, 31)) == [
+        date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1),
+    ]
+
+def test_create_partition_sql_covers_one_month():
+    assert partition_name(date(2024, 12, 1)) == "claimprocedure_y2024m12"
+    assert create_partition_sql(date(2024, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS claimprocedure_y2024m12 PARTITION OF claimprocedure "
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
@@ -0,0 +1,46 @@
+# tests/test_payload_store.py
+
+import json
+from prometheus_client import REGISTRY
+from app import payload_store
+from app.schemas.procedure import ProcedureCreate
+from tests.test_workers import PROCEDURE
+
+def test_round_trip_restores_validatable_procedures():
+    procedures = [ProcedureCreate(**PROCEDURE).model_dump()]
+    decoded = payload_store.decode_procedures(payload_store.encode_procedures(procedures))
+    assert [ProcedureCreate.model_validate(p).model_dump() for p in decoded] == procedures
+
+def test_large_payloads_are_compressed_and_smaller_than_json():
+    procedures = [ProcedureCreate(**PROCEDURE).model_dump() for _ in range(50)]
+    data = payload_store.encode_procedures(procedures)
+    assert data[:1] == payload_store.COMPRESSED
+    assert len(data) < len(json.dumps(procedures, default=str)) / 5
+    assert len(payload_store.decode_procedures(data)) == 50
+
+def test_legacy_json_payloads_still_decode():
+    legacy = json.dumps([PROCEDURE]).encode()
+    assert payload_store.decode_procedures(legacy) == [PROCEDURE]
+
+def test_store_procedures_sets_ttl_and_records_size():
+    class Pipe:
+        def set(self, key, value, ex=None):
+            self.call = (key, value, ex)
+
+    pipe = Pipe()
+    before = REGISTRY.get_sample_value("claim_payload_bytes_sum")
+    size = payload_store.store_procedures(pipe, "abc", [PROCEDURE])
+    assert pipe.call[0] == "claim_procedures:abc"
+    assert pipe.call[2] == payload_store.CLAIM_PAYLOAD_TTL
+    assert REGISTRY.get_sample_value("claim_payload_bytes_sum") - before == size == len(pipe.call[1])
+
+def test_trusted_rows_decode_to_validated_values():
+    procedures = [ProcedureCreate(**PROCEDURE), ProcedureCreate(**{**PROCEDURE, "quadrant": "UR"})]
+    data = payload_store.encode_procedures(procedures)
+    # Models and their dumps encode identically
+    assert data == payload_store.encode_procedures([p.model_dump() for p in procedures])
+    assert payload_store.decode_procedures(data, typed=True) == [p.model_dump() for p in procedures]
+
+def test_typed_decode_validates_legacy_payloads():
+    legacy = json.dumps([PROCEDURE]).encode()
+    assert payload_store.decode_procedures(legacy, typed=True) == [ProcedureCreate(**PROCEDURE).model_dump()]
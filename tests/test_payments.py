@@ -0,0 +1,148 @@
+# tests/test_payments.py
+
+import json
+import pytest
+from decimal import Decimal
+from uuid import uuid4
+
+import httpx
+
+from app.payments import PaymentDispatcher, PaymentRejected, PaymentsClient, idempotency_key
+from app.payments_stub import create_app
+
+def stub_client(app=None):
+    return PaymentsClient("http://payments", transport=httpx.ASGITransport(app=app or create_app()))
+
+def test_idempotency_key_is_stable_per_claim():
+    claim_id = str(uuid4())
+    assert idempotency_key(claim_id) == idempotency_key(claim_id)
+    assert idempotency_key(claim_id) != idempotency_key(str(uuid4()))
+
+@pytest.mark.asyncio
+async def test_resent_payments_are_paid_once():
+    app = create_app()
+    client = stub_client(app)
+    payments = [(str(uuid4()), Decimal("35.00")), (str(uuid4()), Decimal("12.50"))]
+
+    first = await client.send_batch(payments)
+    # A retry after a lost response must not pay again
+    second = await client.send_batch(payments)
+    await client.close()
+
+    assert first == second == {claim_id: None for claim_id, _ in payments}
+    assert len(app.state.paid) == 2
+    assert app.state.paid[idempotency_key(payments[0][0])].amount == Decimal("35.00")
+
+@pytest.mark.asyncio
+async def test_rejected_payment_fails_only_itself():
+    def handler(request):
+        keys = [payment["idempotency_key"] for payment in json.loads(request.content)["payments"]]
+        return httpx.Response(200, json={"results": [
+            {"idempotency_key": keys[0], "status": "accepted"},
+            {"idempotency_key": keys[1], "status": "rejected", "error": "account closed"},
+        ]})
+
+    client = PaymentsClient("http://payments", transport=httpx.MockTransport(handler))
+    ok, bad = str(uuid4()), str(uuid4())
+    results = await client.send_batch([(ok, Decimal("1.00")), (bad, Decimal("2.00"))])
+    await client.close()
+
+    assert results[ok] is None
+    assert isinstance(results[bad], PaymentRejected)
+
+@pytest.mark.asyncio
+async def test_dispatcher_batches_concurrent_payments():
+    requests = []
+
+    def handler(request):
+        payments = json.loads(request.content)["payments"]
+        requests.append(len(payments))
+        return httpx.Response(200, json={"results": [
+            {"idempotency_key": payment["idempotency_key"], "status": "accepted"} for payment in payments
+        ]})
+
+    recorded = {}
+
+    async def record(results):
+        recorded.update(results)
+
+    dispatcher = PaymentDispatcher(
+        PaymentsClient("http://payments", transport=httpx.MockTransport(handler)),
+        batch_size=10,
+        flush_ms=20,
+        record=record,
+    )
+    claim_ids = [str(uuid4()) for _ in range(25)]
+    for claim_id in claim_ids:
+        dispatcher.dispatch([(claim_id, Decimal("5.00"))])
+    await dispatcher.close()
+
+    assert requests == [10, 10, 5]
+    assert recorded == {claim_id: None for claim_id in claim_ids}
+
+@pytest.mark.asyncio
+async def test_dispatcher_records_failures_for_the_sweeper():
+    def handler(request):
+        return httpx.Response(503)
+
+    recorded = {}
+
+    async def record(results):
+        recorded.update(results)
+
+    dispatcher = PaymentDispatcher(
+        PaymentsClient("http://payments", transport=httpx.MockTransport(handler)), record=record
+    )
+    claim_id = str(uuid4())
+    results = await dispatcher.send([(claim_id, Decimal("5.00"))])
+    await dispatcher.close()
+
+    assert isinstance(results[claim_id], httpx.HTTPStatusError)
+    assert isinstance(recorded[claim_id], httpx.HTTPStatusError)
+
+@pytest.mark.asyncio
+async def test_results_only_update_pending_rows(monkeypatch):
+    from sqlalchemy.dialects import postgresql
+    from app import payments
+
+    statements = []
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            statements.append(str(statement.compile(dialect=postgresql.dialect())))
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(payments, "AsyncSessionLocal", Session)
+    await payments.record_results({str(uuid4()): None, str(uuid4()): PaymentRejected("no")})
+    assert len(statements) == 2
+    # A late success must not turn a REJECTED row into SENT
+    assert all("payment_outbox.status = %(status_1)s" in sql for sql in statements)
+
+@pytest.mark.asyncio
+async def test_outbox_rows_get_timestamps():
+    from sqlalchemy.dialects import postgresql
+    from app.models import PaymentOutbox
+    from app.payments import add_to_outbox
+
+    statements = []
+
+    class Session:
+        async def execute(self, statement):
+            statements.append(statement.compile(dialect=postgresql.dialect()))
+
+    await add_to_outbox(Session(), [(uuid4(), Decimal("35.00")), (uuid4(), Decimal("12.50"))])
+    compiled, = statements
+    # Both NOT NULL timestamps are set on every row; the migration has no server default
+    for column in ("created_at", "updated_at"):
+        assert compiled.params[f"{column}_m0"] is not None
+        assert compiled.params[f"{column}_m1"] is not None
+    assert PaymentOutbox.__table__.c.created_at.default is not None
+    assert PaymentOutbox.__table__.c.updated_at.default is not None
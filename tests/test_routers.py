@@ -0,0 +1,171 @@
+# tests/test_routers.py
+
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.routers.claim import (
+    _decode_cursor,
+    _encode_cursor,
+    _insert_claims,
+    _procedure_rows,
+    _query_top_npis,
+)
+from app.schemas.claim import ClaimCreate
+
+def test_insert_claims_is_single_conflict_safe_statement():
+    sql = str(_insert_claims().compile(dialect=postgresql.dialect()))
+    assert sql.startswith("INSERT INTO claim ")
+    assert "ON CONFLICT (claim_number) DO NOTHING" in sql
+    assert sql.endswith("RETURNING claim.id, claim.claim_number")
+
+def test_procedure_rows_are_pending_and_linked_to_claim():
+    claim = ClaimCreate(
+        claim_number="CLM-10001",
+        plan_group="GRP-1000",
+        subscriber_number="3730189502",
+        procedures=[{
+            "service_date": "2024-10-29T10:00:00",
+            "submitted_procedure": "D0120",
+            "provider_npi": "1497775530",
+            "provider_fees": 100.0,
+            "allowed_fees": 80.0,
+            "member_coinsurance": 10.0,
+            "member_copay": 5.0,
+        }],
+    )
+    claim_id = uuid4()
+
+    [row] = _procedure_rows(claim, claim_id)
+    assert row["claim_id"] == claim_id
+    assert row["status"] == "PENDING"
+    assert row["net_fee"] == Decimal("0.00")
+    assert row["provider_fees"] == Decimal("100.0")
+
+class CapturingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+    def all(self):
+        return []
+
+@pytest.mark.asyncio
+async def test_top_npis_by_service_date_filters_on_the_partition_key():
+    session = CapturingSession()
+    await _query_top_npis(session, 10, 0, date(2024, 7, 1), date(2024, 9, 30))
+
+    compiled = session.statements[0].compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "FROM claimprocedure" in sql
+    assert "claimprocedure.service_date >= " in sql
+    assert "claimprocedure.service_date < " in sql
+    assert "GROUP BY claimprocedure.provider_npi" in sql
+    assert sorted(v for v in compiled.params.values() if hasattr(v, "year")) == [
+        datetime(2024, 7, 1), datetime(2024, 10, 1),
+    ]
+
+@pytest.mark.asyncio
+async def test_top_npis_without_dates_reads_the_totals_table():
+    session = CapturingSession()
+    await _query_top_npis(session, 10, 0)
+
+    assert "FROM npi_net_fee_totals" in str(session.statements[0].compile(dialect=postgresql.dialect()))
+
+def test_cursor_round_trips_the_last_row():
+    cursor = _encode_cursor({"provider_npi": "1497775530", "total_net_fee": Decimal("35.00")})
+    assert _decode_cursor(cursor) == (Decimal("35.00"), "1497775530")
+
+def test_invalid_cursor_is_a_bad_request():
+    with pytest.raises(HTTPException) as excinfo:
+        _decode_cursor("not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_top_npis_cursor_seeks_past_the_last_row():
+    session = CapturingSession()
+    await _query_top_npis(session, 10, 0, after=(Decimal("35.00"), "1497775530"))
+
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "WHERE (npi_net_fee_totals.total_net_fee, npi_net_fee_totals.provider_npi) < " in sql
+
+@pytest.mark.asyncio
+async def test_batch_reports_each_claims_id_or_error(monkeypatch):
+    from types import SimpleNamespace
+    from httpx import ASGITransport, AsyncClient
+    from app.db.connection import get_session
+    from app.db.redis import get_redis
+    from app.main import app
+    from app.routers import claim as claim_router
+    from benchmarks.fakes import FakeRedis
+    from tests.test_workers import PROCEDURE
+
+    class InsertSession:
+        """Claim numbers already stored conflict; every other row comes back inserted."""
+
+        def __init__(self, existing):
+            self.existing = existing
+            self.rows = []
+            self.committed = False
+
+        async def execute(self, statement, rows=None):
+            self.rows = [
+                SimpleNamespace(id=row["id"], claim_number=row["claim_number"])
+                for row in rows or [] if row["claim_number"] not in self.existing
+            ]
+            return self
+
+        def all(self):
+            return self.rows
+
+        async def commit(self):
+            self.committed = True
+
+    def claim(number, **procedure):
+        return {
+            "Claim_Number": number,
+            "plan_group": "GRP-1000",
+            "subscriber_number": "3730189502",
+            "procedures": [{**PROCEDURE, **procedure}],
+        }
+
+    session, redis = InsertSession({"CLM-00002"}), FakeRedis()
+    monkeypatch.setattr(claim_router, "CLAIM_SUBMIT_MODE", "payload")
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_redis] = lambda: redis
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+            response = await client.post("/claims/batch", json=[
+                claim("CLM-00001"),
+                claim("CLM-00002"),
+                claim("CLM-00001"),
+                claim("CLM-00004", provider_npi="1497775531"),
+                {"plan_group": "GRP-1000"},
+                "not a claim",
+            ])
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    accepted, existing, duplicate, invalid, incomplete, garbage = response.json()
+    assert accepted["claim_number"] == "CLM-00001" and accepted["error"] is None
+    assert accepted["id"] is not None
+    assert existing == {"claim_number": "CLM-00002", "id": None, "error": "Claim number already exists"}
+    assert duplicate == {"claim_number": "CLM-00001", "id": None, "error": "Claim number already exists"}
+    assert invalid["claim_number"] == "CLM-00004" and invalid["id"] is None
+    assert invalid["error"].startswith("procedures.0.provider_npi: ")
+    assert incomplete["claim_number"] is None
+    assert "claim_number: Field required" in incomplete["error"]
+    assert garbage["claim_number"] is None and garbage["error"]
+    assert session.committed
+    # Only the accepted claim was queued
+    assert [key for key in redis.data if key.startswith("claim_procedures:")] == [
+        f"claim_procedures:{accepted['id']}"
+    ]
@@ -8,7 +8,7 @@ def test_procedure_create_validation_success():
     data = {
         "service_date": "2024-10-29T10:00:00",
         "submitted_procedure": "D0120",
-        "provider_npi": "1234567890",
+        "provider_npi": "1234567893",
         "provider_fees": 100.0,
         "allowed_fees": 80.0,
         "member_coinsurance": 10.0,
@@ -16,13 +16,13 @@ def test_procedure_create_validation_success():
     }
     procedure = ProcedureCreate(**data)
     assert procedure.submitted_procedure == "D0120"
-    assert procedure.provider_npi == "1234567890"
+    assert procedure.provider_npi == "1234567893"
 
 def test_procedure_create_validation_failure():
     data = {
         "service_date": "2024-10-29T10:00:00",
         "submitted_procedure": "X0120",
-        "provider_npi": "1234567890",
+        "provider_npi": "1234567893",
         "provider_fees": -100.0,
         "allowed_fees": 80.0,
         "member_coinsurance": 10.0,
@@ -30,3 +30,31 @@ def test_procedure_create_validation_failure():
     }
     with pytest.raises(ValidationError):
         ProcedureCreate(**data)
+
+def test_claim_create_accepts_mixed_case_keys_at_every_level():
+    from app.schemas.claim import ClaimCreate
+
+    data = {
+        "Claim_Number": "123456",
+        "PLAN_GROUP": "GRP-1000",
+        "subscriber_number": "3730189502",
+        "Procedures": [{
+            "Service_Date": "2024-10-29T10:00:00",
+            "Submitted_Procedure": "D0120",
+            "Provider_NPI": "1234567893",
+            "provider_fees": 100.0,
+            "Allowed_Fees": 80.0,
+            "member_coinsurance": 10.0,
+            "Member_Copay": 5.0
+        }]
+    }
+    claim = ClaimCreate(**data)
+    assert claim.claim_number == "123456"
+    assert claim.procedures[0].provider_npi == "1234567893"
+
+def test_lowercase_keys_does_not_copy_lowercase_dicts():
+    from app.schemas.base import lowercase_keys
+
+    data = {"claim_number": "123456", "plan_group": "GRP-1000"}
+    assert lowercase_keys(data) is data
+    assert lowercase_keys({"Claim_Number": "1"}) == {"claim_number": "1"}
@@ -0,0 +1,46 @@
+# tests/test_serialization.py
+
+import importlib
+import pickle
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+import pytest
+from app import serialization
+
+PAYLOAD = {
+    "claim_id": UUID("8a8c5f0e-4a0d-4c3e-9d0a-2f1b1b0f6c11"),
+    "net_fee": Decimal("35.00"),
+    "service_date": datetime(2024, 10, 29, 10, 0, 0, 123456),
+    "aware": datetime(2024, 10, 29, tzinfo=timezone.utc),
+    "procedures": ({"quadrant": None, "fee": Decimal("-0.10")},),
+}
+
+EXPECTED = {
+    "claim_id": "8a8c5f0e-4a0d-4c3e-9d0a-2f1b1b0f6c11",
+    "net_fee": "35.00",
+    "service_date": "2024-10-29T10:00:00.123456",
+    "aware": "2024-10-29T00:00:00+00:00",
+    "procedures": [{"quadrant": None, "fee": "-0.10"}],
+}
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_backends_encode_identically(monkeypatch, backend):
+    pytest.importorskip(backend)
+    monkeypatch.setenv("JSON_BACKEND", backend)
+    module = importlib.reload(serialization)
+    try:
+        assert module.JSON_BACKEND == backend
+        assert module.loads(module.dumps(PAYLOAD)) == EXPECTED
+    finally:
+        monkeypatch.delenv("JSON_BACKEND")
+        importlib.reload(serialization)
+
+def test_job_deserializer_reads_legacy_pickled_jobs():
+    job = {"t": 1, "f": "process_claim", "a": ("id", []), "k": {}, "et": 1}
+    assert serialization.job_deserializer(pickle.dumps(job)) == job
+    assert serialization.job_deserializer(serialization.job_serializer(job))["a"] == ["id", []]
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        serialization.dumps({"value": object()})
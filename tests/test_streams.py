@@ -0,0 +1,321 @@
+# tests/test_streams.py
+
+import itertools
+import time
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+
+from benchmarks.fakes import FakeRedis as MemoryRedis
+from app import streams, tasks
+from app.claim_status import status_key
+from app.payload_store import payload_key
+from app.schemas.procedure import ProcedureCreate
+from tests.test_workers import PROCEDURE, FakeRedis
+
+def _id(entry_id):
+    return tuple(map(int, entry_id.split("-")))
+
+class FakeStreamPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class FakeStreamRedis:
+    """The stream commands StreamConsumer uses, for a single consumer group."""
+
+    def __init__(self):
+        self.streams = {}
+        self.delivered = {}  # stream -> index of the next undelivered entry
+        self.pending = {}  # entry_id -> [consumer, times_delivered, delivered_at_ms]
+        self.ids = itertools.count(1)
+        self.autoclaim_starts = []
+
+    def pipeline(self, transaction=True):
+        return FakeStreamPipeline(self)
+
+    async def xgroup_create(self, stream, group, id="0", mkstream=False):
+        self.streams.setdefault(stream, [])
+        self.delivered.setdefault(stream, 0)
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entry_id = f"{next(self.ids)}-0"
+        self.streams.setdefault(stream, []).append((entry_id, {k: str(v) for k, v in fields.items()}))
+        return entry_id
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, _), = streams.items()
+        start = self.delivered.get(stream, 0)
+        entries = self.streams.get(stream, [])[start:start + count]
+        self.delivered[stream] = start + len(entries)
+        for entry_id, _ in entries:
+            self.pending[entry_id] = [consumer, 1, time.time() * 1000]
+        return [[stream, entries]] if entries else []
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        now = time.time() * 1000
+        claimed, scanned, cursor = [], 0, "0-0"
+        self.autoclaim_starts.append(start_id)
+        for entry_id, fields in self.streams.get(stream, []):
+            info = self.pending.get(entry_id)
+            if info is None or _id(entry_id) < _id(start_id):
+                continue
+            if scanned == count:
+                cursor = entry_id
+                break
+            scanned += 1
+            if now - info[2] >= min_idle_time:
+                self.pending[entry_id] = [consumer, info[1] + 1, now]
+                claimed.append((entry_id, fields))
+        return [cursor, claimed, []]
+
+    async def xclaim(self, stream, group, consumer, min_idle_time, message_ids, idle=0, justid=False):
+        for entry_id in message_ids:
+            self.pending[entry_id][2] = time.time() * 1000 - idle
+
+    async def xpending_range(self, stream, group, min, max, count):
+        info = self.pending.get(min)
+        return [{"message_id": min, "consumer": info[0], "times_delivered": info[1]}] if info else []
+
+    async def xack(self, stream, group, *entry_ids):
+        for entry_id in entry_ids:
+            self.pending.pop(entry_id, None)
+
+    async def xrange(self, stream, min="-", max="+", count=None):
+        entries = [e for e in self.streams.get(stream, []) if min in ("-", e[0]) and max in ("+", e[0])]
+        return entries[:count]
+
+    async def xdel(self, stream, *entry_ids):
+        self.streams[stream] = [e for e in self.streams.get(stream, []) if e[0] not in entry_ids]
+
+class FakeClaimRedis(FakeStreamRedis, MemoryRedis):
+    """The claim stream plus the keys, hashes and payloads around it."""
+
+    def __init__(self):
+        FakeStreamRedis.__init__(self)
+        MemoryRedis.__init__(self)
+
+class ClaimTable:
+    """Claim statuses behind the statements the stream path runs, as a session factory."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.rows = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.rows = []
+        if getattr(statement, "table", None) is not None and statement.table.name != "claim":
+            return self
+        if statement.is_select:
+            ids = statement.compile().params["id_1"]
+            self.rows = [SimpleNamespace(id=i, status=self.statuses[i]) for i in ids if i in self.statuses]
+        elif params is not None:
+            # Bulk UPDATE by primary key with the computed rollups
+            for row in params:
+                self.statuses[row["id"]] = row["status"]
+        else:
+            bound = statement.compile().params
+            ids = bound["id_1"] if isinstance(bound["id_1"], list) else [bound["id_1"]]
+            for claim_id in ids:
+                if self.statuses.get(claim_id) == bound["status_1"]:
+                    self.statuses[claim_id] = bound["status"]
+                    self.rows.append(SimpleNamespace(id=claim_id, net_fee=Decimal("0.00")))
+        return self
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return iter(row.id for row in self.rows)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+def consumer(redis, handler, dead=None):
+    async def on_dead_letter(claim_ids):
+        dead.extend(claim_ids)
+
+    return streams.StreamConsumer(
+        redis, handler, on_dead_letter=on_dead_letter, name="test", min_idle_ms=50, claim_interval=0
+    )
+
+@pytest.mark.asyncio
+async def test_enqueue_uses_the_stream_when_configured(monkeypatch):
+    monkeypatch.setattr(tasks, "CLAIM_TRANSPORT", "streams")
+    redis = FakeRedis()
+    claim_ids = [uuid4(), uuid4()]
+
+    await tasks.enqueue_process_claims(redis, [(claim_id, [ProcedureCreate(**PROCEDURE)]) for claim_id in claim_ids])
+    await tasks.enqueue_process_stored_claims(redis, claim_ids[:1])
+
+    payload, stored = redis.executed
+    assert [name for name, _, _ in payload] == ["set", "hset", "expire", "xadd"] * 2
+    assert payload[3][1][1] == {"claim_id": str(claim_ids[0]), "mode": "payload"}
+    assert [args[1] for name, args, _ in stored if name == "xadd"] == [{"claim_id": str(claim_ids[0]), "mode": "stored"}]
+
+@pytest.mark.asyncio
+async def test_processed_entries_are_acked_as_one_batch():
+    redis = FakeStreamRedis()
+    batches = []
+
+    async def handler(entries):
+        batches.append(entries)
+        return {claim_id: None for _, claim_id, _, _ in entries}
+
+    for claim_id in ("a", "b", "c"):
+        await redis.xadd(streams.CLAIM_STREAM, {"claim_id": claim_id, "mode": "stored"})
+    await consumer(redis, handler).poll()
+
+    assert [[(claim_id, mode, attempt) for _, claim_id, mode, attempt in batch] for batch in batches] == [
+        [("a", "stored", 1), ("b", "stored", 1), ("c", "stored", 1)]
+    ]
+    assert redis.pending == {}
+
+@pytest.mark.asyncio
+async def test_failed_entries_are_reclaimed_then_dead_lettered(monkeypatch):
+    monkeypatch.setattr(streams, "next_retry_delay", lambda error, attempt: None if attempt >= 2 else 0)
+    redis = FakeStreamRedis()
+    dead, attempts = [], []
+
+    async def handler(entries):
+        attempts.extend(attempt for _, _, _, attempt in entries)
+        return {claim_id: ConnectionError("db down") for _, claim_id, _, _ in entries}
+
+    await redis.xadd(streams.CLAIM_STREAM, {"claim_id": "a", "mode": "payload"})
+    stream_consumer = consumer(redis, handler, dead)
+    await stream_consumer.poll()
+    assert list(redis.pending) == ["1-0"]
+
+    # Backoff of 0s: the retry is immediately reclaimable
+    await stream_consumer.poll()
+    assert attempts == [1, 2]
+    assert dead == ["a"]
+    assert redis.pending == {}
+
+    (_, fields), = await streams.dead_letters(redis)
+    assert fields["claim_id"] == "a"
+    assert fields["attempts"] == "2"
+    assert fields["error"] == "ConnectionError: db down"
+
+@pytest.mark.asyncio
+async def test_replay_requeues_dead_letters(monkeypatch):
+    claim_id = uuid4()
+    table = ClaimTable({claim_id: "FAILED"})
+    monkeypatch.setattr(streams, "AsyncSessionLocal", table)
+    redis = FakeClaimRedis()
+    await redis.xadd(streams.CLAIM_DLQ_STREAM, {"claim_id": str(claim_id), "mode": "stored", "error": "x"})
+
+    assert await streams.replay(redis) == 1
+    assert await streams.dead_letters(redis) == []
+    (_, fields), = redis.streams[streams.CLAIM_STREAM]
+    assert fields == {"claim_id": str(claim_id), "mode": "stored"}
+    assert table.statuses[claim_id] == "PENDING"
+    assert redis.data[status_key(claim_id)]["status"] == "PENDING"
+
+@pytest.mark.asyncio
+async def test_replayed_dead_letter_is_processed_again(monkeypatch):
+    monkeypatch.setattr(tasks, "CLAIM_TRANSPORT", "streams")
+    monkeypatch.setattr(streams, "next_retry_delay", lambda error, attempt: None)
+    claim_id = uuid4()
+    table = ClaimTable({claim_id: "PENDING"})
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", table)
+    monkeypatch.setattr(streams, "AsyncSessionLocal", table)
+    redis = FakeClaimRedis()
+    ctx = {"redis": redis}
+    await tasks.enqueue_process_claims(redis, [(claim_id, [ProcedureCreate(**PROCEDURE)])])
+
+    async def failing(entries):
+        return {claim_id: ConnectionError("db down") for _, claim_id, _, _ in entries}
+
+    # Out of attempts: dead-lettered and marked FAILED, payload kept
+    await streams.StreamConsumer(
+        redis, failing, on_dead_letter=lambda claim_ids: tasks.mark_claims_as_failed(claim_ids, redis), name="test"
+    ).poll()
+    assert table.statuses[claim_id] == "FAILED"
+    assert len(await streams.dead_letters(redis)) == 1
+
+    # A stale redelivery of the FAILED claim is acked without losing the payload
+    assert await tasks.process_claims(redis, [(str(claim_id), None)]) == {str(claim_id): None}
+    assert redis._exists(payload_key(claim_id))
+
+    assert await streams.replay(redis) == 1
+    assert table.statuses[claim_id] == "PENDING"
+    await streams.StreamConsumer(redis, lambda entries: tasks.process_stream_entries(ctx, entries), name="test").poll()
+    assert table.statuses[claim_id] == "SUCCESS"
+    assert redis.pending == {}
+    assert not redis._exists(payload_key(claim_id))
+    assert await streams.dead_letters(redis) == []
+
+@pytest.mark.asyncio
+async def test_reclaim_scan_continues_past_entries_not_idle_yet():
+    redis = FakeStreamRedis()
+    stream_consumer = streams.StreamConsumer(redis, None, name="test", min_idle_ms=60000, count=2)
+    for claim_id in ("a", "b", "c", "d"):
+        await redis.xadd(streams.CLAIM_STREAM, {"claim_id": claim_id, "mode": "payload"})
+    await stream_consumer.read()
+    await stream_consumer.read()
+    redis.pending["4-0"][2] -= 120000
+
+    assert await stream_consumer.reclaim() == []
+    [(_, claim_id, _, attempt)] = await stream_consumer.reclaim()
+    assert (claim_id, attempt) == ("d", 2)
+    assert redis.autoclaim_starts == ["0-0", "3-0"]
+    # Back to the start once the whole pending list was scanned
+    assert stream_consumer._claim_cursor == "0-0"
+
+@pytest.mark.asyncio
+async def test_backoff_is_capped_at_min_idle(monkeypatch):
+    monkeypatch.setattr(streams, "next_retry_delay", lambda error, attempt: 600)
+    redis = FakeStreamRedis()
+
+    async def handler(entries):
+        return {claim_id: ConnectionError("db down") for _, claim_id, _, _ in entries}
+
+    await redis.xadd(streams.CLAIM_STREAM, {"claim_id": "a", "mode": "payload"})
+    await consumer(redis, handler).poll()
+    # Idle time back-dated by nothing: reclaimable after min_idle_ms, not 600s
+    assert time.time() * 1000 - redis.pending["1-0"][2] < 50
+
+@pytest.mark.asyncio
+async def test_stream_sub_batches_fail_independently(monkeypatch):
+    async def payload_batch(redis, items, dispatcher=None):
+        return {claim_id: None for claim_id, _ in items}
+
+    async def stored_batch(redis, claim_ids, dispatcher=None):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(tasks, "process_claims", payload_batch)
+    monkeypatch.setattr(tasks, "process_stored_claims", stored_batch)
+    outcomes = await tasks.process_stream_entries(
+        {"redis": None}, [("1-0", "a", "payload", 1), ("2-0", "b", "stored", 1)]
+    )
+    assert outcomes["a"] is None
+    assert isinstance(outcomes["b"], ConnectionError)
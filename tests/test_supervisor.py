@@ -0,0 +1,60 @@
+# tests/test_supervisor.py
+
+import time
+
+from app.supervisor import Supervisor
+
+def wait_for_exit(supervisor, timeout=5):
+    deadline = time.monotonic() + timeout
+    while supervisor.alive() and time.monotonic() < deadline:
+        supervisor.reap()
+        time.sleep(0.05)
+
+def crash(index):
+    raise RuntimeError(f"worker {index} failed")
+
+def test_crashed_child_is_scheduled_for_restart_with_backoff():
+    supervisor = Supervisor(1, target=crash)
+    child = supervisor.children[0]
+
+    supervisor.spawn(child)
+    wait_for_exit(supervisor)
+    assert child.pid is None
+    assert child.failures == 1
+    assert child.restart_at is not None
+    assert supervisor.restart_delay(child) == 1
+
+    child.failures = 4
+    assert supervisor.restart_delay(child) == 8
+
+def test_stop_signals_children_and_does_not_restart_them():
+    exited = []
+    supervisor = Supervisor(2, target=lambda index: time.sleep(30), on_child_exit=exited.append)
+    for child in supervisor.children.values():
+        supervisor.spawn(child)
+    pids = sorted(child.pid for child in supervisor.children.values())
+
+    supervisor.stop()
+    wait_for_exit(supervisor)
+    assert supervisor.alive() == []
+    assert sorted(exited) == pids
+    assert all(child.restart_at is None for child in supervisor.children.values())
+    assert supervisor.status()["alive"] == 0
+
+def test_check_health_of_a_single_unsupervised_worker(monkeypatch):
+    from app import supervisor
+
+    class Client:
+        def __init__(self, data):
+            self.data = data
+
+        def get(self, key):
+            return self.data.get(key)
+
+    data = {}
+    monkeypatch.setattr(supervisor, "_redis_client", lambda settings: Client(data))
+    assert supervisor.check_health(None, "arq:queue", processes=1) == 1
+    data[supervisor.child_health_key("arq:queue", 0)] = b"j_complete=1"
+    assert supervisor.check_health(None, "arq:queue", processes=1) == 0
+    # A supervisor publishes its own record, which is missing here
+    assert supervisor.check_health(None, "arq:queue", processes=2) == 1
@@ -0,0 +1,330 @@
+# tests/test_workers.py
+
+import pickle
+import pytest
+from uuid import uuid4
+from arq.constants import default_queue_name, job_key_prefix
+
+from app import tasks
+from app.schemas.procedure import ProcedureCreate
+
+PROCEDURE = {
+    "service_date": "2024-10-29T10:00:00",
+    "submitted_procedure": "D0120",
+    "provider_npi": "1497775530",
+    "provider_fees": 100.0,
+    "allowed_fees": 80.0,
+    "member_coinsurance": 10.0,
+    "member_copay": 5.0
+}
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        self.redis.executed.append(self.commands)
+
+class FakeRedis:
+    job_serializer = None
+
+    def __init__(self):
+        self.executed = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+@pytest.mark.asyncio
+async def test_enqueue_process_claims_uses_single_pipeline():
+    redis = FakeRedis()
+    claims = [(uuid4(), [ProcedureCreate(**PROCEDURE)]) for _ in range(3)]
+
+    await tasks.enqueue_process_claims(redis, claims)
+
+    assert len(redis.executed) == 1
+    commands = redis.executed[0]
+    assert [name for name, _, _ in commands] == ["set", "hset", "expire", "psetex", "zadd"] * 3
+    _, (status_key, ), status = commands[1]
+    assert status_key == f"claim_status:{claims[0][0]}"
+    assert status["mapping"]["status"] == "PENDING"
+    _, (job_key, _, job), _ = commands[3]
+    assert job_key.startswith(job_key_prefix)
+    assert pickle.loads(job)["f"] == "process_claim"
+    assert pickle.loads(job)["a"][0] == str(claims[0][0])
+    _, (queue_name, _), _ = commands[4]
+    assert queue_name == default_queue_name
+
+@pytest.mark.asyncio
+async def test_enqueue_process_stored_claims_carries_only_claim_id():
+    redis = FakeRedis()
+    claim_ids = [uuid4() for _ in range(2)]
+
+    await tasks.enqueue_process_stored_claims(redis, claim_ids)
+
+    assert len(redis.executed) == 1
+    commands = redis.executed[0]
+    assert [name for name, _, _ in commands] == ["hset", "expire", "psetex", "zadd"] * 2
+    _, (_, _, job), _ = commands[2]
+    job = pickle.loads(job)
+    assert job["f"] == "process_stored_claim"
+    assert job["a"] == (str(claim_ids[0]),)
+    assert job["k"] == {}
+
+def test_net_fee_deltas_groups_by_npi():
+    from decimal import Decimal
+    from app.aggregates import net_fee_deltas
+    from app.models import ClaimProcedure
+
+    procedures = [
+        ClaimProcedure(provider_npi="1497775530", net_fee=Decimal("35.00")),
+        ClaimProcedure(provider_npi="1497775530", net_fee=Decimal("-5.00")),
+        ClaimProcedure(provider_npi="1234567893", net_fee=Decimal("10.00")),
+    ]
+    assert net_fee_deltas(procedures) == {
+        "1497775530": Decimal("30.00"),
+        "1234567893": Decimal("10.00"),
+    }
+
+@pytest.mark.asyncio
+async def test_upsert_npi_net_fee_totals_adds_to_existing_total():
+    from decimal import Decimal
+    from sqlalchemy.dialects import postgresql
+    from app.aggregates import upsert_npi_net_fee_totals
+
+    class RecordingSession:
+        statements = []
+
+        async def execute(self, stmt):
+            self.statements.append(stmt)
+
+    session = RecordingSession()
+    await upsert_npi_net_fee_totals(session, {"2": Decimal("1"), "1": Decimal("2")})
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (provider_npi) DO UPDATE" in sql
+    assert "npi_net_fee_totals.total_net_fee + excluded.total_net_fee" in sql
+    params = session.statements[0].compile(dialect=postgresql.dialect()).params
+    assert params["provider_npi_m0"] == "1"
+
+@pytest.mark.asyncio
+async def test_micro_batcher_flushes_full_batches_and_isolates_failures():
+    import asyncio
+    from app.batching import MicroBatcher
+
+    batches = []
+
+    async def handler(items):
+        batches.append([key for key, _ in items])
+        return {key: ValueError(key) if item == "bad" else None for key, item in items}
+
+    batcher = MicroBatcher(handler, max_size=3, max_wait_ms=1000)
+    results = await asyncio.gather(
+        batcher.submit("a", "ok"),
+        batcher.submit("b", "bad"),
+        batcher.submit("c", "ok"),
+        return_exceptions=True,
+    )
+    assert batches == [["a", "b", "c"]]
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ValueError)
+
+@pytest.mark.asyncio
+async def test_micro_batcher_flushes_partial_batch_after_wait():
+    from app.batching import MicroBatcher
+
+    async def handler(items):
+        return {key: None for key, _ in items}
+
+    batcher = MicroBatcher(handler, max_size=100, max_wait_ms=5)
+    assert await batcher.submit("a", "ok") is None
+
+def test_backoff_grows_exponentially_with_bounded_jitter():
+    import random
+    from app.retry import RetryPolicy, backoff_delay
+
+    policy = RetryPolicy(max_attempts=10, base_delay=2, max_delay=60)
+    rng = random.Random(0)
+    for attempt, window in [(1, 2), (2, 4), (3, 8), (6, 60), (9, 60)]:
+        delays = [backoff_delay(policy, attempt, rng) for _ in range(100)]
+        assert all(window / 2 <= delay <= window for delay in delays)
+        assert len(set(delays)) > 1
+
+def test_retry_policy_is_chosen_by_exception_class():
+    from pydantic import ValidationError
+    from sqlalchemy.exc import OperationalError
+    from app.retry import DEFAULT_POLICY, POLICIES, next_retry_delay, policy_for
+
+    assert policy_for(OperationalError("SELECT 1", {}, Exception())) == POLICIES["OperationalError"]
+    assert policy_for(ConnectionRefusedError()) == POLICIES["ConnectionError"]
+    assert policy_for(KeyError()) == DEFAULT_POLICY
+    try:
+        ProcedureCreate(**{**PROCEDURE, "provider_npi": "x"})
+    except ValidationError as e:
+        assert next_retry_delay(e, 1) is None
+    assert next_retry_delay(KeyError(), DEFAULT_POLICY.max_attempts) is None
+
+@pytest.mark.asyncio
+async def test_process_claim_defers_itself_on_failure(monkeypatch):
+    from arq.worker import Retry
+
+    async def failing_process_claims(redis, items, dispatcher=None):
+        return {items[0][0]: ConnectionError("db down")}
+
+    monkeypatch.setattr(tasks, "process_claims", failing_process_claims)
+    with pytest.raises(Retry) as excinfo:
+        await tasks.process_claim({"redis": None, "job_try": 2}, "claim-id")
+    assert 1000 <= excinfo.value.defer_score <= 2000
+
+@pytest.mark.asyncio
+async def test_process_claim_dead_letters_after_max_attempts(monkeypatch):
+    from app.retry import POLICIES
+
+    enqueued, failed = [], []
+
+    class Redis:
+        async def enqueue_job(self, function, **kwargs):
+            enqueued.append((function, kwargs))
+
+    async def failing_process_claims(redis, items, dispatcher=None):
+        return {items[0][0]: ConnectionError("db down")}
+
+    async def fake_mark_claim_as_failed(claim_id, redis=None):
+        failed.append(claim_id)
+
+    monkeypatch.setattr(tasks, "process_claims", failing_process_claims)
+    monkeypatch.setattr(tasks, "mark_claim_as_failed", fake_mark_claim_as_failed)
+    ctx = {"redis": Redis(), "job_try": POLICIES["ConnectionError"].max_attempts}
+    await tasks.process_claim(ctx, "claim-id")
+    assert enqueued == [("dead_letter_queue", {"claim_id": "claim-id"})]
+    assert failed == ["claim-id"]
+
+def test_concurrency_controller_grows_while_backlogged_and_busy():
+    from app.worker import ConcurrencyController
+
+    controller = ConcurrencyController(2, 20, target_latency=1.0, pool_saturation_high=0.9)
+    assert controller.decide(10, running=10, ready=50, latency=0.2, pool_saturation=0.5) == 11
+    # Free slots mean the backlog isn't limited by concurrency
+    assert controller.decide(10, running=4, ready=50, latency=0.2, pool_saturation=0.5) == 10
+    assert controller.decide(20, running=20, ready=50, latency=0.2, pool_saturation=0.5) == 20
+
+def test_concurrency_controller_backs_off_on_latency_or_pool_pressure():
+    from app.worker import ConcurrencyController
+
+    controller = ConcurrencyController(2, 20, target_latency=1.0, pool_saturation_high=0.9)
+    assert controller.decide(12, running=12, ready=50, latency=1.5, pool_saturation=0.5) == 9
+    assert controller.decide(12, running=12, ready=50, latency=0.2, pool_saturation=0.95) == 9
+    assert controller.decide(12, running=12, ready=50, latency=None, pool_saturation=0.1, pool_timeouts=1) == 9
+    assert controller.decide(2, running=2, ready=50, latency=5.0, pool_saturation=1.0) == 2
+    # Idle workers drift back towards the minimum
+    assert controller.decide(5, running=0, ready=0, latency=None, pool_saturation=0.0) == 4
+
+def test_autoscaled_job_limit_never_drops_below_the_claim_batch_size(monkeypatch):
+    from app import worker as worker_module
+
+    monkeypatch.setattr(worker_module, "CLAIM_BATCH_SIZE", 50)
+    monkeypatch.setattr(worker_module, "WORKER_MAX_JOBS_LIMIT", 200)
+    worker = worker_module.build_worker(handle_signals=False)
+    assert worker.max_jobs == 50
+
+def test_load_signals_latency_is_the_mean_since_last_sample():
+    from app.metrics import JOB_DURATION
+    from app.worker import LoadSignals
+
+    signals = LoadSignals(worker=None, engine_name="missing")
+    assert signals.latency() is None
+    JOB_DURATION.labels("process_claim").observe(0.5)
+    JOB_DURATION.labels("process_stored_claim").observe(1.5)
+    assert signals.latency() == 1.0
+    assert signals.latency() is None
+    assert signals.pool_saturation() == 0.0
+
+class ReplayedSession:
+    """Session in which every claim was already processed: no UPDATE matches."""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+        self.params = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        self.params.append(params)
+        return self
+
+    def all(self):
+        return []
+
+    def scalars(self):
+        return iter(self.existing)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_rerun_of_processed_stored_claims_is_a_no_op(monkeypatch):
+    from uuid import UUID
+    from sqlalchemy.dialects import postgresql
+
+    processed, missing = str(uuid4()), str(uuid4())
+    session = ReplayedSession([UUID(processed)])
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", lambda: session)
+
+    outcomes = await tasks.process_stored_claims(None, [processed, missing])
+
+    assert outcomes[processed] is None
+    assert isinstance(outcomes[missing], ValueError)
+    procedures, claims = (str(statement.compile(dialect=postgresql.dialect())) for statement in session.statements[:2])
+    # Both UPDATEs only touch claims that are still PENDING
+    assert "claim.status = %(status_" in procedures
+    assert "claim.status = %(status_" in claims
+
+@pytest.mark.asyncio
+async def test_processed_claims_are_skipped_and_redis_errors_after_commit_are_logged(monkeypatch):
+    from types import SimpleNamespace
+    from benchmarks.fakes import FakeRedis as MemoryRedis
+    from app.payload_store import payload_key
+
+    class DownAfterCommit(MemoryRedis):
+        def _incr(self, key):
+            raise ConnectionError("redis down")
+
+    redis = DownAfterCommit()
+    processed, pending = uuid4(), uuid4()
+    await tasks.enqueue_process_claims(redis, [(claim_id, [ProcedureCreate(**PROCEDURE)]) for claim_id in (processed, pending)])
+
+    class LockedClaims(ReplayedSession):
+        def all(self):
+            if len(self.statements) == 1:
+                return [SimpleNamespace(id=processed, status="SUCCESS"), SimpleNamespace(id=pending, status="PENDING")]
+            return []
+
+    session = LockedClaims([])
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", lambda: session)
+
+    outcomes = await tasks.process_claims(redis, [(str(processed), None), (str(pending), None)])
+
+    assert outcomes == {str(processed): None, str(pending): None}
+    assert "FOR UPDATE" in str(session.statements[0])
+    [rows] = [params for statement, params in zip(session.statements, session.params)
+              if getattr(statement, "table", None) is not None and statement.table.name == "claimprocedure"]
+    # Only the pending claim's procedures were inserted, and both payloads are gone
+    assert [row["claim_id"] for row in rows] == [pending]
+    assert not redis._exists(payload_key(processed), payload_key(pending))